@@ -0,0 +1,83 @@
+"""
+Shared cache helpers.
+
+Versioned keys: a cached value lives under a key that contains the current
+version of its scope (an exam, an exam's deadlines, a class's exam
+list...). Bumping a scope's version orphans every key built on it at once,
+without finding and deleting them; the orphans expire on their own.
+
+Stampede guard: when a popular key is missing, ``get_or_compute`` lets one
+caller compute it while the others wait for the result, so a miss at the
+start of an exam costs one query instead of one per student. The value is
+computed from the primary database, also in views that read from a replica,
+so a lagging replica is never cached for everyone.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .metrics import record_cache
+from .routers import reading_from_primary
+
+_MISSING = object()
+
+
+def _version_key(scope):
+    return f"version:{scope}"
+
+
+def get_version(scope):
+    key = _version_key(scope)
+    version = cache.get(key)
+    if version is None:
+        # Time-based versions never repeat one that was evicted earlier.
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_versions(scopes):
+    """Orphan every key built on ``scopes``."""
+    cache.set_many({_version_key(scope): time.time_ns() for scope in scopes}, None)
+
+
+def versioned_key(namespace, scope, *parts):
+    return ":".join([namespace, scope, str(get_version(scope)), *map(str, parts)])
+
+
+def get_or_compute(key, compute, timeout, cache_name=None):
+    """Return the cached value of ``key``, computing and caching it on a miss.
+
+    Only one caller computes a missing value. The others poll for it for up
+    to ``CACHE_STAMPEDE_WAIT`` seconds and compute it themselves after that,
+    in case the first caller died.
+    """
+    value = cache.get(key, _MISSING)
+    if cache_name:
+        record_cache(cache_name, value is not _MISSING)
+    if value is not _MISSING:
+        return value
+
+    lock_key = f"{key}:lock"
+    if cache.add(lock_key, True, getattr(settings, "CACHE_STAMPEDE_LOCK_TIMEOUT", 10)):
+        try:
+            with reading_from_primary():
+                value = compute()
+            cache.set(key, value, timeout)
+        finally:
+            cache.delete(lock_key)
+        return value
+
+    deadline = time.monotonic() + getattr(settings, "CACHE_STAMPEDE_WAIT", 5)
+    delay = 0.01
+    while time.monotonic() < deadline:
+        time.sleep(delay)
+        delay = min(delay * 2, 0.2)
+        value = cache.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+    with reading_from_primary():
+        value = compute()
+    cache.set(key, value, timeout)
+    return value
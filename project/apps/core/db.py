@@ -0,0 +1,44 @@
+"""
+Contention-aware writes.
+
+With the production SQLite profile every transaction starts with
+``BEGIN IMMEDIATE``: it takes the write lock up front and waits up to the
+busy timeout for it, instead of failing halfway when a read transaction
+needs to become a write. Under a burst of submissions the timeout can still
+run out, so hot writes go through ``write_with_retry``, which runs them in a
+short transaction and retries lock errors with jittered exponential backoff.
+"""
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+
+from .metrics import DB_LOCK_RETRIES
+
+LOCK_MESSAGES = ("database is locked", "database table is locked", "deadlock detected", "could not obtain lock")
+
+
+def is_lock_error(error):
+    message = str(error).lower()
+    return any(text in message for text in LOCK_MESSAGES)
+
+
+def write_with_retry(func, *args, attempts=None, base_delay=None, **kwargs):
+    """Run ``func`` in its own transaction, retrying it when the database is locked.
+
+    Keep ``func`` to the writes themselves; do the reads and computation
+    before calling it. Inside an outer transaction a retry cannot undo the
+    work done so far, so lock errors are raised straight away there.
+    """
+    attempts = attempts or getattr(settings, "DB_WRITE_ATTEMPTS", 5)
+    base_delay = base_delay if base_delay is not None else getattr(settings, "DB_WRITE_BACKOFF", 0.05)
+    for attempt in range(1, attempts + 1):
+        try:
+            with transaction.atomic():
+                return func(*args, **kwargs)
+        except OperationalError as e:
+            if attempt == attempts or connection.in_atomic_block or not is_lock_error(e):
+                raise
+            DB_LOCK_RETRIES.inc()
+            time.sleep(random.uniform(0, base_delay * 2 ** (attempt - 1)))
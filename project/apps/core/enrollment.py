@@ -0,0 +1,187 @@
+"""
+Bulk student enrollment from CSV or XLSX files.
+
+Hashing is the expensive part of creating a user: every password costs a full
+run of the configured hasher. The importer validates the whole file first,
+hashes the passwords of the valid rows across a process pool and then inserts
+the users with ``bulk_create`` in batches.
+"""
+import csv
+import io
+import os
+from zipfile import BadZipFile
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher
+from django.db import transaction
+
+from .models import Gender, StudentClass, User
+
+COLUMNS = ("username", "first_name", "last_name", "email", "gender", "student_class", "password")
+HASH_CHUNK_SIZE = 64
+
+
+class EnrollmentError(Exception):
+    """Raised when an enrollment file cannot be read at all."""
+
+
+class EnrollmentReport:
+    def __init__(self):
+        self.created = []
+        self.duplicates = []
+        self.errors = []
+
+    def add_duplicate(self, line, username, reason):
+        self.duplicates.append((line, username, reason))
+
+    def add_error(self, line, message):
+        self.errors.append((line, message))
+
+
+def read_rows(file, filename=""):
+    """Return the rows of a CSV or XLSX upload as dicts keyed by lower-cased header."""
+    if str(filename).lower().endswith(".xlsx"):
+        return _read_xlsx(file)
+
+    content = file.read()
+    if isinstance(content, bytes):
+        try:
+            content = content.decode("utf-8-sig")
+        except UnicodeDecodeError:
+            raise EnrollmentError("The file is not UTF-8 text; save it as CSV (UTF-8) and upload it again.")
+    reader = csv.DictReader(io.StringIO(content))
+    if not reader.fieldnames:
+        raise EnrollmentError("The file is empty.")
+    return [
+        {(key or "").strip().lower(): (value or "").strip() for key, value in row.items()}
+        for row in reader
+    ]
+
+
+def _read_xlsx(file):
+    try:
+        from openpyxl import load_workbook
+        from openpyxl.utils.exceptions import InvalidFileException
+    except ImportError:
+        raise EnrollmentError("Reading .xlsx files requires the openpyxl package.")
+
+    try:
+        # Read-only sheets parse lazily, so a damaged sheet fails while iterating.
+        rows = load_workbook(file, read_only=True, data_only=True).active.iter_rows(values_only=True)
+        try:
+            header = [str(cell or "").strip().lower() for cell in next(rows)]
+        except StopIteration:
+            raise EnrollmentError("The file is empty.")
+        return [
+            {key: str(value).strip() if value is not None else "" for key, value in zip(header, row)}
+            for row in rows
+            if any(value is not None for value in row)
+        ]
+    except (BadZipFile, InvalidFileException, KeyError, ValueError, OSError):
+        raise EnrollmentError("The file is not a readable .xlsx workbook.")
+
+
+def _hash_chunk(algorithm, passwords):
+    hasher = get_hasher(algorithm)
+    return [hasher.encode(password, hasher.salt()) for password in passwords]
+
+
+def default_workers():
+    """The size of the hashing pool of the ``import_students`` command."""
+    return getattr(settings, "ENROLLMENT_HASH_WORKERS", None) or os.cpu_count() or 1
+
+
+def hash_passwords(passwords, workers=1):
+    """Hash ``passwords`` with the default hasher, spread over ``workers`` processes."""
+    if not passwords:
+        return []
+
+    algorithm = get_hasher().algorithm
+    chunks = [passwords[i:i + HASH_CHUNK_SIZE] for i in range(0, len(passwords), HASH_CHUNK_SIZE)]
+    if workers == 1 or len(chunks) == 1:
+        return [encoded for chunk in chunks for encoded in _hash_chunk(algorithm, chunk)]
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    # django.setup() makes the workers usable under the spawn start method too.
+    with ProcessPoolExecutor(max_workers=min(workers, len(chunks)), initializer=django.setup) as pool:
+        results = pool.map(_hash_chunk, [algorithm] * len(chunks), chunks)
+        return [encoded for chunk in results for encoded in chunk]
+
+
+def import_students(rows, default_password="", batch_size=500, workers=1, dry_run=False):
+    """Create a student for every valid row and return an ``EnrollmentReport``.
+
+    Rows whose username already exists, either in the database or earlier in
+    the file, are reported as duplicates and skipped. Rows with an unknown
+    class, an invalid gender or no password are reported as errors.
+    """
+    report = EnrollmentReport()
+    classes = {name.lower(): pk for name, pk in StudentClass.objects.values_list("name", "id")}
+    genders = {value for value, _ in Gender.GENDER_CHOICES}
+
+    pending = []
+    seen = {}
+    for line, row in enumerate(rows, start=2):
+        username = row.get("username", "")
+        if not username:
+            report.add_error(line, "Missing username.")
+            continue
+        if username in seen:
+            report.add_duplicate(line, username, f"repeats line {seen[username]}")
+            continue
+        seen[username] = line
+
+        class_name = row.get("student_class", "")
+        class_id = classes.get(class_name.lower()) if class_name else None
+        if class_name and class_id is None:
+            report.add_error(line, f"Unknown class '{class_name}'.")
+            continue
+
+        gender = row.get("gender", "").lower()
+        if gender and gender not in genders:
+            report.add_error(line, f"Unknown gender '{row['gender']}'.")
+            continue
+
+        password = row.get("password") or default_password
+        if not password:
+            report.add_error(line, "No password given and no default password set.")
+            continue
+
+        pending.append((line, password, User(
+            username=username,
+            first_name=row.get("first_name", ""),
+            last_name=row.get("last_name", ""),
+            email=row.get("email", ""),
+            gender=gender,
+            student_class_id=class_id,
+        )))
+
+    existing = set()
+    usernames = [user.username for _, _, user in pending]
+    for i in range(0, len(usernames), batch_size):
+        existing.update(
+            User.objects.filter(username__in=usernames[i:i + batch_size])
+            .values_list("username", flat=True)
+        )
+    new = []
+    for line, password, user in pending:
+        if user.username in existing:
+            report.add_duplicate(line, user.username, "already exists")
+        else:
+            new.append((password, user))
+
+    if dry_run or not new:
+        report.created = [user for _, user in new]
+        return report
+
+    encoded = hash_passwords([password for password, _ in new], workers=workers)
+    users = []
+    for (_, user), password in zip(new, encoded):
+        user.password = password
+        users.append(user)
+
+    with transaction.atomic():
+        report.created = User.objects.bulk_create(users, batch_size=batch_size)
+    return report
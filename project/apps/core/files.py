@@ -0,0 +1,37 @@
+"""
+Helpers for state that worker processes share through files.
+"""
+import os
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # Windows only runs the single-process development server.
+    fcntl = None
+
+
+@contextmanager
+def file_lock(path, shared=False):
+    """Hold an advisory lock on ``path`` (created if missing) across processes."""
+    with open(path, "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def process_alive(pid):
+    """Whether a process with ``pid`` runs on this machine."""
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
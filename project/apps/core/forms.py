@@ -1,5 +1,6 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm, UserChangeForm
+from .enrollment import COLUMNS
 from .models import User, Subject, StudentClass, AcademicTerm, AcademicSession
 
 
@@ -92,3 +93,21 @@ class AcademicSessionForm(forms.ModelForm, ResponsiveForm):
     class Meta:
         model = AcademicSession
         fields = ['name']
+
+
+class StudentImportForm(ResponsiveForm, forms.Form):
+    file = forms.FileField(
+        help_text="CSV or XLSX with the columns: " + ", ".join(COLUMNS),
+    )
+    default_password = forms.CharField(
+        required=False,
+        widget=forms.PasswordInput,
+        help_text="Used for rows that leave the password column empty.",
+    )
+    dry_run = forms.BooleanField(required=False, label="Only validate the file")
+
+    def clean_file(self):
+        file = self.cleaned_data["file"]
+        if not file.name.lower().endswith((".csv", ".xlsx")):
+            raise forms.ValidationError("Upload a .csv or .xlsx file.")
+        return file
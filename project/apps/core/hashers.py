@@ -0,0 +1,21 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher, must_update_salt
+
+
+class TunablePBKDF2PasswordHasher(PBKDF2PasswordHasher):
+    """PBKDF2 with the iteration count taken from ``PASSWORD_HASH_ITERATIONS``.
+
+    It shares the ``pbkdf2_sha256`` algorithm name with Django's hasher, so
+    existing hashes keep verifying. When the configured cost goes up, each
+    password is re-hashed at the new cost on the user's next login. Lowering
+    it only applies to new passwords: a cheap cost set for a busy exam day
+    must not stay on every account that logged in while it was set.
+    """
+
+    @property
+    def iterations(self):
+        return getattr(settings, "PASSWORD_HASH_ITERATIONS", None) or PBKDF2PasswordHasher.iterations
+
+    def must_update(self, encoded):
+        decoded = self.decode(encoded)
+        return decoded["iterations"] < self.iterations or must_update_salt(decoded["salt"], self.salt_entropy)
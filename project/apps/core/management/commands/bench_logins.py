@@ -0,0 +1,68 @@
+import statistics
+import time
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import get_hasher
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from django.urls import reverse
+
+User = get_user_model()
+
+BENCH_USERNAME = '__bench_login__'
+BENCH_PASSWORD = 'bench-login-password'
+
+
+class Command(BaseCommand):
+    help = 'Measure logins per second for a single worker through the full login view'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=20, help='Number of logins to time')
+        parser.add_argument(
+            '--hash-iterations', type=int, default=None,
+            help='Override PASSWORD_HASH_ITERATIONS for the run',
+        )
+
+    def handle(self, *args, **options):
+        iterations = options['hash_iterations']
+        if iterations is None:
+            iterations = settings.PASSWORD_HASH_ITERATIONS
+
+        with override_settings(ALLOWED_HOSTS=['testserver'], PASSWORD_HASH_ITERATIONS=iterations):
+            hasher = get_hasher()
+            self.stdout.write(
+                f'Session engine: {settings.SESSION_ENGINE}\n'
+                f'Hasher: {hasher.algorithm} ({getattr(hasher, "iterations", "n/a")} iterations)'
+            )
+
+            # The benchmark logs in against the real database; leave nothing of it behind,
+            # including the user of an earlier run that was killed.
+            User.objects.filter(username=BENCH_USERNAME).delete()
+            user = User.objects.create_user(username=BENCH_USERNAME, password=BENCH_PASSWORD)
+            client = Client()
+            try:
+                timings = self.run_logins(client, options['logins'])
+            finally:
+                client.logout()
+                user.delete()
+
+        total = sum(timings)
+        self.stdout.write(
+            f'Logins: {len(timings)} in {total:.2f}s\n'
+            f'Mean: {statistics.mean(timings) * 1000:.1f} ms, '
+            f'max: {max(timings) * 1000:.1f} ms'
+        )
+        self.stdout.write(self.style.SUCCESS(f'{len(timings) / total:.1f} logins/s per worker'))
+
+    def run_logins(self, client, count):
+        url = reverse('login')
+        timings = []
+        for _ in range(count):
+            started = time.perf_counter()
+            response = client.post(url, {'username': BENCH_USERNAME, 'password': BENCH_PASSWORD})
+            timings.append(time.perf_counter() - started)
+            if response.status_code != 302:
+                self.stderr.write(f'Login failed with status {response.status_code}')
+            client.logout()
+        return timings
@@ -0,0 +1,65 @@
+import statistics
+
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from apps.core.startup import missing_bytecode, run_child
+
+# Default budgets; pass targets measured on your own hardware with the options below.
+COLD_START_TARGET_MS = 600
+FIRST_REQUEST_TARGET_MS = 100
+
+
+class Command(BaseCommand):
+    help = 'Measure worker cold-start time and first-request latency against targets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--runs', type=int, default=5, help='Fresh worker starts to measure')
+        parser.add_argument('--path', default=None, help='Path of the first request (default: the login page)')
+        parser.add_argument('--cold-start-target', type=float, default=COLD_START_TARGET_MS, help='Milliseconds')
+        parser.add_argument('--first-request-target', type=float, default=FIRST_REQUEST_TARGET_MS, help='Milliseconds')
+
+    def handle(self, *args, **options):
+        path = options['path'] or reverse('login')
+        missing = missing_bytecode()
+        if missing:
+            self.stdout.write(self.style.WARNING(
+                f'{len(missing)} project modules have no compiled bytecode; where it cannot be written '
+                f'(read-only code, PYTHONDONTWRITEBYTECODE) every start compiles them again. '
+                f'Run "python -m compileall -q ." after deploying.'
+            ))
+
+        runs = []
+        for _ in range(options['runs']):
+            try:
+                timings, _ = run_child(path)
+            except RuntimeError as e:
+                raise CommandError(str(e))
+            runs.append(timings)
+
+        statuses = {run['status'] for run in runs}
+        self.stdout.write(f'{len(runs)} cold starts, first request GET {path} -> {", ".join(map(str, statuses))}')
+        rows = [
+            ('interpreter', 'interpreter'),
+            ('django setup', 'setup'),
+            ('wsgi ready', 'wsgi'),
+            ('cold start', 'cold_start'),
+            ('first request', 'first_request'),
+        ]
+        for label, key in rows:
+            values = [run[key] for run in runs]
+            self.stdout.write(
+                f'  {label:<14} median {statistics.median(values):7.1f} ms  max {max(values):7.1f} ms'
+            )
+
+        failures = []
+        for label, key, target in (
+            ('cold start', 'cold_start', options['cold_start_target']),
+            ('first request', 'first_request', options['first_request_target']),
+        ):
+            median = statistics.median(run[key] for run in runs)
+            if median > target:
+                failures.append(f'{label} median {median:.1f} ms is over the {target:.0f} ms target')
+        if failures:
+            raise CommandError('; '.join(failures))
+        self.stdout.write(self.style.SUCCESS('Within the startup targets.'))
@@ -0,0 +1,49 @@
+import re
+from pathlib import Path
+
+from django.contrib.staticfiles import finders
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.template import engines
+
+# A quoted path under /static/ written into the page instead of {% static %}.
+HARD_CODED = re.compile(r"""(?:src|href)\s*=\s*["'](?:/?static/|\{\{\s*STATIC_URL\s*\}\})""")
+STATIC_TAG = re.compile(r"""\{%\s*static\s+["']([^"']+)["']""")
+
+
+def template_files():
+    for engine in engines.all():
+        for directory in engine.template_dirs:
+            yield from sorted(Path(directory).rglob('*.html'))
+
+
+class Command(BaseCommand):
+    help = 'Check that templates only reference static files through fingerprinted {% static %} names'
+
+    def handle(self, *args, **options):
+        manifest = staticfiles_storage.hashed_files
+        if not manifest:
+            self.stdout.write(
+                self.style.WARNING('No staticfiles manifest; run collectstatic to check the hashed names too.')
+            )
+
+        problems = []
+        checked = 0
+        for path in template_files():
+            for number, line in enumerate(path.read_text(encoding='utf-8').splitlines(), 1):
+                where = f'{path}:{number}'
+                if HARD_CODED.search(line):
+                    problems.append(f'{where}: hard-coded static path, use {{% static %}}')
+                for name in STATIC_TAG.findall(line):
+                    checked += 1
+                    if not finders.find(name):
+                        problems.append(f'{where}: {name} is not a static file')
+                    elif manifest and name not in manifest:
+                        problems.append(f'{where}: {name} has no hashed name; rerun collectstatic')
+
+        self.stdout.write(f'Static references checked: {checked}')
+        if problems:
+            for problem in problems:
+                self.stdout.write(self.style.ERROR(problem))
+            raise CommandError(f'{len(problems)} static reference problem(s)')
+        self.stdout.write(self.style.SUCCESS('Every static reference is fingerprinted.'))
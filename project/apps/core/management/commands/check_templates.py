@@ -18,7 +18,9 @@ class Command(BaseCommand):
             'modal_create.html',
             'modal_delete.html',
             'core/student_list.html',
+            'core/student_import.html',
             'core/staff_list.html',
+            'core/profiling.html',
             'core/term_session_list.html',
             'exam/create.html',
             'exam/exam_detail.html',
@@ -29,6 +31,7 @@ class Command(BaseCommand):
             'exam/question_form.html',
             'exam/myexams.html',
             'exam/add_question_from_bank.html',
+            'exam/blueprint.html',
             'error/401.html',
             'error/403.html',
             'error/404.html',
@@ -0,0 +1,44 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.enrollment import EnrollmentError, default_workers, import_students, read_rows
+
+
+class Command(BaseCommand):
+    help = 'Enroll students in bulk from a CSV or XLSX file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV or XLSX file with a header row')
+        parser.add_argument('--password', default='', help='Password for rows without one')
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument('--workers', type=int, default=None, help='Processes used for password hashing')
+        parser.add_argument('--dry-run', action='store_true', help='Validate the file without creating users')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            with open(options['path'], 'rb') as f:
+                rows = read_rows(f, options['path'])
+        except (OSError, EnrollmentError) as e:
+            raise CommandError(str(e))
+
+        report = import_students(
+            rows,
+            default_password=options['password'],
+            batch_size=options['batch_size'],
+            workers=options['workers'] or default_workers(),
+            dry_run=options['dry_run'],
+        )
+        elapsed = time.perf_counter() - started
+
+        for line, username, reason in report.duplicates:
+            self.stdout.write(self.style.WARNING(f'Line {line}: duplicate {username} ({reason})'))
+        for line, message in report.errors:
+            self.stdout.write(self.style.ERROR(f'Line {line}: {message}'))
+
+        verb = 'Would create' if options['dry_run'] else 'Created'
+        self.stdout.write(self.style.SUCCESS(
+            f'{verb} {len(report.created)} students from {len(rows)} rows in {elapsed:.2f}s '
+            f'({len(report.duplicates)} duplicates, {len(report.errors)} errors)'
+        ))
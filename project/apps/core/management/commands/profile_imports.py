@@ -0,0 +1,54 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.core.startup import missing_bytecode, parse_importtime, run_child
+
+
+class Command(BaseCommand):
+    help = 'Report the slowest imports and app ready() hooks of a fresh worker start'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=20, help='Rows per table')
+        parser.add_argument(
+            '--prefix', default='', help='Only list modules starting with this, e.g. apps. or django_filters',
+        )
+
+    def handle(self, *args, **options):
+        missing = missing_bytecode()
+        if missing:
+            self.stdout.write(self.style.WARNING(
+                f'{len(missing)} project modules have no compiled bytecode; where it cannot be written '
+                f'(read-only code, PYTHONDONTWRITEBYTECODE) every start compiles them again. '
+                f'Run "python -m compileall -q ." after deploying.'
+            ))
+
+        try:
+            timings, log = run_child(importtime=True)
+        except RuntimeError as e:
+            raise CommandError(str(e))
+        modules = [module for module in parse_importtime(log) if module[0].startswith(options['prefix'])]
+        limit = options['limit']
+
+        self.stdout.write('Phases (ms from interpreter start; import tracing slows them down):')
+        for phase in ('django_imported', 'setup', 'wsgi'):
+            self.stdout.write(f'  {phase:<16} {timings[phase]:8.1f}')
+
+        self.stdout.write('\nApp ready() hooks (ms):')
+        for label, elapsed in sorted(timings['ready_hooks'].items(), key=lambda item: -item[1]):
+            self.stdout.write(f'  {label:<24} {elapsed:8.1f}')
+
+        packages = defaultdict(int)
+        for name, own, _ in modules:
+            packages[name.split('.')[0]] += own
+        self.stdout.write('\nPackages by own import time (ms):')
+        for package, own in sorted(packages.items(), key=lambda item: -item[1])[:limit]:
+            self.stdout.write(f'  {package:<40} {own / 1000:8.1f}')
+
+        self.stdout.write('\nSlowest modules, own time (ms):')
+        for name, own, _ in sorted(modules, key=lambda module: -module[1])[:limit]:
+            self.stdout.write(f'  {name:<56} {own / 1000:8.1f}')
+
+        self.stdout.write('\nSlowest modules including their imports (ms):')
+        for name, _, cumulative in sorted(modules, key=lambda module: -module[2])[:limit]:
+            self.stdout.write(f'  {name:<56} {cumulative / 1000:8.1f}')
@@ -0,0 +1,315 @@
+"""
+In-process metrics with a scrape-style text endpoint.
+
+Counters and histograms live in memory and are updated under a thread lock,
+never through the database. With ``METRICS_DIR`` set, every worker process
+also writes its values to ``<METRICS_DIR>/<pid>-<start time>.json`` at most
+every ``METRICS_FLUSH_INTERVAL`` seconds, and the endpoint adds up the files
+of all workers, so any worker can answer a scrape for the whole server.
+Without ``METRICS_DIR`` the endpoint reports the process that serves it.
+
+A worker that exits folds its values into ``retired.json`` and removes its
+file; a starting worker does the same for the files of workers that died
+without exiting cleanly. Counters keep growing across worker restarts and
+the directory holds one file per running worker.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+from .files import file_lock, process_alive
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+RETIRED_FILE = "retired.json"
+LOCK_FILE = ".lock"
+
+
+def _label_key(labelnames, labels):
+    return json.dumps([str(labels[name]) for name in labelnames])
+
+
+def _format_labels(labelnames, key, extra=()):
+    pairs = list(zip(labelnames, json.loads(key))) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in pairs) + "}"
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, registry, name, documentation, labelnames=()):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+    def inc(self, amount=1, **labels):
+        self.registry.update(self, _label_key(self.labelnames, labels), amount)
+
+    def empty(self):
+        return 0
+
+    def add(self, current, amount):
+        return current + amount
+
+    def exposition(self, values):
+        return [
+            f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+            for key, value in sorted(values.items())
+        ]
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, registry, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        self.registry.update(self, _label_key(self.labelnames, labels), value)
+
+    def time(self, **labels):
+        return _Timer(self, labels)
+
+    def empty(self):
+        # One count per bucket, then the +Inf count and the sum.
+        return [0] * (len(self.buckets) + 1) + [0.0]
+
+    def add(self, current, value):
+        current = list(current)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                current[i] += 1
+                break
+        else:
+            current[len(self.buckets)] += 1
+        current[-1] += value
+        return current
+
+    def exposition(self, values):
+        lines = []
+        for key, value in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), value[:-1]):
+                cumulative += count
+                labels = _format_labels(self.labelnames, key, [("le", bound)])
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {value[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class _Timer:
+    def __init__(self, histogram, labels):
+        self.histogram = histogram
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.histogram.observe(time.perf_counter() - self.started, **self.labels)
+
+
+def _merge(snapshots):
+    """Add up snapshots; counters are numbers and histograms lists of bucket counts."""
+    totals = {}
+    for snapshot in snapshots:
+        for name, series in snapshot.items():
+            merged = totals.setdefault(name, {})
+            for key, value in series.items():
+                if key not in merged:
+                    merged[key] = value
+                elif isinstance(value, list):
+                    merged[key] = [a + b for a, b in zip(merged[key], value)]
+                else:
+                    merged[key] += value
+    return totals
+
+
+def _read(path):
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def _write(path, values):
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    tmp.write_text(json.dumps(values))
+    os.replace(tmp, path)
+
+
+def _file_pid(path):
+    try:
+        return int(path.stem.split("-", 1)[0])
+    except ValueError:
+        return None
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+        self._start_process()
+        self.last_flush = time.monotonic()
+
+    def _start_process(self):
+        self.pid = os.getpid()
+        # The start time keeps a new worker off the file of a dead one with the same pid.
+        self.filename = f"{self.pid}-{time.time_ns()}.json"
+        self.values = {}
+        self.reaped = False
+
+    def _check_fork(self):
+        if os.getpid() != self.pid:
+            # A forked worker starts from zero, or the parent's values would count twice.
+            self._start_process()
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(self, name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(self, name, documentation, labelnames, buckets))
+
+    def _register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def update(self, metric, key, amount):
+        with self.lock:
+            self._check_fork()
+            series = self.values.setdefault(metric.name, {})
+            series[key] = metric.add(series.get(key, metric.empty()), amount)
+        if time.monotonic() - self.last_flush >= getattr(settings, "METRICS_FLUSH_INTERVAL", 5):
+            self.flush()
+
+    def snapshot(self):
+        with self.lock:
+            self._check_fork()
+            return json.loads(json.dumps(self.values))
+
+    def _directory(self):
+        directory = getattr(settings, "METRICS_DIR", None)
+        return Path(directory) if directory else None
+
+    def flush(self):
+        """Write this process' values to its file in ``METRICS_DIR``, if one is set."""
+        directory = self._directory()
+        self.last_flush = time.monotonic()
+        if directory is None:
+            return
+        directory.mkdir(parents=True, exist_ok=True)
+        values = self.snapshot()
+        if not self.reaped:
+            self.reaped = True
+            self.reap()
+        _write(directory / self.filename, values)
+
+    def reap(self):
+        """Fold the files of workers that are gone into the retired totals."""
+        directory = self._directory()
+        if directory is None or not directory.is_dir():
+            return
+        with file_lock(directory / LOCK_FILE):
+            dead = [
+                path for path in directory.glob("*.json")
+                if path.name != RETIRED_FILE and _file_pid(path) is not None
+                and not process_alive(_file_pid(path))
+            ]
+            if dead:
+                retired = directory / RETIRED_FILE
+                _write(retired, _merge([_read(retired)] + [_read(path) for path in dead]))
+                for path in dead:
+                    path.unlink(missing_ok=True)
+
+    def retire(self):
+        """Fold this process' values into the retired totals and remove its file, at exit."""
+        directory = self._directory()
+        if directory is None or not directory.is_dir():
+            return
+        values = self.snapshot()
+        with file_lock(directory / LOCK_FILE):
+            retired = directory / RETIRED_FILE
+            _write(retired, _merge([_read(retired), values]))
+            (directory / self.filename).unlink(missing_ok=True)
+
+    def collect(self):
+        """Values of every worker: the files in ``METRICS_DIR`` plus this process."""
+        snapshots = [self.snapshot()]
+        directory = self._directory()
+        if directory is not None and directory.is_dir():
+            # Shared, so a worker folding files into the retired totals is never half seen.
+            with file_lock(directory / LOCK_FILE, shared=True):
+                snapshots += [
+                    _read(path) for path in directory.glob("*.json") if path.name != self.filename
+                ]
+
+        totals = _merge(snapshots)
+        return {name: series for name, series in totals.items() if name in self.metrics}
+
+    def render(self, extra_lines=()):
+        self.flush()
+        totals = self.collect()
+        lines = []
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.documentation}")
+            lines.append(f"# TYPE {name} {metric.kind}")
+            lines.extend(metric.exposition(totals.get(name, {})))
+        lines.extend(extra_lines)
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+atexit.register(registry.retire)
+
+REQUEST_LATENCY = registry.histogram(
+    "cbt_http_request_duration_seconds", "Time to answer a request, by view.", ["view"]
+)
+ANSWER_TRANSITIONS = registry.counter(
+    "cbt_answer_transitions_total",
+    "Exam attempts moved to another status (start, submit, terminate, expire).",
+    ["transition"],
+)
+GRADING_TIME = registry.histogram(
+    "cbt_grading_duration_seconds", "Time to mark a submitted exam.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1),
+)
+CACHE_REQUESTS = registry.counter(
+    "cbt_cache_requests_total", "Cache lookups, by cache and hit or miss.", ["cache", "result"]
+)
+DB_LOCK_RETRIES = registry.counter(
+    "cbt_db_lock_retries_total", "Writes retried because the database was locked."
+)
+
+
+def record_cache(cache_name, hit):
+    CACHE_REQUESTS.inc(cache=cache_name, result="hit" if hit else "miss")
+
+
+class MetricsMiddleware:
+    """Observe every request's latency under its view name."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+        match = request.resolver_match
+        REQUEST_LATENCY.observe(
+            time.perf_counter() - started, view=match.view_name if match else "unresolved"
+        )
+        return response
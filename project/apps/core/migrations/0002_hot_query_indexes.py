@@ -0,0 +1,22 @@
+# Generated by Django 5.1.5 on 2026-10-19 10:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('is_staff', False), ('is_superuser', False)), fields=['first_name', 'last_name', 'username'], name='user_student_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='user',
+            index=models.Index(condition=models.Q(('is_staff', True), ('is_superuser', False)), fields=['first_name', 'last_name', 'username'], name='user_staff_name_idx'),
+        ),
+    ]
@@ -19,6 +19,22 @@ class User(AbstractUser):
         "StudentClass", on_delete=models.SET_NULL, null=True, blank=True
     )
 
+    class Meta(AbstractUser.Meta):
+        # Partial indexes: the role filters render as "NOT is_staff", which a
+        # plain index on the boolean columns cannot serve.
+        indexes = [
+            models.Index(
+                fields=["first_name", "last_name", "username"],
+                condition=models.Q(is_staff=False, is_superuser=False),
+                name="user_student_name_idx",
+            ),
+            models.Index(
+                fields=["first_name", "last_name", "username"],
+                condition=models.Q(is_staff=True, is_superuser=False),
+                name="user_staff_name_idx",
+            ),
+        ]
+
 
 class Subject(models.Model):
     name = models.CharField(max_length=200, unique=True)
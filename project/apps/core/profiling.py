@@ -0,0 +1,169 @@
+"""
+Opt-in per-request profiling.
+
+With ``PROFILING_ENABLED`` on, ``ProfilingMiddleware`` times every request and
+splits the time into SQL (through an execute wrapper on every database
+connection, replicas included) and template
+rendering (through ``TimedDjangoTemplates``), and sends the split back in a
+``Server-Timing`` header, which browser dev tools show next to the request.
+
+A sample of the requests (``PROFILING_SAMPLE_RATE``) also keeps its SQL
+statements and goes into a per-process ring buffer of the last
+``PROFILING_BUFFER_SIZE`` requests, which the staff profiling page
+aggregates. Only sampled requests pay for keeping statements, so the
+middleware is cheap enough to leave on.
+"""
+import random
+import time
+from collections import Counter, defaultdict, deque
+from contextlib import ExitStack
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.backends.django import DjangoTemplates
+
+_current = ContextVar("request_profile", default=None)
+samples = deque(maxlen=getattr(settings, "PROFILING_BUFFER_SIZE", 500))
+
+
+class RequestProfile:
+    def __init__(self, keep_statements):
+        self.keep_statements = keep_statements
+        self.started = time.perf_counter()
+        self.sql_count = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        """Database execute wrapper timing every query."""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - started
+            self.sql_count += 1
+            self.sql_time += elapsed
+            if self.keep_statements:
+                self.statements.append((sql, elapsed))
+
+    def server_timing(self, total):
+        return (
+            f'sql;dur={self.sql_time * 1000:.1f};desc="{self.sql_count} queries", '
+            f"tpl;dur={self.template_time * 1000:.1f}, "
+            f"total;dur={total * 1000:.1f}"
+        )
+
+
+class TimedTemplate:
+    """Backend template that adds its render time to the current request profile."""
+
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        profile = _current.get()
+        if profile is None:
+            return self.template.render(context, request)
+        started = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            profile.template_time += time.perf_counter() - started
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """The Django template backend with render timing for ``ProfilingMiddleware``.
+
+    Templates pulled in with ``{% include %}`` or ``{% extends %}`` render
+    inside the top-level template, so their time is counted once.
+    """
+
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        if not getattr(settings, "PROFILING_ENABLED", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, "PROFILING_SAMPLE_RATE", 0.1)
+
+    def __call__(self, request):
+        profile = RequestProfile(keep_statements=random.random() < self.sample_rate)
+        token = _current.set(profile)
+        try:
+            with ExitStack() as stack:
+                for conn in connections.all():
+                    stack.enter_context(conn.execute_wrapper(profile))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+
+        total = time.perf_counter() - profile.started
+        response["Server-Timing"] = profile.server_timing(total)
+        if profile.keep_statements:
+            match = request.resolver_match
+            samples.append({
+                "view": match.view_name if match else request.path,
+                "path": request.path,
+                "status": response.status_code,
+                "total": total,
+                "sql_time": profile.sql_time,
+                "sql_count": profile.sql_count,
+                "template_time": profile.template_time,
+                "statements": profile.statements,
+            })
+        return response
+
+
+def summarize(requests, limit=20):
+    """Aggregate sampled ``requests`` into the slowest views and most repeated statements."""
+    views = defaultdict(list)
+    for sample in requests:
+        views[sample["view"]].append(sample)
+
+    slowest = []
+    for view, rows in views.items():
+        totals = sorted(row["total"] for row in rows)
+        slowest.append({
+            "view": view,
+            "requests": len(rows),
+            "mean_ms": sum(totals) / len(totals) * 1000,
+            "max_ms": totals[-1] * 1000,
+            "sql_ms": sum(row["sql_time"] for row in rows) / len(rows) * 1000,
+            "template_ms": sum(row["template_time"] for row in rows) / len(rows) * 1000,
+            "queries": sum(row["sql_count"] for row in rows) / len(rows),
+        })
+    slowest.sort(key=lambda row: row["mean_ms"], reverse=True)
+
+    executions = Counter()
+    time_spent = Counter()
+    most_per_request = Counter()
+    for sample in requests:
+        per_request = Counter(sql for sql, _ in sample["statements"])
+        for sql, elapsed in sample["statements"]:
+            executions[sql] += 1
+            time_spent[sql] += elapsed
+        for sql, count in per_request.items():
+            most_per_request[sql] = max(most_per_request[sql], count)
+
+    repeated = [
+        {
+            "sql": sql,
+            "executions": count,
+            "max_per_request": most_per_request[sql],
+            "total_ms": time_spent[sql] * 1000,
+        }
+        for sql, count in executions.most_common(limit)
+    ]
+    return slowest[:limit], repeated
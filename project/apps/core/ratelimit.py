@@ -0,0 +1,127 @@
+"""
+Sliding-window rate limits for write endpoints.
+
+``rate_limit(endpoint)`` wraps a view. Every write request to it (anything
+but GET, HEAD and OPTIONS) counts against the budgets of
+``RATE_LIMITS[endpoint]``: one per signed-in user and one per client
+address, each ``(requests, seconds)``. A request over either budget gets a
+429 with ``Retry-After`` before the view runs. The user comes from the
+session, not the user table: with cached or signed-cookie sessions a
+refused request runs no queries, with database sessions only the session
+read. Requests relayed by one of ``TRUSTED_PROXIES`` count against the
+address the proxy reports.
+
+Counts live in the shared cache, so a budget holds across workers. The
+sliding window is estimated from two fixed windows: the count of the
+current one plus the previous one's, weighted by how much of it the sliding
+window still covers. That needs two keys per budget instead of a log of
+every request.
+
+``cbt_rate_limit_requests_total`` counts the requests of each endpoint and
+scope as ``allowed``, ``near_limit`` (allowed, but past
+``RATE_LIMIT_WARN_RATIO`` of the budget) or ``limited``. Budgets are right
+when exam-day traffic stays out of the last two.
+"""
+import functools
+import math
+import time
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import cache
+from django.http import JsonResponse
+
+from .metrics import registry
+
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+RATE_LIMIT_REQUESTS = registry.counter(
+    "cbt_rate_limit_requests_total",
+    "Write requests checked against rate limits, by endpoint, scope and result.",
+    ["endpoint", "scope", "result"],
+)
+
+
+def client_ip(request):
+    """The client's address, as reported by the proxy when a trusted one relayed the request."""
+    remote = request.META.get("REMOTE_ADDR", "")
+    trusted = getattr(settings, "TRUSTED_PROXIES", [])
+    if remote not in trusted:
+        return remote
+    real_ip = request.META.get("HTTP_X_REAL_IP", "").strip()
+    if real_ip:
+        return real_ip
+    forwarded = [a.strip() for a in request.META.get("HTTP_X_FORWARDED_FOR", "").split(",") if a.strip()]
+    # Proxies append on the right; anything left of the last untrusted hop may be forged.
+    for address in reversed(forwarded):
+        if address not in trusted:
+            return address
+    return remote
+
+
+def _identities(request):
+    session = getattr(request, "session", None)
+    yield "user", session.get(SESSION_KEY) if session is not None else None
+    yield "ip", client_ip(request) or None
+
+
+def _incr(key, window):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # The first request of this window; a concurrent first request may win the add.
+        if cache.add(key, 1, 2 * window):
+            return 1
+        return cache.incr(key)
+
+
+def hit(key, limit, window, now=None):
+    """Count a request against ``key``; return the requests in the sliding window and the seconds until one is free."""
+    now = time.time() if now is None else now
+    current = int(now // window)
+    count = _incr(f"ratelimit:{key}:{current}", window)
+    previous = cache.get(f"ratelimit:{key}:{current - 1}", 0)
+    elapsed = now - current * window
+    used = count + previous * (1 - elapsed / window)
+    if count < limit and previous:
+        # The previous window's weight decays until a request fits again.
+        wait = (1 - (limit - count) / previous) * window - elapsed
+    else:
+        wait = window - elapsed
+    return used, max(1, math.ceil(wait))
+
+
+def too_many_requests(wait):
+    response = JsonResponse({"error": "Too many requests", "retry_after": wait}, status=429)
+    response["Retry-After"] = str(wait)
+    return response
+
+
+def check(request, endpoint):
+    """Count the request against the endpoint's budgets; return a 429 response when one is spent."""
+    budgets = settings.RATE_LIMITS.get(endpoint, {})
+    for scope, identity in _identities(request):
+        if identity is None or scope not in budgets:
+            continue
+        limit, window = budgets[scope]
+        used, wait = hit(f"{endpoint}:{scope}:{identity}", limit, window)
+        if used > limit:
+            RATE_LIMIT_REQUESTS.inc(endpoint=endpoint, scope=scope, result="limited")
+            return too_many_requests(wait)
+        near = used >= limit * settings.RATE_LIMIT_WARN_RATIO
+        RATE_LIMIT_REQUESTS.inc(endpoint=endpoint, scope=scope, result="near_limit" if near else "allowed")
+    return None
+
+
+def rate_limit(endpoint):
+    """Refuse write requests to the view beyond the budgets of ``RATE_LIMITS[endpoint]``."""
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if settings.RATE_LIMIT_ENABLED and request.method not in SAFE_METHODS:
+                refused = check(request, endpoint)
+                if refused is not None:
+                    return refused
+            return view(request, *args, **kwargs)
+        return wrapper
+    return decorator
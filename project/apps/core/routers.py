@@ -0,0 +1,140 @@
+"""
+Read-replica routing.
+
+Every query goes to the primary (``default``) unless the request runs a view
+with ``ReplicaReadMixin`` (reporting pages) or the code is inside
+``reading_from_replica()``; those reads go to one of ``DATABASE_REPLICAS``.
+
+Replicas lag behind the primary, so reads return to the primary as soon as
+the request writes anything, and ``ReplicaPinMiddleware`` keeps a browser on
+the primary for ``REPLICA_PIN_SECONDS`` after a request that wrote. A
+student who submits and is redirected to the score page therefore sees the
+submission, even if the replica has not caught up yet.
+
+Values computed for the shared cache are read inside ``reading_from_primary()``
+(see ``apps.core.cache.get_or_compute``): cached under the current version,
+a lagging replica's rows would be served to everyone until the next change.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS
+
+PIN_COOKIE = "db_primary"
+# A session read from a lagging replica would log a fresh login out.
+PRIMARY_ONLY_APPS = {"sessions"}
+
+_state = ContextVar("database_reads", default=None)
+
+
+class ReadState:
+    def __init__(self, pinned=False):
+        self.replica = None
+        self.pinned = pinned
+        self.wrote = False
+
+
+def replicas():
+    return getattr(settings, "DATABASE_REPLICAS", [])
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None or state.pinned or model._meta.app_label in PRIMARY_ONLY_APPS:
+            return DEFAULT_DB_ALIAS
+        return state.replica or DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            # Read your own writes: nothing after this may come from a replica.
+            state.pinned = True
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary.
+        aliases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Replicas get the schema through replication.
+        if db in replicas():
+            return False
+        return None
+
+
+@contextmanager
+def reading_from_replica():
+    """Send the reads inside the block to a replica, unless the primary is pinned."""
+    state = _state.get()
+    token = None
+    if state is None:
+        state = ReadState()
+        token = _state.set(state)
+    previous = state.replica
+    if replicas():
+        state.replica = random.choice(replicas())
+    try:
+        yield
+    finally:
+        state.replica = previous
+        if token is not None:
+            _state.reset(token)
+
+
+@contextmanager
+def reading_from_primary():
+    """Send the reads inside the block to the primary, even in a replica-reading view."""
+    state = _state.get()
+    if state is None:
+        yield
+        return
+    previous = state.replica
+    state.replica = None
+    try:
+        yield
+    finally:
+        state.replica = previous
+
+
+class ReplicaReadMixin:
+    """Serve a reporting view's reads from a replica.
+
+    List it first among the bases so the user and permission lookups of the
+    other mixins are covered too.
+    """
+
+    def dispatch(self, request, *args, **kwargs):
+        with reading_from_replica():
+            return super().dispatch(request, *args, **kwargs)
+
+
+class ReplicaPinMiddleware:
+    """Track writes per request and pin browsers that wrote to the primary."""
+
+    def __init__(self, get_response):
+        if not replicas():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = ReadState(pinned=PIN_COOKIE in request.COOKIES)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+
+        if state.wrote:
+            response.set_cookie(
+                PIN_COOKIE, "1", max_age=getattr(settings, "REPLICA_PIN_SECONDS", 10),
+                httponly=True, samesite="Lax",
+            )
+        return response
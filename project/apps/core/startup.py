@@ -0,0 +1,114 @@
+"""
+Startup measurements for ``profile_imports`` and ``bench_startup``.
+
+Both run a fresh interpreter, because in the measuring process Django and
+the project are already imported. The child imports the WSGI application
+the way a worker does, timing Django's setup and every app's ``ready()``
+hook on the way, optionally serves one request, and prints its timings as
+JSON on its last line of output.
+"""
+import importlib.util
+import json
+import os
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from django.conf import settings
+
+CHILD = r"""
+import json, sys, time
+timings = {"started_at": time.time()}
+started = time.perf_counter()
+
+def mark(name):
+    timings[name] = (time.perf_counter() - started) * 1000
+
+import django
+from django.apps.config import AppConfig
+mark("django_imported")
+
+ready = {}
+create = AppConfig.create.__func__
+
+def timed_create(cls, entry):
+    config = create(cls, entry)
+    hook = config.ready
+
+    def timed_ready():
+        began = time.perf_counter()
+        hook()
+        ready[config.label] = (time.perf_counter() - began) * 1000
+
+    config.ready = timed_ready
+    return config
+
+AppConfig.create = classmethod(timed_create)
+setup = django.setup
+
+def timed_setup(*args, **kwargs):
+    setup(*args, **kwargs)
+    mark("setup")
+
+django.setup = timed_setup
+timings["ready_hooks"] = ready
+
+# What a worker does: setup, URLconf and warm-up all happen in the WSGI module.
+from project.wsgi import application
+mark("wsgi")
+timings["ready_at"] = time.time()
+
+path = sys.argv[1] if len(sys.argv) > 1 else ""
+if path:
+    from django.test import Client, override_settings
+    with override_settings(ALLOWED_HOSTS=["testserver"]):
+        began = time.perf_counter()
+        response = Client().get(path)
+        timings["first_request"] = (time.perf_counter() - began) * 1000
+        timings["status"] = response.status_code
+
+print(json.dumps(timings))
+"""
+
+
+def run_child(path="", importtime=False):
+    """Start a fresh interpreter; return its timings and, with ``importtime``, its import log."""
+    command = [sys.executable]
+    if importtime:
+        command += ["-X", "importtime"]
+    command += ["-c", CHILD, path]
+    env = {**os.environ, "DJANGO_SETTINGS_MODULE": os.environ.get("DJANGO_SETTINGS_MODULE", "project.settings")}
+    spawned_at = time.time()
+    result = subprocess.run(
+        command, cwd=settings.BASE_DIR, env=env, capture_output=True, text=True, check=False,
+    )
+    if result.returncode:
+        raise RuntimeError(f"Startup child failed:\n{result.stderr[-2000:]}")
+    timings = json.loads(result.stdout.strip().splitlines()[-1])
+    timings["cold_start"] = (timings["ready_at"] - spawned_at) * 1000
+    timings["interpreter"] = (timings["started_at"] - spawned_at) * 1000
+    return timings, result.stderr
+
+
+def missing_bytecode():
+    """Project modules without compiled bytecode, which every worker start compiles again."""
+    base = Path(settings.BASE_DIR)
+    return [
+        path for directory in ("apps", "project") for path in sorted((base / directory).rglob("*.py"))
+        if not Path(importlib.util.cache_from_source(path)).exists()
+    ]
+
+
+def parse_importtime(log):
+    """Return ``(module, self µs, cumulative µs)`` for every line of an ``-X importtime`` log."""
+    modules = []
+    for line in log.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        try:
+            own, cumulative, name = line[len("import time:"):].split("|")
+            modules.append((name.strip(), int(own), int(cumulative)))
+        except ValueError:
+            continue
+    return modules
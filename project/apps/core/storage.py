@@ -0,0 +1,23 @@
+"""
+Static file storage.
+
+``collectstatic`` writes every file under a content-hashed name
+(``js/anti-cheating.3f2a91c0b7d4.js``) together with gzip and, when the
+``Brotli`` package is installed, brotli copies. WhiteNoise serves the hashed
+names with a year-long ``immutable`` Cache-Control and picks the compressed
+copy the browser accepts, so a lab full of students downloads each asset
+once until it changes.
+"""
+from django.conf import settings
+from whitenoise.storage import CompressedManifestStaticFilesStorage
+
+
+class FingerprintedStaticFilesStorage(CompressedManifestStaticFilesStorage):
+    def stored_name(self, name):
+        # Hashed names only exist once collectstatic has written the manifest.
+        # Development and the test runner keep the plain names until then;
+        # anywhere else a missing manifest raises, as WhiteNoise serves only
+        # hashed names (WHITENOISE_KEEP_ONLY_HASHED_FILES).
+        if not self.hashed_files and (settings.DEBUG or getattr(settings, "TESTING", False)):
+            return name
+        return super().stored_name(name)
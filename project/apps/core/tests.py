@@ -1,3 +1,634 @@
-from django.test import TestCase
+"""
+Tests for core user management
+"""
 
-# Create your tests here.
+import io
+import json
+import tempfile
+import threading
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import get_hasher
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import OperationalError, connections, transaction
+from django.http import HttpResponse
+from django.templatetags.static import static
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import metrics, profiling, ratelimit, startup
+from .cache import bump_versions, get_or_compute, versioned_key
+from .db import write_with_retry
+from .enrollment import import_students, read_rows
+from .models import AcademicSession, AcademicTerm, StudentClass, Subject
+from .routers import PIN_COOKIE, ReplicaPinMiddleware, ReplicaRouter, reading_from_replica
+from .storage import FingerprintedStaticFilesStorage
+from .views import QueuedLoginView
+from apps.exam.models import Answer, Exam
+
+User = get_user_model()
+
+FAST_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class StudentImportTestCase(TestCase):
+    def setUp(self):
+        """Set up a class and an existing student"""
+        self.grade_10 = StudentClass.objects.create(name='Grade 10')
+        User.objects.create_user(username='existing', password='existingpass123')
+
+    def rows(self, text):
+        return read_rows(io.StringIO(text))
+
+    def test_import_creates_students(self):
+        """Test that valid rows become students with usable passwords"""
+        report = import_students(self.rows(
+            'Username,First_Name,Last_Name,Gender,Student_Class,Password\n'
+            'alice,Alice,Johnson,Female,grade 10,alicepass123\n'
+            'bob,Bob,Smith,male,Grade 10,\n'
+        ), default_password='defaultpass123', workers=1)
+
+        self.assertEqual(len(report.created), 2)
+        alice = User.objects.get(username='alice')
+        self.assertEqual(alice.student_class, self.grade_10)
+        self.assertEqual(alice.gender, 'female')
+        self.assertTrue(alice.check_password('alicepass123'))
+        self.assertTrue(User.objects.get(username='bob').check_password('defaultpass123'))
+
+    def test_import_reports_duplicates_and_errors(self):
+        """Test that duplicates and bad rows are reported and skipped"""
+        report = import_students(self.rows(
+            'username,student_class,password\n'
+            'existing,Grade 10,pass12345\n'
+            'carol,Grade 10,pass12345\n'
+            'carol,Grade 10,pass12345\n'
+            'dave,Grade 99,pass12345\n'
+            ',Grade 10,pass12345\n'
+            'erin,Grade 10,\n'
+        ), workers=1)
+
+        self.assertEqual([user.username for user in report.created], ['carol'])
+        self.assertEqual(sorted(line for line, _, _ in report.duplicates), [2, 4])
+        self.assertEqual([line for line, _ in report.errors], [5, 6, 7])
+
+    def test_dry_run_creates_nothing(self):
+        """Test that a dry run only validates"""
+        report = import_students(self.rows('username,password\nfrank,pass12345\n'), dry_run=True)
+        self.assertEqual(len(report.created), 1)
+        self.assertFalse(User.objects.filter(username='frank').exists())
+
+    def test_parallel_hashing(self):
+        """Test importing across a process pool"""
+        csv = 'username,password\n' + ''.join(f'student{i},pass{i}word\n' for i in range(150))
+        report = import_students(self.rows(csv), workers=2, batch_size=50)
+
+        self.assertEqual(len(report.created), 150)
+        self.assertTrue(User.objects.get(username='student149').check_password('pass149word'))
+
+    def test_import_view(self):
+        """Test uploading an enrollment file as admin"""
+        User.objects.create_superuser(username='admin', password='adminpass123')
+        client = Client()
+        client.login(username='admin', password='adminpass123')
+
+        upload = SimpleUploadedFile('students.csv', b'username,student_class\ngina,Grade 10\n')
+        response = client.post(reverse('student_import'), {
+            'file': upload,
+            'default_password': 'ginapass123',
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['report'].created), 1)
+        self.assertTrue(User.objects.filter(username='gina', student_class=self.grade_10).exists())
+
+    @override_settings(STUDENT_IMPORT_MAX_ROWS=1)
+    def test_import_view_sends_large_files_to_the_command(self):
+        """Test that the import page refuses to enroll more rows than it hashes in a request"""
+        User.objects.create_superuser(username='admin', password='adminpass123')
+        client = Client()
+        client.login(username='admin', password='adminpass123')
+        content = b'username,password\nhana,hanapass123\nivan,ivanpass123\n'
+
+        with mock.patch('apps.core.enrollment.hash_passwords') as hash_passwords:
+            response = client.post(reverse('student_import'), {'file': SimpleUploadedFile('students.csv', content)})
+        hash_passwords.assert_not_called()
+        self.assertIn('import_students', response.context['form'].errors['file'][0])
+        self.assertFalse(User.objects.filter(username__in=['hana', 'ivan']).exists())
+
+        response = client.post(reverse('student_import'), {
+            'file': SimpleUploadedFile('students.csv', content), 'dry_run': 'on',
+        })
+        self.assertEqual(len(response.context['report'].created), 2)
+
+    def test_import_view_rejects_unreadable_files(self):
+        """Test that files that are not UTF-8 CSV or a valid workbook get a form error"""
+        User.objects.create_superuser(username='admin', password='adminpass123')
+        client = Client()
+        client.login(username='admin', password='adminpass123')
+
+        for upload in (
+            SimpleUploadedFile('students.csv', 'username\nJürgen\n'.encode('latin-1')),
+            SimpleUploadedFile('students.xlsx', b'not a workbook'),
+        ):
+            response = client.post(reverse('student_import'), {'file': upload})
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.context['form'].errors['file'])
+            self.assertIsNone(response.context['report'])
+
+
+class LoginPathTestCase(TestCase):
+    def setUp(self):
+        """Set up a student account"""
+        self.user = User.objects.create_user(username='student', password='studentpass123')
+
+    @override_settings(PASSWORD_HASH_ITERATIONS=1000)
+    def test_hash_iterations_are_configurable(self):
+        """Test that the hasher cost follows PASSWORD_HASH_ITERATIONS"""
+        self.assertEqual(get_hasher().iterations, 1000)
+        self.assertTrue(get_hasher().encode('secret', 'salt').startswith('pbkdf2_sha256$1000$'))
+
+    def test_existing_hashes_are_rehashed_at_a_higher_cost(self):
+        """Test that logging in moves a hash made at a lower cost up to the configured cost"""
+        with override_settings(PASSWORD_HASH_ITERATIONS=1000):
+            self.user.set_password('studentpass123')
+            self.user.save()
+        with override_settings(PASSWORD_HASH_ITERATIONS=2000):
+            self.assertTrue(self.client.login(username='student', password='studentpass123'))
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$2000$'))
+
+    @override_settings(PASSWORD_HASH_ITERATIONS=1000)
+    def test_lowered_cost_keeps_existing_hashes(self):
+        """Test that logging in with a lowered cost does not downgrade the stored hash"""
+        stored = self.user.password
+        self.assertTrue(self.client.login(username='student', password='studentpass123'))
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.password, stored)
+        self.assertTrue(get_hasher().encode('secret', 'salt').startswith('pbkdf2_sha256$1000$'))
+
+    @override_settings(LOGIN_QUEUE_TIMEOUT=0.01)
+    def test_login_queue_full(self):
+        """Test that logins beyond the concurrency bound get a 503 with Retry-After"""
+        with mock.patch.object(QueuedLoginView, 'slots', threading.BoundedSemaphore(1)):
+            QueuedLoginView.slots.acquire()
+            response = self.client.post(reverse('login'), {
+                'username': 'student',
+                'password': 'studentpass123',
+            })
+            QueuedLoginView.slots.release()
+
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertContains(response, 'Too many students', status_code=503)
+
+    def test_login_through_queue(self):
+        """Test that a normal login passes through the queue"""
+        response = self.client.post(reverse('login'), {
+            'username': 'student',
+            'password': 'studentpass123',
+        })
+        self.assertRedirects(response, reverse('dashboard'), fetch_redirect_response=False)
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=1.0)
+class ProfilingTestCase(TestCase):
+    def setUp(self):
+        """Set up a staff member and an empty sample buffer"""
+        profiling.samples.clear()
+        self.staff = User.objects.create_user(username='staff', password='staffpass123', is_staff=True)
+        self.client.force_login(self.staff)
+
+    def test_server_timing_header(self):
+        """Test that responses carry SQL, template and total timings"""
+        response = self.client.get(reverse('dashboard'))
+        timing = response['Server-Timing']
+        self.assertIn('sql;dur=', timing)
+        self.assertIn('queries"', timing)
+        self.assertIn('tpl;dur=', timing)
+        self.assertIn('total;dur=', timing)
+
+    def test_requests_are_sampled_into_report(self):
+        """Test that sampled requests and their SQL show up on the profiling page"""
+        self.client.get(reverse('dashboard'))
+        self.assertEqual(len(profiling.samples), 1)
+        self.assertEqual(profiling.samples[0]['view'], 'dashboard')
+        self.assertGreater(profiling.samples[0]['template_time'], 0)
+
+        response = self.client.get(reverse('profiling_report'))
+        self.assertContains(response, '<code>dashboard</code>', html=False)
+        self.assertContains(response, 'exam_exam')
+
+    def test_every_database_is_timed(self):
+        """Test that the SQL of every connection, replicas included, is timed"""
+        def view(request):
+            wrapped = [profiling._current.get() in conn.execute_wrappers for conn in connections.all()]
+            return HttpResponse(json.dumps(wrapped))
+
+        with override_settings(PROFILING_ENABLED=True):
+            response = profiling.ProfilingMiddleware(view)(RequestFactory().get('/'))
+        self.assertEqual(json.loads(response.content), [True] * len(connections.all()))
+
+    def test_report_is_staff_only(self):
+        """Test that students cannot open the profiling page"""
+        student = User.objects.create_user(username='student', password='studentpass123')
+        self.client.force_login(student)
+        response = self.client.get(reverse('profiling_report'))
+        self.assertEqual(response.status_code, 403)
+
+
+class MetricsTestCase(TestCase):
+    def setUp(self):
+        """Set up a staff member, a student and an exam"""
+        self.staff = User.objects.create_user(username='staff', password='staffpass123', is_staff=True)
+        self.student = User.objects.create_user(username='student', password='studentpass123')
+        student_class = StudentClass.objects.create(name='Grade 10')
+        self.exam = Exam.objects.create(
+            title='Algebra', class_group=student_class,
+            session=AcademicSession.objects.create(name='2024/2025'),
+            term=AcademicTerm.objects.create(name='First Term'),
+            subject=Subject.objects.create(name='Mathematics'),
+            exam_type='exam', duration=30, author=self.staff,
+        )
+
+    def transitions(self, name):
+        series = metrics.registry.collect().get(metrics.ANSWER_TRANSITIONS.name, {})
+        return series.get(json.dumps([name]), 0)
+
+    def test_answer_transitions_are_counted(self):
+        """Test that starting and submitting an exam bump the transition counters"""
+        started, submitted = self.transitions('start'), self.transitions('submit')
+        self.client.force_login(self.student)
+        take_url = reverse('take', args=(self.exam.pk,))
+        self.client.get(take_url)
+        self.client.post(take_url, {'start_exam': 'true'})
+        self.client.post(take_url, {'submit_exam': 'true'})
+
+        self.assertEqual(self.transitions('start'), started + 1)
+        self.assertEqual(self.transitions('submit'), submitted + 1)
+
+    def test_endpoint_reports_lifecycle_and_latency(self):
+        """Test that the endpoint shows attempts by status, view latency and cache hit ratio"""
+        Answer.objects.create(exam=self.exam, user=self.student, status='in_progress')
+        self.client.force_login(self.staff)
+        self.client.get(reverse('dashboard'))
+
+        response = self.client.get(reverse('metrics'))
+        body = response.content.decode()
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('cbt_answers{status="in_progress"} 1', body)
+        self.assertIn('cbt_http_request_duration_seconds_count{view="dashboard"}', body)
+        self.assertIn('cbt_cache_hit_ratio{cache="exam_list"}', body)
+
+    @override_settings(METRICS_TOKEN='scrape-token')
+    def test_endpoint_access(self):
+        """Test that only staff or a scraper with the token can read the metrics"""
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION='Bearer scrape-token')
+        self.assertEqual(response.status_code, 200)
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+    def test_workers_are_added_up(self):
+        """Test that values written by other worker processes are summed into the scrape"""
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            before = self.transitions('terminate')
+            Path(directory, '999999.json').write_text(json.dumps({
+                metrics.ANSWER_TRANSITIONS.name: {json.dumps(['terminate']): 3},
+            }))
+            self.assertEqual(self.transitions('terminate'), before + 3)
+
+            metrics.registry.flush()
+            self.assertTrue(any(Path(directory).glob('*.json')))
+
+    def test_dead_workers_are_folded_into_retired_totals(self):
+        """Test that the files of exited and killed workers are merged, not lost or left behind"""
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            before = self.transitions('terminate')
+            # A killed worker: its pid no longer runs.
+            Path(directory, '999999-1.json').write_text(json.dumps({
+                metrics.ANSWER_TRANSITIONS.name: {json.dumps(['terminate']): 3},
+            }))
+            registry = metrics.Registry()
+            registry.metrics = metrics.registry.metrics
+            registry.update(metrics.ANSWER_TRANSITIONS, json.dumps(['terminate']), 2)
+            registry.flush()
+            self.assertFalse(Path(directory, '999999-1.json').exists())
+            self.assertTrue(Path(directory, registry.filename).exists())
+
+            registry.retire()
+            files = sorted(path.name for path in Path(directory).glob('*.json'))
+            self.assertEqual(files, [metrics.RETIRED_FILE])
+            self.assertEqual(self.transitions('terminate'), before + 5)
+
+
+class WriteWithRetryTestCase(TransactionTestCase):
+    def test_lock_errors_are_retried(self):
+        """Test that a write failing with a lock error is retried until it succeeds"""
+        write = mock.Mock(side_effect=[OperationalError('database is locked'), 'saved'])
+        self.assertEqual(write_with_retry(write, base_delay=0), 'saved')
+        self.assertEqual(write.call_count, 2)
+
+    def test_gives_up_after_attempts(self):
+        """Test that the lock error is raised once every attempt failed"""
+        write = mock.Mock(side_effect=OperationalError('database is locked'))
+        with self.assertRaises(OperationalError):
+            write_with_retry(write, attempts=3, base_delay=0)
+        self.assertEqual(write.call_count, 3)
+
+    def test_other_errors_are_not_retried(self):
+        """Test that errors other than lock errors are raised straight away"""
+        write = mock.Mock(side_effect=OperationalError('no such table: core_user'))
+        with self.assertRaises(OperationalError):
+            write_with_retry(write, base_delay=0)
+        self.assertEqual(write.call_count, 1)
+
+    def test_no_retry_inside_outer_transaction(self):
+        """Test that a lock error inside an outer transaction is not retried"""
+        write = mock.Mock(side_effect=OperationalError('database is locked'))
+        with self.assertRaises(OperationalError), transaction.atomic():
+            write_with_retry(write, base_delay=0)
+        self.assertEqual(write.call_count, 1)
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'])
+class ReplicaRoutingTestCase(TestCase):
+    def setUp(self):
+        """Set up the router and a request factory"""
+        self.router = ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def test_reads_use_primary_by_default(self):
+        """Test that reads outside reporting code go to the primary"""
+        self.assertEqual(self.router.db_for_read(Answer), 'default')
+        self.assertEqual(self.router.db_for_write(Answer), 'default')
+
+    def test_reporting_reads_use_replica_until_a_write(self):
+        """Test that reporting reads go to a replica and return to the primary after a write"""
+        with reading_from_replica():
+            self.assertEqual(self.router.db_for_read(Answer), 'replica1')
+            self.assertEqual(self.router.db_for_read(Session), 'default')
+            self.router.db_for_write(Answer)
+            self.assertEqual(self.router.db_for_read(Answer), 'default')
+        self.assertEqual(self.router.db_for_read(Answer), 'default')
+
+    def test_browser_that_wrote_is_pinned_to_primary(self):
+        """Test that a request that writes pins the browser's next reads to the primary"""
+        seen = []
+
+        def view(request):
+            with reading_from_replica():
+                seen.append(self.router.db_for_read(Answer))
+                if request.method == 'POST':
+                    self.router.db_for_write(Answer)
+            return HttpResponse()
+
+        middleware = ReplicaPinMiddleware(view)
+        response = middleware(self.factory.get('/'))
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+        response = middleware(self.factory.post('/'))
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+        request = self.factory.get('/')
+        request.COOKIES[PIN_COOKIE] = '1'
+        middleware(request)
+        self.assertEqual(seen, ['replica1', 'replica1', 'default'])
+
+    def test_cached_values_are_computed_on_the_primary(self):
+        """Test that a cache miss in a replica-reading view is filled from the primary"""
+        cache.clear()
+        with reading_from_replica():
+            self.assertEqual(self.router.db_for_read(Answer), 'replica1')
+            computed = get_or_compute('exam-list:test', lambda: self.router.db_for_read(Answer), 60)
+            self.assertEqual(self.router.db_for_read(Answer), 'replica1')
+        self.assertEqual(computed, 'default')
+
+    def test_replicas_are_not_migrated(self):
+        """Test that migrations only run on the primary"""
+        self.assertFalse(self.router.allow_migrate('replica1', 'exam'))
+        self.assertIsNone(self.router.allow_migrate('default', 'exam'))
+
+
+class CacheHelpersTestCase(TestCase):
+    def setUp(self):
+        """Set up an empty cache"""
+        cache.clear()
+
+    def test_bumping_a_scope_orphans_its_keys(self):
+        """Test that versioned keys change when their scope is bumped, and only then"""
+        key = versioned_key('scores', 'scores:1', 'list')
+        self.assertEqual(versioned_key('scores', 'scores:1', 'list'), key)
+        other = versioned_key('scores', 'scores:2', 'list')
+        bump_versions(['scores:1'])
+        self.assertNotEqual(versioned_key('scores', 'scores:1', 'list'), key)
+        self.assertEqual(versioned_key('scores', 'scores:2', 'list'), other)
+
+    def test_concurrent_misses_compute_once(self):
+        """Test that requests missing the same key wait for one computation"""
+        calls = []
+        started = threading.Event()
+
+        def compute():
+            calls.append(1)
+            started.set()
+            threading.Event().wait(0.2)
+            return 'value'
+
+        results = []
+        first = threading.Thread(target=lambda: results.append(get_or_compute('paper', compute, 60)))
+        first.start()
+        started.wait()
+        others = [
+            threading.Thread(target=lambda: results.append(get_or_compute('paper', compute, 60)))
+            for _ in range(4)
+        ]
+        for thread in others:
+            thread.start()
+        for thread in [first, *others]:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['value'] * 5)
+
+    @override_settings(CACHE_STAMPEDE_WAIT=0.05)
+    def test_abandoned_lock_falls_back_to_computing(self):
+        """Test that a lock left by a dead request only delays the next one"""
+        cache.add('paper:lock', True, 60)
+        self.assertEqual(get_or_compute('paper', lambda: 'value', 60), 'value')
+        self.assertEqual(cache.get('paper'), 'value')
+
+
+class StaticAssetsTestCase(TestCase):
+    def setUp(self):
+        """Set up a static source directory, a collection root and a template directory"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.base = Path(directory.name)
+        (self.base / 'static' / 'js').mkdir(parents=True)
+        (self.base / 'static' / 'js' / 'app.js').write_text('console.log("exam");\n' * 100)
+        (self.base / 'templates').mkdir()
+        settings_override = override_settings(
+            STATICFILES_DIRS=[self.base / 'static'],
+            STATIC_ROOT=self.base / 'collected',
+            TEMPLATES=[{
+                'BACKEND': 'django.template.backends.django.DjangoTemplates',
+                'DIRS': [self.base / 'templates'],
+            }],
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def write_template(self, content):
+        (self.base / 'templates' / 'page.html').write_text('{% load static %}' + content)
+
+    def test_collected_files_are_hashed_compressed_and_immutable(self):
+        """Test that collectstatic fingerprints and gzips files, served with a far-future immutable header"""
+        call_command('collectstatic', interactive=False, verbosity=0)
+        url = static('js/app.js')
+        self.assertRegex(url, r'^/static/js/app\.[0-9a-f]{12}\.js$')
+        collected = self.base / 'collected' / url.removeprefix('/static/')
+        self.assertTrue(collected.with_name(collected.name + '.gz').exists())
+        self.assertFalse((self.base / 'collected' / 'js' / 'app.js').exists())
+
+        response = Client().get(url, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', response['Cache-Control'])
+        self.assertIn('max-age=315360000', response['Cache-Control'])
+
+    def test_check_accepts_fingerprinted_references(self):
+        """Test that a template using {% static %} for collected files passes the check"""
+        self.write_template('<script src="{% static \'js/app.js\' %}"></script>')
+        call_command('collectstatic', interactive=False, verbosity=0)
+        out = io.StringIO()
+        call_command('check_static_assets', stdout=out)
+        self.assertIn('Every static reference is fingerprinted', out.getvalue())
+
+    def test_check_rejects_plain_and_missing_references(self):
+        """Test that hard-coded static paths and unknown files fail the check"""
+        self.write_template(
+            '<script src="/static/js/app.js"></script>\n'
+            '<script src="{% static \'js/missing.js\' %}"></script>'
+        )
+        out = io.StringIO()
+        with self.assertRaisesMessage(CommandError, '2 static reference problem(s)'):
+            call_command('check_static_assets', stdout=out)
+        self.assertIn('hard-coded static path', out.getvalue())
+        self.assertIn('js/missing.js is not a static file', out.getvalue())
+
+    def test_missing_manifest_fails_outside_development(self):
+        """Test that plain names are only used without a manifest in development or tests"""
+        storage = FingerprintedStaticFilesStorage(location=self.base / 'collected')
+        self.assertEqual(storage.url('js/app.js'), '/static/js/app.js')
+        with override_settings(DEBUG=False, TESTING=False):
+            with self.assertRaises(ValueError):
+                storage.url('js/app.js')
+
+
+class StartupTestCase(TestCase):
+    def test_filter_widget_templates_resolve(self):
+        """Test that django-filter's widget templates resolve through the installed apps"""
+        from django.template.loader import get_template
+        get_template('django_filters/widgets/multiwidget.html')
+
+    def test_importtime_log_is_parsed(self):
+        """Test that -X importtime lines become (module, own, cumulative) rows"""
+        log = (
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        120 |   apps.exam.caching\n'
+            'import time:       380 |        500 | apps.exam.signals\n'
+            'Hello there!\n'
+        )
+        self.assertEqual(
+            startup.parse_importtime(log),
+            [('apps.exam.caching', 120, 120), ('apps.exam.signals', 380, 500)],
+        )
+
+    def test_bench_startup_reports_cold_start_and_first_request(self):
+        """Test that bench_startup measures a real worker start and checks the targets"""
+        out = io.StringIO()
+        call_command('bench_startup', runs=1, cold_start_target=60000, first_request_target=60000, stdout=out)
+        self.assertIn('cold start', out.getvalue())
+        self.assertIn('-> 200', out.getvalue())
+        with self.assertRaisesMessage(CommandError, 'over the 0 ms target'):
+            call_command('bench_startup', runs=1, cold_start_target=0, stdout=io.StringIO())
+
+
+@override_settings(SESSION_ENGINE='django.contrib.sessions.backends.cache')
+class RateLimitTestCase(TestCase):
+    def setUp(self):
+        """Set up a student with an exam in progress"""
+        cache.clear()
+        staff = User.objects.create_user(username='staff', password='pass', is_staff=True)
+        self.student = User.objects.create_user(username='student', password='pass')
+        self.exam = Exam.objects.create(
+            title='Algebra', class_group=StudentClass.objects.create(name='Grade 10'),
+            session=AcademicSession.objects.create(name='2024/2025'),
+            term=AcademicTerm.objects.create(name='First Term'),
+            subject=Subject.objects.create(name='Mathematics'),
+            exam_type='exam', duration=30, author=staff,
+        )
+        Answer.objects.create(exam=self.exam, user=self.student, status='in_progress', time_started=timezone.now())
+
+    def requests(self, endpoint, result):
+        series = metrics.registry.collect().get(ratelimit.RATE_LIMIT_REQUESTS.name, {})
+        return sum(value for key, value in series.items() if json.loads(key)[::2] == [endpoint, result])
+
+    def test_sliding_window_weights_the_previous_window(self):
+        """Test that the previous window counts for the share the sliding window still covers"""
+        for _ in range(4):
+            ratelimit.hit('test', limit=5, window=60, now=30)
+        used, wait = ratelimit.hit('test', limit=5, window=60, now=75)
+        self.assertEqual(used, 1 + 4 * 0.75)
+        # One more fits once the previous window weighs under (5 - 1) / 4 of itself.
+        self.assertEqual(wait, 1)
+        used, wait = ratelimit.hit('test', limit=2, window=60, now=90)
+        self.assertEqual((used, wait), (2 + 4 * 0.5, 30))
+
+    @override_settings(RATE_LIMITS={'exam-autosave': {'user': (2, 60)}})
+    def test_user_budget_refuses_without_queries(self):
+        """Test that a spent budget gets a 429 before the view runs a query"""
+        self.client.force_login(self.student)
+        url = reverse('autosave', args=(self.exam.pk,))
+        limited = self.requests('exam-autosave', 'limited')
+        for _ in range(2):
+            self.assertEqual(self.client.post(url).status_code, 200)
+        with self.assertNumQueries(0):
+            response = self.client.post(url)
+        self.assertEqual(response.status_code, 429)
+        self.assertTrue(1 <= int(response['Retry-After']) <= 60)
+        self.assertEqual(self.requests('exam-autosave', 'limited'), limited + 1)
+
+        # Reading the page is never counted.
+        self.assertNotEqual(self.client.get(reverse('take', args=(self.exam.pk,))).status_code, 429)
+
+    @override_settings(RATE_LIMITS={'exam-terminate': {'user': (10, 60), 'ip': (3, 60)}})
+    def test_address_budget_covers_anonymous_clients(self):
+        """Test that the csrf-exempt terminate endpoint is limited per address for anonymous clients"""
+        url = reverse('terminate-exam', args=(self.exam.pk,))
+        statuses = [self.client.post(url).status_code for _ in range(3)]
+        self.assertNotIn(429, statuses)
+        self.assertEqual(self.client.post(url).status_code, 429)
+        self.assertEqual(self.client.post(url, REMOTE_ADDR='10.0.0.2').status_code, statuses[0])
+
+    @override_settings(TRUSTED_PROXIES=['127.0.0.1'])
+    def test_client_address_behind_a_trusted_proxy(self):
+        """Test that only a trusted proxy's forwarding headers pick the client address"""
+        factory = RequestFactory()
+        proxied = factory.post('/', REMOTE_ADDR='127.0.0.1', HTTP_X_REAL_IP='10.0.0.7')
+        self.assertEqual(ratelimit.client_ip(proxied), '10.0.0.7')
+        forwarded = factory.post('/', REMOTE_ADDR='127.0.0.1', HTTP_X_FORWARDED_FOR='6.6.6.6, 10.0.0.8, 127.0.0.1')
+        self.assertEqual(ratelimit.client_ip(forwarded), '10.0.0.8')
+        direct = factory.post('/', REMOTE_ADDR='10.0.0.9', HTTP_X_REAL_IP='6.6.6.6')
+        self.assertEqual(ratelimit.client_ip(direct), '10.0.0.9')
+
+    @override_settings(RATE_LIMIT_ENABLED=False, RATE_LIMITS={'exam-autosave': {'user': (1, 60)}})
+    def test_limits_can_be_turned_off(self):
+        """Test that no request is refused with rate limiting disabled"""
+        self.client.force_login(self.student)
+        url = reverse('autosave', args=(self.exam.pk,))
+        self.assertEqual([self.client.post(url).status_code for _ in range(3)], [200, 200, 200])
@@ -11,6 +11,7 @@ urlpatterns = [
     # Student management
     path("students/", views.StudentListView.as_view(), name="student_list"),
     path("students/create/", views.StudentCreateView.as_view(), name="student_create"),
+    path("students/import/", views.StudentImportView.as_view(), name="student_import"),
     path("students/<int:pk>/update/", views.StudentUpdateView.as_view(), name="student-update"),
     
     # Staff management
@@ -21,6 +22,10 @@ urlpatterns = [
     # User deletion
     path("user/<int:pk>/delete/", views.UserDeleteView.as_view(), name="user-delete"),
     
+    # Monitoring
+    path("metrics/", views.metrics_view, name="metrics"),
+    path("profiling/", views.ProfilingReportView.as_view(), name="profiling_report"),
+
     # Academic management
     path("termsession/", views.TermSessionView.as_view(), name="term_session"),
     
@@ -1,25 +1,37 @@
+import hmac
+import json
+import math
+import threading
+from collections import Counter
+
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.contrib.auth.views import LoginView
 from django.contrib.messages.views import SuccessMessageMixin
-from django.core.paginator import Paginator
+from django.db.models import Count
 from django.http import HttpResponse, JsonResponse
 from django.shortcuts import redirect, render
 from django.views.generic import ListView, View
 from django.views.generic.edit import CreateView, DeleteView, UpdateView
 from django.urls import reverse_lazy
 
+from . import metrics, profiling
 from .forms import (
     AcademicSessionForm,
     AcademicTermForm,
     StaffCreateForm,
     StaffUpdateForm,
     StudentClassForm,
+    StudentImportForm,
     SubjectForm,
     UserCreateForm,
     UserUpdateForm,
 )
 from .models import AcademicSession, AcademicTerm, StudentClass, Subject, User
-from apps.exam.models import Exam
+from .routers import ReplicaReadMixin
+from apps.exam.caching import ALL_EXAMS, author_scope, class_scope, exam_list_queryset, get_exam_page
+from apps.exam.models import Answer
 
 
 class OnlyAdminMixin(LoginRequiredMixin, UserPassesTestMixin):
@@ -46,12 +58,32 @@ class StaffAndAdminMixin(LoginRequiredMixin, UserPassesTestMixin):
             return render(self.request, 'error/403.html', status=403)
 
 
-class DashboardView(LoginRequiredMixin, View):
+class QueuedLoginView(LoginView):
+    """Login view that bounds how many password checks run at once per process.
+
+    Password hashing is CPU-bound. Without a bound a login burst occupies every
+    worker thread and starves the requests of students already in an exam.
+    """
+    slots = threading.BoundedSemaphore(settings.LOGIN_CONCURRENCY)
+    busy_message = "Too many students are signing in right now. Please try again in a few seconds."
+
+    def post(self, request, *args, **kwargs):
+        if not self.slots.acquire(timeout=settings.LOGIN_QUEUE_TIMEOUT):
+            form = self.get_form()
+            form.add_error(None, self.busy_message)
+            response = self.render_to_response(self.get_context_data(form=form), status=503)
+            response["Retry-After"] = str(max(1, math.ceil(settings.LOGIN_QUEUE_TIMEOUT)))
+            return response
+        try:
+            return super().post(request, *args, **kwargs)
+        finally:
+            self.slots.release()
+
+
+class DashboardView(ReplicaReadMixin, LoginRequiredMixin, View):
     def get(self, request, *args, **kwargs):
         user = self.request.user
-        query = Exam.objects.select_related(
-            "class_group", "session", "term", "subject", "author"
-        )
+        query = exam_list_queryset()
 
         if user.is_superuser:
             return self.admin_page(query)
@@ -60,31 +92,37 @@ class DashboardView(LoginRequiredMixin, View):
         return self.student_page(query)
 
     def admin_page(self, query):
-        paginator = Paginator(query, 20)
-        page_number = self.request.GET.get("page")
-        page_obj = paginator.get_page(page_number)
+        page_obj = get_exam_page(ALL_EXAMS, query, self.request.GET.get("page"))
         context = {"exams": page_obj}
         return render(self.request, "admin_dashboard.html", context)
 
     def staff_page(self, query):
-        paginator = Paginator(query.filter(author=self.request.user), 20)
-        page_number = self.request.GET.get("page")
-        page_obj = paginator.get_page(page_number)
+        user = self.request.user
+        page_obj = get_exam_page(
+            author_scope(user.pk), query.filter(author=user), self.request.GET.get("page")
+        )
         context = {"exams": page_obj}
         return render(self.request, "admin_dashboard.html", context)
 
     def student_page(self, query):
-        exams = query.filter(
-            class_group=self.request.user.student_class,
-            published=True
+        class_id = self.request.user.student_class_id
+        if class_id is None:
+            return render(self.request, "dashboard.html", {"exams": []})
+
+        page_obj = get_exam_page(
+            class_scope(class_id),
+            query.open().filter(class_group_id=class_id),
+            self.request.GET.get("page"),
         )
-        context = {"exams": exams}
+        context = {"exams": page_obj}
         return render(self.request, "dashboard.html", context)
 
 
-class StudentListView(OnlyAdminMixin, ListView):
+class StudentListView(ReplicaReadMixin, OnlyAdminMixin, ListView):
     """Student Listview"""
-    queryset = User.objects.filter(is_staff=False, is_superuser=False).order_by('first_name', 'last_name', 'username')
+    queryset = User.objects.filter(is_staff=False, is_superuser=False).select_related('student_class').order_by(
+        'first_name', 'last_name', 'username'
+    )
     template_name = "core/student_list.html"
     context_object_name = "students"
     paginate_by = 20
@@ -106,6 +144,92 @@ class StudentCreateView(OnlyAdminMixin, CreateView):
         return super().form_valid(form)
 
 
+def metrics_view(request):
+    """Scrape-style text metrics, for staff or for a scraper sending METRICS_TOKEN."""
+    token = settings.METRICS_TOKEN
+    authorization = request.headers.get("Authorization", "").encode()
+    authorized = bool(token) and hmac.compare_digest(authorization, f"Bearer {token}".encode())
+    if not authorized and not (request.user.is_authenticated and request.user.is_staff):
+        return HttpResponse("Forbidden\n", status=403, content_type="text/plain")
+
+    lines = ["# HELP cbt_answers Exam attempts by status.", "# TYPE cbt_answers gauge"]
+    counts = dict(Answer.objects.order_by().values_list("status").annotate(n=Count("id")))
+    for status, _ in Answer.EXAM_STATUS_CHOICES:
+        lines.append(f'cbt_answers{{status="{status}"}} {counts.get(status, 0)}')
+
+    requests = metrics.registry.collect().get(metrics.CACHE_REQUESTS.name, {})
+    hits, lookups = Counter(), Counter()
+    for key, value in requests.items():
+        cache_name, result = json.loads(key)
+        lookups[cache_name] += value
+        if result == "hit":
+            hits[cache_name] += value
+    lines += ["# HELP cbt_cache_hit_ratio Share of cache lookups that hit.", "# TYPE cbt_cache_hit_ratio gauge"]
+    for cache_name, total in sorted(lookups.items()):
+        lines.append(f'cbt_cache_hit_ratio{{cache="{cache_name}"}} {hits[cache_name] / total:.4f}')
+
+    return HttpResponse(
+        metrics.registry.render(lines), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+class ProfilingReportView(StaffAndAdminMixin, View):
+    """Slowest views and most repeated SQL of the requests sampled by this process."""
+    template_name = "core/profiling.html"
+
+    def get(self, request):
+        sampled = list(profiling.samples)
+        slowest, repeated = profiling.summarize(sampled)
+        context = {
+            "enabled": settings.PROFILING_ENABLED,
+            "sample_rate": settings.PROFILING_SAMPLE_RATE,
+            "sampled": len(sampled),
+            "slowest": slowest,
+            "repeated": repeated,
+        }
+        return render(request, self.template_name, context)
+
+
+class StudentImportView(OnlyAdminMixin, View):
+    """Enroll many students at once from a CSV or XLSX file."""
+    template_name = "core/student_import.html"
+
+    def get(self, request):
+        return render(request, self.template_name, {"form": StudentImportForm()})
+
+    def post(self, request):
+        # The spreadsheet readers load only when an import runs.
+        from .enrollment import EnrollmentError, import_students, read_rows
+
+        form = StudentImportForm(request.POST, request.FILES)
+        report = None
+
+        if form.is_valid():
+            upload = form.cleaned_data["file"]
+            try:
+                rows = read_rows(upload, upload.name)
+            except EnrollmentError as e:
+                form.add_error("file", str(e))
+            else:
+                # Validating is cheap, but every enrolled row is hashed in this request.
+                limit = settings.STUDENT_IMPORT_MAX_ROWS
+                if not form.cleaned_data["dry_run"] and len(rows) > limit:
+                    form.add_error("file", (
+                        f"The file has {len(rows)} rows; this page enrolls up to {limit} at once. "
+                        "Enroll it with: python manage.py import_students <file> --workers <processes>"
+                    ))
+                    return render(request, self.template_name, {"form": form, "report": None})
+                report = import_students(
+                    rows,
+                    default_password=form.cleaned_data["default_password"],
+                    dry_run=form.cleaned_data["dry_run"],
+                )
+                if not form.cleaned_data["dry_run"] and report.created:
+                    messages.success(request, f"{len(report.created)} students enrolled.")
+
+        return render(request, self.template_name, {"form": form, "report": report})
+
+
 class StudentUpdateView(OnlyAdminMixin, SuccessMessageMixin, UpdateView):
     model = User
     form_class = UserUpdateForm
@@ -129,7 +253,7 @@ class UserDeleteView(OnlyAdminMixin, DeleteView):
         return super().form_valid(form)
 
 
-class StaffListView(OnlyAdminMixin, ListView):
+class StaffListView(ReplicaReadMixin, OnlyAdminMixin, ListView):
     queryset = User.objects.filter(is_staff=True, is_superuser=False).order_by('first_name', 'last_name', 'username')
     template_name = "core/staff_list.html"
     context_object_name = "staff_members"
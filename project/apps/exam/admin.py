@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Question, Choice, Exam, Answer
+from .models import Question, QuestionTag, Choice, Exam, Answer, ProctorEvent, ProctorSummary, Tag, TimeExtension
 
 
 class ChoiceInline(admin.TabularInline):
@@ -7,17 +7,29 @@ class ChoiceInline(admin.TabularInline):
     extra = 4
 
 
+class QuestionTagInline(admin.TabularInline):
+    model = QuestionTag
+    extra = 1
+    autocomplete_fields = ('tag',)
+
+
+@admin.register(Tag)
+class TagAdmin(admin.ModelAdmin):
+    list_display = ('name',)
+    search_fields = ('name',)
+
+
 @admin.register(Question)
 class QuestionAdmin(admin.ModelAdmin):
     list_display = ('question', 'subject', 'class_group', 'author')
-    list_filter = ('subject', 'class_group', 'author')
+    list_filter = ('subject', 'class_group', 'author', 'tags')
     search_fields = ('question',)
-    inlines = [ChoiceInline]
+    inlines = [ChoiceInline, QuestionTagInline]
 
 
 @admin.register(Exam)
 class ExamAdmin(admin.ModelAdmin):
-    list_display = ('title', 'subject', 'class_group', 'exam_type', 'duration', 'published', 'created')
+    list_display = ('title', 'subject', 'class_group', 'exam_type', 'duration', 'published', 'opens_at', 'closes_at')
     list_filter = ('subject', 'class_group', 'exam_type', 'published', 'session', 'term')
     search_fields = ('title', 'description')
     filter_horizontal = ('questions',)
@@ -25,7 +37,35 @@ class ExamAdmin(admin.ModelAdmin):
 
 @admin.register(Answer)
 class AnswerAdmin(admin.ModelAdmin):
-    list_display = ('user', 'exam', 'score', 'percent', 'is_complete', 'time_started')
+    list_display = ('user', 'exam', 'score', 'percent', 'is_complete', 'time_started', 'last_seen')
     list_filter = ('exam', 'is_complete')
     search_fields = ('user__username', 'exam__title')
     readonly_fields = ('score', 'percent')
+
+
+@admin.register(ProctorSummary)
+class ProctorSummaryAdmin(admin.ModelAdmin):
+    list_display = ('answer', 'total', 'tab_switches', 'blurs', 'copy_attempts', 'fullscreen_exits', 'last_event_at')
+    list_filter = ('answer__exam',)
+    search_fields = ('answer__user__username', 'answer__exam__title')
+    list_select_related = ('answer__user', 'answer__exam')
+    ordering = ('-total',)
+
+
+@admin.register(ProctorEvent)
+class ProctorEventAdmin(admin.ModelAdmin):
+    list_display = ('answer', 'kind', 'occurred_at', 'detail')
+    list_filter = ('day', 'kind')
+    search_fields = ('answer__user__username', 'answer__exam__title')
+    list_select_related = ('answer__user', 'answer__exam')
+
+    def has_change_permission(self, request, obj=None):
+        # Events are evidence: append-only.
+        return False
+
+
+@admin.register(TimeExtension)
+class TimeExtensionAdmin(admin.ModelAdmin):
+    list_display = ('exam', 'answer', 'minutes', 'reason', 'granted_by', 'created')
+    list_filter = ('exam',)
+    raw_id_fields = ('answer',)
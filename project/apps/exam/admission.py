@@ -0,0 +1,96 @@
+"""
+Admission of exam starts.
+
+When a whole class presses Start at once, every start and the exam page
+that follows it would hit the workers and the database in the same second.
+Time is cut into windows of ``EXAM_START_BURST / EXAM_START_RATE`` seconds,
+each with ``EXAM_START_BURST`` slots for starts of an exam. The slots taken
+in a window are one counter in the shared cache, so all workers hand out
+slots from the same windows and the rate holds however many workers run. A
+start takes a slot with an atomic increment, moving on to the next window
+once one is full. A start with a slot in the current window is admitted
+straight away; the others wait in the waiting room until their window
+begins. Increments are ordered, so slots are handed out in arrival order
+across workers, nobody is overtaken, and the timer of an attempt only
+starts when it is admitted.
+
+The first window not known to be full is kept as a hint, so a start skips
+the windows already taken by the queue ahead of it instead of counting
+through them. The reserved time is kept as a ticket in the shared cache, so
+the retry may land on any worker. A student who retries early waits for
+the same slot again instead of queueing anew.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from apps.core.metrics import registry
+
+# A ticket not used this long after its slot has lapsed; the student queues again.
+TICKET_GRACE_SECONDS = 60
+
+EXAM_STARTS = registry.counter(
+    "cbt_exam_starts_total", "Exam starts admitted, and starts sent to the waiting room.", ["result"]
+)
+
+
+def _ticket_key(exam_id, user_id):
+    return f"exam-admission:{exam_id}:{user_id}"
+
+
+def _window_key(exam_id, window):
+    return f"exam-admission-window:{exam_id}:{window}"
+
+
+def _frontier_key(exam_id):
+    return f"exam-admission-frontier:{exam_id}"
+
+
+def _incr(key, timeout):
+    try:
+        return cache.incr(key)
+    except ValueError:
+        # The first slot of this window; a concurrent first start may win the add.
+        if cache.add(key, 1, timeout):
+            return 1
+        return cache.incr(key)
+
+
+def reserve(exam_id, rate, burst, now=None):
+    """Take the next free slot for ``exam_id``; return the time its window begins."""
+    now = time.time() if now is None else now
+    length = burst / rate
+    current = int(now // length)
+    # Every window before the frontier is full; an outdated hint only costs a few increments.
+    start = window = max(current, cache.get(_frontier_key(exam_id), current))
+    while True:
+        timeout = (window + 1) * length - now + TICKET_GRACE_SECONDS
+        if _incr(_window_key(exam_id, window), timeout) <= burst:
+            break
+        window += 1
+    if window != start:
+        cache.set(_frontier_key(exam_id), window, timeout)
+    return window * length
+
+
+def admit(exam_id, user_id):
+    """Return 0 when the student may start now, or the seconds to wait before retrying."""
+    rate = getattr(settings, "EXAM_START_RATE", 0)
+    if rate <= 0:
+        return 0.0
+    now = time.time()
+    key = _ticket_key(exam_id, user_id)
+    admit_at = cache.get(key)
+    if admit_at is None:
+        admit_at = reserve(exam_id, rate, max(1, getattr(settings, "EXAM_START_BURST", 1)), now)
+        if admit_at <= now:
+            EXAM_STARTS.inc(result="admitted")
+            return 0.0
+        cache.set(key, admit_at, admit_at - now + TICKET_GRACE_SECONDS)
+        EXAM_STARTS.inc(result="queued")
+    if now < admit_at:
+        return admit_at - now
+    cache.delete(key)
+    EXAM_STARTS.inc(result="admitted")
+    return 0.0
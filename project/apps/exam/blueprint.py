@@ -0,0 +1,152 @@
+"""
+Blueprint-driven exam assembly.
+
+A blueprint describes how many questions an exam needs and which part of the
+question bank they come from. Each section of a blueprint is one stratum: the
+ids of the matching questions are read from the index (no rows, no
+``ORDER BY RANDOM()``), a random sample of the requested size is drawn in
+Python and the exam's M2M rows are inserted with a single ``bulk_create``.
+"""
+import random
+
+from django.db import transaction
+from django.db.models import Max, Q
+
+from .caching import invalidate_exams
+from .models import Exam, Question
+
+
+class BlueprintError(Exception):
+    """Raised when the question bank cannot satisfy a blueprint."""
+
+
+class BlueprintSection:
+    """One stratum of a blueprint: ``count`` questions matching the filters."""
+
+    def __init__(self, count, subject=None, class_group=None, tags=(), label=""):
+        self.count = count
+        self.subject = subject
+        self.class_group = class_group
+        self.tags = list(tags)
+        self.label = label
+
+    def __repr__(self):
+        return f"<BlueprintSection {self.label or 'all'}: {self.count}>"
+
+    def get_queryset(self):
+        queryset = Question.objects.all()
+        if self.subject is not None:
+            queryset = queryset.filter(subject=self.subject)
+        if self.class_group is not None:
+            queryset = queryset.filter(class_group=self.class_group)
+        if self.tags:
+            queryset = queryset.tagged(self.tags, match_all=True)
+        return queryset
+
+    def candidate_ids(self):
+        return list(self.get_queryset().order_by().values_list("id", flat=True))
+
+
+def split_evenly(total, parts):
+    """Split ``total`` into ``parts`` integers that differ by at most one."""
+    if parts <= 0:
+        return []
+    base, extra = divmod(total, parts)
+    return [base + 1 if i < extra else base for i in range(parts)]
+
+
+def even_sections(total, subject=None, class_group=None, topics=()):
+    """Sections drawing ``total`` questions, split evenly across ``topics`` when any are given."""
+    topics = list(topics)
+    if not topics:
+        return [BlueprintSection(total, subject=subject, class_group=class_group)]
+    return [
+        BlueprintSection(count, subject=subject, class_group=class_group, tags=[topic], label=topic.name)
+        for topic, count in zip(topics, split_evenly(total, len(topics)))
+        if count
+    ]
+
+
+def recently_used_question_ids(exam, terms):
+    """Ids of questions used by exams of the same subject in the last ``terms`` terms.
+
+    Terms are ranked by their most recent exam, so the current term counts as
+    the first one. The exam being assembled is ignored.
+    """
+    if terms <= 0:
+        return set()
+
+    recent = (
+        Exam.objects.filter(subject_id=exam.subject_id)
+        .exclude(pk=exam.pk)
+        .order_by()
+        .values("session_id", "term_id")
+        .annotate(latest=Max("created"))
+        .order_by("-latest")[:terms]
+    )
+    condition = Q()
+    for row in recent:
+        condition |= Q(exam__session_id=row["session_id"], exam__term_id=row["term_id"])
+    if not condition:
+        return set()
+
+    through = Exam.questions.through
+    return set(
+        through.objects.filter(condition, exam__subject_id=exam.subject_id)
+        .exclude(exam_id=exam.pk)
+        .values_list("question_id", flat=True)
+    )
+
+
+def sample_sections(sections, exclude=(), rng=None):
+    """Draw a stratified random sample of question ids for ``sections``.
+
+    Sections are filled smallest pool first, so a question that falls into
+    several strata is spent where it is scarcest. Raises ``BlueprintError``
+    listing every section the bank cannot fill.
+    """
+    rng = rng or random.Random()
+    taken = set(exclude)
+    pools = [(section, section.candidate_ids()) for section in sections]
+    pools.sort(key=lambda item: len(item[1]))
+
+    picked = []
+    shortfalls = []
+    for section, ids in pools:
+        available = [pk for pk in ids if pk not in taken]
+        if len(available) < section.count:
+            shortfalls.append(
+                f"{section.label or 'questions'}: need {section.count}, "
+                f"only {len(available)} available"
+            )
+            continue
+        sample = rng.sample(available, section.count)
+        taken.update(sample)
+        picked.extend(sample)
+
+    if shortfalls:
+        raise BlueprintError("Not enough questions in the bank (" + "; ".join(shortfalls) + ").")
+    return picked
+
+
+def assemble_exam(exam, sections, recent_terms=0, replace=False, rng=None):
+    """Fill ``exam.questions`` from ``sections`` and return the added question ids."""
+    through = Exam.questions.through
+    with transaction.atomic():
+        if replace:
+            through.objects.filter(exam_id=exam.pk).delete()
+            existing = set()
+        else:
+            existing = set(
+                through.objects.filter(exam_id=exam.pk).values_list("question_id", flat=True)
+            )
+
+        exclude = existing | recently_used_question_ids(exam, recent_terms)
+        question_ids = sample_sections(sections, exclude=exclude, rng=rng)
+        through.objects.bulk_create(
+            [through(exam_id=exam.pk, question_id=pk) for pk in question_ids],
+            ignore_conflicts=True,
+        )
+    # bulk_create sends no m2m_changed signal.
+    invalidate_exams([exam])
+    return question_ids
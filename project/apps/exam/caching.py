@@ -0,0 +1,105 @@
+"""
+Cached exam lists for the dashboards and the student exam list, and the
+cache scopes of exams and their deadlines.
+
+Every list is cached under a versioned key (see ``apps.core.cache``). A
+version belongs to a scope: the student class (what students see), the
+author (staff dashboard) or all exams (admin dashboard). Saving or deleting
+an exam, or changing its questions, replaces the versions of the scopes it
+appears in, which orphans every cached page of those scopes at once.
+"""
+from django.conf import settings
+from django.core.paginator import Page, Paginator
+from django.db.models import Count
+
+from apps.core.cache import bump_versions, get_or_compute, versioned_key
+from .models import Exam
+
+PAGE_SIZE = 20
+ALL_EXAMS = "all"
+
+
+def class_scope(class_id):
+    return f"class:{class_id}"
+
+
+def author_scope(author_id):
+    return f"author:{author_id}"
+
+
+def exam_scope(exam_id):
+    return f"exam:{exam_id}"
+
+
+def deadline_scope(exam_id):
+    return f"deadlines:{exam_id}"
+
+
+def invalidate_exams(exams):
+    """Orphan the cached lists that show any of ``exams``, and what is cached per exam."""
+    scopes = {ALL_EXAMS}
+    for exam in exams:
+        scopes.add(class_scope(exam.class_group_id))
+        scopes.add(author_scope(exam.author_id))
+        scopes.add(exam_scope(exam.pk))
+        scopes.add(deadline_scope(exam.pk))
+    bump_versions(scopes)
+
+
+def invalidate_class_lists(class_ids):
+    """Orphan what students of the classes see, when an exam opens or closes."""
+    bump_versions({class_scope(pk) for pk in class_ids})
+
+
+def invalidate_questions(question_ids):
+    """Orphan what is cached per exam for the exams that use the questions."""
+    exam_ids = Exam.questions.through.objects.filter(
+        question_id__in=set(question_ids)
+    ).values_list("exam_id", flat=True).distinct()
+    bump_versions({exam_scope(pk) for pk in exam_ids})
+
+
+def invalidate_deadlines(exam_ids):
+    bump_versions({deadline_scope(pk) for pk in exam_ids})
+
+
+def exam_list_queryset():
+    return Exam.objects.select_related(
+        "class_group", "session", "term", "subject", "author"
+    ).annotate(num_questions=Count("questions")).order_by(*Exam._meta.ordering)
+
+
+def _page_number(value):
+    """The page asked for as a positive int; anything else asks for the first page."""
+    try:
+        return max(1, int(value))
+    except (TypeError, ValueError):
+        return 1
+
+
+def get_exam_page(scope, queryset, page_number, per_page=PAGE_SIZE):
+    """Return the ``Page`` of ``queryset`` for ``page_number``, cached per scope and page.
+
+    The page number is clamped to the pages that exist before it goes into a
+    key, so whatever ``?page=`` holds, a scope caches at most one entry per page.
+    """
+    paginator = Paginator(queryset, per_page)
+    key = versioned_key("exam-list", scope, "page")
+    # The total comes from the cache as well, so the paginator never counts.
+    paginator.count = get_or_compute(
+        f"{key}:count", queryset.count, settings.EXAM_LIST_CACHE_TIMEOUT, cache_name="exam_list",
+    )
+    number = min(_page_number(page_number), paginator.num_pages)
+    exams = get_or_compute(
+        f"{key}:{number}", lambda: list(paginator.page(number).object_list),
+        settings.EXAM_LIST_CACHE_TIMEOUT, cache_name="exam_list",
+    )
+    return Page(exams, number, paginator)
+
+
+def get_exam_list(scope, queryset):
+    """Return every exam in ``queryset`` as a list, cached per scope."""
+    return get_or_compute(
+        versioned_key("exam-list", scope, "all"), lambda: list(queryset),
+        settings.EXAM_LIST_CACHE_TIMEOUT, cache_name="exam_list",
+    )
@@ -0,0 +1,54 @@
+"""
+Effective deadlines of attempts.
+
+An attempt ends ``Exam.duration`` minutes after it started, plus the
+minutes of the exam's time extensions: those for every attempt of the exam
+and those for the attempt itself, and never after the exam closes. The result is cached per attempt under
+the exam's deadline scope, which changes when the exam is saved or an
+extension is granted, so the exam page and the heartbeats read it from the
+cache and an extension reaches every attempt at once.
+"""
+from datetime import timedelta
+
+from django.db.models import Q, Sum
+
+from apps.core.cache import get_or_compute, versioned_key
+from apps.core.db import write_with_retry
+from . import feed
+from .caching import deadline_scope, invalidate_deadlines
+from .models import Answer, TimeExtension
+
+CACHE_TIMEOUT = 6 * 60 * 60
+
+
+def compute_deadline(exam_id, answer_id):
+    started, duration, closes_at = Answer.objects.filter(pk=answer_id).values_list(
+        "time_started", "exam__duration", "exam__closes_at",
+    ).get()
+    extra = TimeExtension.objects.filter(
+        Q(answer__isnull=True) | Q(answer_id=answer_id), exam_id=exam_id,
+    ).aggregate(minutes=Sum("minutes"))["minutes"] or 0
+    deadline = started + timedelta(minutes=duration + extra)
+    return deadline if closes_at is None else min(deadline, closes_at)
+
+
+def get_deadline(exam_id, answer_id):
+    """Return when an attempt in progress ends, from the cache."""
+    return get_or_compute(
+        versioned_key("deadline", deadline_scope(exam_id), answer_id),
+        lambda: compute_deadline(exam_id, answer_id),
+        CACHE_TIMEOUT, cache_name="deadline",
+    )
+
+
+def grant_extension(exam, minutes, answers=(), reason="", granted_by=None):
+    """Give ``answers`` (every attempt of ``exam`` when empty) ``minutes`` more."""
+    extensions = [
+        TimeExtension(exam=exam, answer=answer, minutes=minutes, reason=reason, granted_by=granted_by)
+        for answer in answers or [None]
+    ]
+    write_with_retry(TimeExtension.objects.bulk_create, extensions)
+    # bulk_create sends no signals.
+    invalidate_deadlines([exam.pk])
+    feed.publish(exam.pk, "extended", minutes=minutes, answers=[answer.pk for answer in answers], reason=reason)
+    return extensions
@@ -0,0 +1,185 @@
+"""
+Live changes of an exam for proctor screens.
+
+Any worker that changes an attempt (started, submitted, terminated,
+expired) or its presence calls ``publish``, which appends the change to a
+short numbered log of the exam in the shared cache. Proctor screens follow
+the log through ``stream``, a Server-Sent Events stream served by the ASGI
+application: in each process a ``Hub`` runs one poller per watched exam,
+which reads the new entries from the cache and fans them out to every
+screen of that exam through in-process queues. Dozens of screens on one
+exam cost one cache read per ``PROCTOR_STREAM_POLL_SECONDS``, and none of
+them queries the database after the page's first snapshot.
+
+A screen that reconnects sends the last id it saw and gets the entries it
+missed; when they have left the log, or the screen fell too far behind, it
+is told to ``resync`` (reload its snapshot).
+"""
+import asyncio
+import json
+import time
+from collections import defaultdict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+# Entries stay in the log this long; a screen away for longer resyncs.
+LOG_TIMEOUT = 10 * 60
+KEEPALIVE_SECONDS = 15
+# How long an id may be taken before its entry is stored (publish is incr, then set).
+WRITE_GRACE_SECONDS = 5
+QUEUE_SIZE = 1000
+
+
+def _seq_key(exam_id):
+    return f"proctor-feed:{exam_id}:seq"
+
+
+def _entry_key(exam_id, seq):
+    return f"proctor-feed:{exam_id}:{seq}"
+
+
+def publish(exam_id, event, **data):
+    """Append a change to the exam's log; ``event`` names it, ``data`` describes it."""
+    cache.add(_seq_key(exam_id), 0, None)
+    try:
+        seq = cache.incr(_seq_key(exam_id))
+    except ValueError:
+        return
+    cache.set(_entry_key(exam_id, seq), {"id": seq, "event": event, "at": time.time(), **data}, LOG_TIMEOUT)
+
+
+def read_since(exam_id, last_seq):
+    """Return the last id read and the log's entries after ``last_seq``.
+
+    A missing entry is ``None``: it left the log, or its writer died after
+    taking its id. An entry that is only missing because its writer has not
+    stored it yet ends the read; the next read picks it up.
+    """
+    seq = cache.get(_seq_key(exam_id), 0)
+    if seq <= last_seq:
+        return last_seq, []
+    wanted = range(max(last_seq + 1, seq - QUEUE_SIZE), seq + 1)
+    found = cache.get_many([_entry_key(exam_id, n) for n in wanted])
+    entries = [None] if wanted.start > last_seq + 1 else []
+    for n in wanted:
+        entry = found.get(_entry_key(exam_id, n))
+        if entry is None:
+            later = [found.get(_entry_key(exam_id, m)) for m in range(n + 1, seq + 1)]
+            newest = max((e["at"] for e in later if e), default=None)
+            if newest is None or time.time() - newest < WRITE_GRACE_SECONDS:
+                return n - 1, entries
+        entries.append(entry)
+    return seq, entries
+
+
+def presence_counts(exam_id):
+    # presence stores Answer.last_seen, and models publish here.
+    from .presence import counts
+
+    return counts(exam_id)
+
+
+def _poll(exam_id, last_seq):
+    seq, entries = read_since(exam_id, last_seq)
+    return seq, entries, presence_counts(exam_id)
+
+
+RESYNC = {"event": "resync"}
+
+
+class Hub:
+    """Fans the changes of each watched exam out to this process' screens."""
+
+    def __init__(self):
+        self.screens = defaultdict(set)
+        self.pollers = {}
+
+    def subscribe(self, exam_id, last_seq):
+        queue = asyncio.Queue(QUEUE_SIZE)
+        self.screens[exam_id].add(queue)
+        if exam_id not in self.pollers:
+            self.pollers[exam_id] = asyncio.ensure_future(self._follow(exam_id, last_seq))
+        return queue
+
+    def unsubscribe(self, exam_id, queue):
+        self.screens[exam_id].discard(queue)
+        if not self.screens[exam_id]:
+            del self.screens[exam_id]
+            poller = self.pollers.pop(exam_id, None)
+            if poller is not None:
+                poller.cancel()
+
+    def _send(self, exam_id, entry):
+        for queue in list(self.screens.get(exam_id, ())):
+            try:
+                queue.put_nowait(entry)
+            except asyncio.QueueFull:
+                # A screen this far behind reloads instead of catching up.
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(RESYNC)
+
+    async def _follow(self, exam_id, last_seq):
+        poll = sync_to_async(_poll, thread_sensitive=False)
+        presence = None
+        while True:
+            last_seq, entries, counts = await poll(exam_id, last_seq)
+            for entry in entries:
+                self._send(exam_id, entry or RESYNC)
+            # Disconnects are silences, not events: the counts show them.
+            if counts != presence:
+                presence = counts
+                self._send(exam_id, {"event": "presence", **counts})
+            await asyncio.sleep(getattr(settings, "PROCTOR_STREAM_POLL_SECONDS", 1.0))
+
+
+hub = Hub()
+
+
+def _format(entry):
+    lines = []
+    if "id" in entry:
+        lines.append(f"id: {entry['id']}")
+    lines.append(f"event: {entry['event']}")
+    lines.append(f"data: {json.dumps(entry, separators=(',', ':'))}")
+    return "\n".join(lines) + "\n\n"
+
+
+async def stream(exam_id, last_event_id=None):
+    """Yield the exam's changes as Server-Sent Events for one screen.
+
+    The stream ends after ``PROCTOR_STREAM_MAX_SECONDS``; the browser
+    reconnects with the last id it saw and misses nothing.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + getattr(settings, "PROCTOR_STREAM_MAX_SECONDS", 10 * 60)
+    seq = await sync_to_async(cache.get, thread_sensitive=False)(_seq_key(exam_id), 0)
+    try:
+        sent = int(last_event_id)
+    except (TypeError, ValueError):
+        sent = seq
+
+    queue = hub.subscribe(exam_id, seq)
+    try:
+        yield "retry: 3000\n\n"
+        counts = await sync_to_async(presence_counts, thread_sensitive=False)(exam_id)
+        yield _format({"event": "presence", **counts})
+        if sent < seq:
+            _, missed = await sync_to_async(read_since, thread_sensitive=False)(exam_id, sent)
+            for entry in missed:
+                yield _format(entry or RESYNC)
+                sent = entry["id"] if entry else sent
+        while (remaining := deadline - loop.time()) > 0:
+            try:
+                entry = await asyncio.wait_for(queue.get(), min(remaining, KEEPALIVE_SECONDS))
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            if entry.get("id", sent + 1) <= sent:
+                continue
+            sent = entry.get("id", sent)
+            yield _format(entry)
+    finally:
+        hub.unsubscribe(exam_id, queue)
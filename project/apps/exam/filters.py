@@ -1,10 +1,15 @@
 import django_filters
 from django import forms
-from .models import Question
+from .models import Question, Tag
 from apps.core.models import Subject, StudentClass
 
 
 class QuestionFilter(django_filters.FilterSet):
+    TAG_MODE_CHOICES = [
+        ("any", "Any selected tag"),
+        ("all", "All selected tags"),
+    ]
+
     subject = django_filters.ModelChoiceFilter(
         queryset=Subject.objects.all(),
         widget=forms.Select(attrs={'class': 'form-select'}),
@@ -19,7 +24,26 @@ class QuestionFilter(django_filters.FilterSet):
         lookup_expr='icontains',
         widget=forms.TextInput(attrs={'class': 'form-control', 'placeholder': 'Search questions...'})
     )
+    tags = django_filters.ModelMultipleChoiceFilter(
+        queryset=Tag.objects.all(),
+        method='filter_tags',
+        widget=forms.SelectMultiple(attrs={'class': 'form-select'}),
+    )
+    tag_mode = django_filters.ChoiceFilter(
+        choices=TAG_MODE_CHOICES,
+        method='filter_tag_mode',
+        empty_label=None,
+        widget=forms.Select(attrs={'class': 'form-select'}),
+    )
 
     class Meta:
         model = Question
-        fields = ['subject', 'class_group', 'question']
+        fields = ['subject', 'class_group', 'question', 'tags', 'tag_mode']
+
+    def filter_tags(self, queryset, name, value):
+        match_all = self.form.cleaned_data.get('tag_mode') == 'all'
+        return queryset.tagged(value, match_all=match_all)
+
+    def filter_tag_mode(self, queryset, name, value):
+        # Only modifies how ``tags`` is applied.
+        return queryset
@@ -2,7 +2,9 @@ from django import forms
 from django.forms.models import BaseInlineFormSet
 from django.utils.translation import gettext_lazy as _
 from apps.core.forms import ResponsiveForm
-from .models import Choice, Exam, Question
+from apps.core.models import StudentClass, Subject
+from .blueprint import even_sections
+from .models import Answer, Choice, Exam, Question, Tag
 
 
 class ExamForm(forms.ModelForm, ResponsiveForm):
@@ -11,17 +13,41 @@ class ExamForm(forms.ModelForm, ResponsiveForm):
         exclude = ("author", "questions")
         widgets = {
             'description': forms.Textarea(attrs={'rows': 4}),
+            'opens_at': forms.DateTimeInput(attrs={'type': 'datetime-local'}, format='%Y-%m-%dT%H:%M'),
+            'closes_at': forms.DateTimeInput(attrs={'type': 'datetime-local'}, format='%Y-%m-%dT%H:%M'),
         }
 
+    def clean(self):
+        cleaned_data = super().clean()
+        opens_at, closes_at = cleaned_data.get("opens_at"), cleaned_data.get("closes_at")
+        if opens_at and closes_at and closes_at <= opens_at:
+            self.add_error("closes_at", "An exam must close after it opens.")
+        return cleaned_data
+
 
 class QuestionForm(forms.ModelForm, ResponsiveForm):
+    new_tags = forms.CharField(
+        required=False,
+        label="New tags",
+        help_text="Comma separated, e.g. algebra, fractions",
+        widget=forms.TextInput(attrs={'class': 'form-control'}),
+    )
+
     class Meta:
         model = Question
         exclude = ("author",)
         widgets = {
             'question': forms.Textarea(attrs={'rows': 4}),
+            'tags': forms.SelectMultiple(attrs={'class': 'form-select'}),
         }
 
+    def save_tags(self, question):
+        """Attach the selected tags plus any new ones typed into ``new_tags``."""
+        tags = list(self.cleaned_data.get("tags") or [])
+        names = {name.strip() for name in self.cleaned_data.get("new_tags", "").split(",")}
+        tags += [Tag.objects.get_or_create(name=name)[0] for name in names if name]
+        question.tags.set(tags)
+
 
 class QuestionChoiceForm(forms.ModelForm, ResponsiveForm):
     class Meta:
@@ -53,3 +79,58 @@ QuestionUpdateChoiceFormset = forms.inlineformset_factory(
         "body": forms.Textarea(attrs={"class": "form-control", "rows": 2}),
     },
 )
+
+
+class ExamBlueprintForm(ResponsiveForm, forms.Form):
+    subject = forms.ModelChoiceField(queryset=Subject.objects.all())
+    class_group = forms.ModelChoiceField(queryset=StudentClass.objects.all(), label="Class")
+    number_of_questions = forms.IntegerField(min_value=1)
+    topics = forms.ModelMultipleChoiceField(
+        queryset=Tag.objects.all(),
+        required=False,
+        help_text="The questions are split evenly across the selected topics.",
+    )
+    recent_terms = forms.IntegerField(
+        min_value=0,
+        initial=0,
+        label="Exclude questions used in the last N terms",
+        help_text="Questions used by exams of this subject in the most recent terms are skipped.",
+    )
+    replace_existing = forms.BooleanField(
+        required=False,
+        label="Replace the questions already on this exam",
+    )
+
+    def get_sections(self):
+        data = self.cleaned_data
+        return even_sections(
+            data["number_of_questions"],
+            subject=data["subject"],
+            class_group=data["class_group"],
+            topics=data["topics"],
+        )
+
+
+class TimeExtensionForm(forms.Form):
+    minutes = forms.IntegerField(
+        min_value=1, max_value=240,
+        widget=forms.NumberInput(attrs={'class': 'form-control'}),
+    )
+    answers = forms.ModelMultipleChoiceField(
+        queryset=Answer.objects.none(),
+        required=False,
+        label="Students",
+        help_text="Leave empty to give everyone taking the exam more time.",
+        widget=forms.SelectMultiple(attrs={'class': 'form-select'}),
+    )
+    reason = forms.CharField(
+        max_length=200, required=False,
+        widget=forms.TextInput(attrs={'class': 'form-control'}),
+    )
+
+    def __init__(self, *args, exam, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields["answers"].queryset = Answer.objects.filter(exam=exam).select_related("user")
+        self.fields["answers"].label_from_instance = (
+            lambda answer: answer.user.get_full_name() or answer.user.username
+        )
@@ -0,0 +1,314 @@
+"""
+Append-only answer journal.
+
+With ``ANSWER_JOURNAL_DIR`` set, submissions and autosaves are not written
+to the database by the request. Each worker process appends them as JSON
+lines to its own segment file and returns as soon as the line is on disk.
+Concurrent appends share one ``fsync`` (group commit): while one request
+syncs, the others queue up behind it and the next sync covers them all.
+
+``replay()``, run by the ``replay_answer_journal`` command, applies new
+entries to ``Answer`` in batched transactions and then records how far
+each segment has been applied. Applying is idempotent. Autosaves and
+submits only change attempts that are still in progress, so entries
+replayed again after a crash change nothing.
+
+Replays hold a lock on the journal directory, so the replay service and
+the scheduler never apply or checkpoint the same entries at once. An
+attempt expired or terminated by a request goes through ``finalize``, which
+first applies the attempt's own pending entries: once the attempt is no
+longer in progress, the replay would skip the autosaves still waiting for
+it. It takes no lock and moves no checkpoint, so requests never queue
+behind a replay; the row lock makes it and a concurrent replay apply the
+same entries one after the other, which leaves the same answers.
+
+Without ``ANSWER_JOURNAL_DIR`` both operations write to the database
+directly.
+"""
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+from apps.core.db import write_with_retry
+from apps.core.files import file_lock, process_alive
+from apps.core.metrics import ANSWER_TRANSITIONS, registry
+from .models import Answer
+
+JOURNAL_ENTRIES = registry.counter(
+    "cbt_journal_entries_total", "Entries appended to the answer journal, by kind.", ["kind"]
+)
+PENDING_TIMEOUT = 24 * 60 * 60
+LOCK_FILE = ".replay.lock"
+MAX_READ_BYTES = 64 * 1024 * 1024
+
+
+def journal_dir():
+    directory = getattr(settings, "ANSWER_JOURNAL_DIR", "")
+    return Path(directory) if directory else None
+
+
+class JournalWriter:
+    """Appends entries to this process' segment with group-committed fsyncs."""
+
+    def __init__(self, directory):
+        directory.mkdir(parents=True, exist_ok=True)
+        # The start time keeps segments apart when a pid is reused.
+        self.path = directory / f"{os.getpid()}-{time.time_ns()}.jsonl"
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o640)
+        self.condition = threading.Condition()
+        self.written = 0
+        self.synced = 0
+        self.syncing = False
+
+    def append(self, entry):
+        line = (json.dumps(entry, separators=(",", ":")) + "\n").encode()
+        with self.condition:
+            os.write(self.fd, line)
+            self.written += len(line)
+            target = self.written
+            while self.synced < target:
+                if self.syncing:
+                    self.condition.wait()
+                    continue
+                # Lead one fsync for everything written so far.
+                self.syncing = True
+                covered = self.written
+                self.condition.release()
+                try:
+                    os.fsync(self.fd)
+                finally:
+                    self.condition.acquire()
+                    self.syncing = False
+                    self.condition.notify_all()
+                self.synced = max(self.synced, covered)
+
+
+_writers = {}
+_writers_lock = threading.Lock()
+
+
+def get_writer(directory):
+    key = (os.getpid(), str(directory))
+    with _writers_lock:
+        if key not in _writers:
+            _writers[key] = JournalWriter(directory)
+        return _writers[key]
+
+
+def _pending_key(answer):
+    return f"answer-journal:submitted:{answer.pk}"
+
+
+def _append(directory, answer, kind, choices):
+    get_writer(directory).append({
+        "answer": answer.pk,
+        "kind": kind,
+        "choices": {str(question): value for question, value in choices.items()},
+        "at": time.time(),
+    })
+    JOURNAL_ENTRIES.inc(kind=kind)
+
+
+def autosave(answer, choices):
+    """Record the answers picked so far on an attempt in progress."""
+    directory = journal_dir()
+    if directory is None:
+        answer.choices = {**answer.choices, **{str(k): v for k, v in choices.items()}}
+        write_with_retry(answer.save, update_fields=["choices"])
+        return
+    _append(directory, answer, "autosave", choices)
+
+
+def submit(answer, choices):
+    """Record a submission; with the journal on it reaches ``Answer`` on the next replay."""
+    directory = journal_dir()
+    if directory is None:
+        write_with_retry(answer.submit, choices)
+        return
+    _append(directory, answer, "submit", choices)
+    cache.set(_pending_key(answer), True, PENDING_TIMEOUT)
+    # The replay sends no changes; proctors see the submission now.
+    answer.publish("submitted", status="completed")
+
+
+def submission_pending(answer):
+    """Whether ``answer`` was submitted to the journal but not applied yet."""
+    return answer.status == "in_progress" and bool(cache.get(_pending_key(answer)))
+
+
+def _checkpoint_path(segment):
+    return segment.with_suffix(".offset")
+
+
+def read_checkpoint(segment):
+    try:
+        return int(_checkpoint_path(segment).read_text())
+    except (OSError, ValueError):
+        return 0
+
+
+def write_checkpoint(segment, offset):
+    path = _checkpoint_path(segment)
+    tmp = path.with_suffix(".offset.tmp")
+    tmp.write_text(str(offset))
+    os.replace(tmp, path)
+
+
+def _read_new_entries(segment, max_bytes, marker=None):
+    """Complete entries after the checkpoint (only lines containing ``marker``), and the offset they end at."""
+    offset = read_checkpoint(segment)
+    with open(segment, "rb") as f:
+        f.seek(offset)
+        data = f.read(max_bytes)
+    # A line without its newline is still being written (or was torn by a crash).
+    end = data.rfind(b"\n") + 1
+    entries = []
+    for position, line in enumerate(data[:end].splitlines()):
+        if marker is not None and marker not in line:
+            continue
+        try:
+            entry = json.loads(line)
+        except ValueError:
+            continue
+        entries.append((entry["at"], segment.name, position, entry))
+    return entries, offset + end
+
+
+def apply_entries(entries):
+    """Apply journal entries in order and return the number of submissions applied."""
+    answers = Answer.objects.select_for_update().in_bulk({entry["answer"] for entry in entries})
+    autosaved = {}
+    submitted = {}
+    for entry in entries:
+        answer = answers.get(entry["answer"])
+        if answer is None or answer.status != "in_progress":
+            continue
+        if entry["kind"] == "autosave":
+            answer.choices = {**answer.choices, **entry["choices"]}
+            autosaved[answer.pk] = answer
+        elif entry["kind"] == "submit":
+            answer.choices = entry["choices"]
+            answer.status = "completed"
+            answer.is_complete = True
+            answer.time_completed = datetime.fromtimestamp(entry["at"], tz=timezone.utc)
+            autosaved.pop(answer.pk, None)
+            submitted[answer.pk] = answer
+
+    # Only rows still in progress: an attempt expired or terminated since it was read keeps that.
+    in_progress = Answer.objects.filter(status="in_progress")
+    count = 0
+    if autosaved:
+        in_progress.bulk_update(list(autosaved.values()), ["choices"])
+    if submitted:
+        count = in_progress.bulk_update(
+            list(submitted.values()), ["choices", "status", "is_complete", "time_completed"]
+        )
+    return count
+
+
+def _replay(directory, batch_size, max_bytes, prune):
+    pending = []
+    offsets = {}
+    for segment in sorted(directory.glob("*.jsonl")):
+        entries, offset = _read_new_entries(segment, max_bytes)
+        pending.extend(entries)
+        offsets[segment] = offset
+    # Segments of different workers interleave; apply entries in the order they were made.
+    pending.sort(key=lambda item: item[:3])
+
+    submitted = 0
+    for i in range(0, len(pending), batch_size):
+        batch = [entry for *_, entry in pending[i:i + batch_size]]
+        with transaction.atomic():
+            count = apply_entries(batch)
+        submitted += count
+        if count:
+            ANSWER_TRANSITIONS.inc(count, transition="submit")
+
+    # Checkpoints move only after every batch committed; a crash before this
+    # replays the pass, which the status checks make harmless.
+    for segment, offset in offsets.items():
+        write_checkpoint(segment, offset)
+        if prune and offset == segment.stat().st_size:
+            pid = int(segment.name.split("-", 1)[0])
+            if not process_alive(pid):
+                segment.unlink()
+                _checkpoint_path(segment).unlink(missing_ok=True)
+    return len(pending), submitted
+
+
+def replay(directory=None, batch_size=None, max_bytes=MAX_READ_BYTES, prune=True):
+    """Apply the new entries of every segment; return ``(entries, submissions)`` applied."""
+    directory = directory or journal_dir()
+    if directory is None or not directory.is_dir():
+        return 0, 0
+    batch_size = batch_size or getattr(settings, "ANSWER_JOURNAL_BATCH_SIZE", 500)
+    with file_lock(directory / LOCK_FILE):
+        return _replay(directory, batch_size, max_bytes, prune)
+
+
+@contextmanager
+def replayed(directory=None):
+    """Apply every journaled entry and keep other replays out until the block ends.
+
+    Inside the block ``Answer`` holds everything journaled so far, so code
+    that finalizes attempts there loses no autosave or submission.
+    """
+    directory = directory or journal_dir()
+    if directory is None or not directory.is_dir():
+        yield
+        return
+    batch_size = getattr(settings, "ANSWER_JOURNAL_BATCH_SIZE", 500)
+    with file_lock(directory / LOCK_FILE):
+        _replay(directory, batch_size, MAX_READ_BYTES, prune=False)
+        yield
+
+
+def pending_entries(answer, directory=None, max_bytes=MAX_READ_BYTES):
+    """The entries of ``answer`` the replay has not checkpointed yet, in the order they were made."""
+    directory = directory or journal_dir()
+    if directory is None or not directory.is_dir():
+        return []
+    # Entries are written with "answer" first, so the id is matched before any line is parsed.
+    marker = b'{"answer":%d,' % answer.pk
+    pending = []
+    for segment in sorted(directory.glob("*.jsonl")):
+        try:
+            entries, _ = _read_new_entries(segment, max_bytes, marker)
+        except FileNotFoundError:
+            # Pruned by a replay since the glob: every entry in it was applied.
+            continue
+        pending.extend(entries)
+    pending.sort(key=lambda item: item[:3])
+    return [entry for *_, entry in pending]
+
+
+def finalize(answer, finish, *args):
+    """Run ``finish`` (``answer.expire`` or ``answer.terminate``) after the attempt's pending entries.
+
+    Return False, finishing nothing, when the attempt is no longer in
+    progress, e.g. because its submission was still in the journal.
+    """
+    entries = pending_entries(answer)
+
+    def apply_and_finish():
+        submitted = apply_entries(entries) if entries else 0
+        if journal_dir() is not None:
+            answer.refresh_from_db()
+        if answer.status != "in_progress":
+            return submitted, False
+        finish(*args)
+        return submitted, True
+
+    submitted, finished = write_with_retry(apply_and_finish)
+    if submitted:
+        ANSWER_TRANSITIONS.inc(submitted, transition="submit")
+    return finished
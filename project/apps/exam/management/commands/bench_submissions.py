@@ -0,0 +1,173 @@
+import json
+import statistics
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import django
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+from django.utils import timezone
+
+from apps.core.db import is_lock_error, write_with_retry
+from apps.core.metrics import DB_LOCK_RETRIES, registry
+from apps.core.models import AcademicSession, AcademicTerm, StudentClass, Subject
+from apps.exam.models import Answer, Choice, Exam, Question
+from apps.exam.papers import get_answer_key, mark_choices
+from apps.exam.simulation import percentile
+
+User = get_user_model()
+
+BENCH_NAME = '__bench_submit__'
+
+
+def _retries():
+    return registry.snapshot().get(DB_LOCK_RETRIES.name, {}).get(json.dumps([]), 0)
+
+
+def submit_batch(exam_id, data, answer_ids, no_retry):
+    """Grade and submit ``answer_ids`` one by one, as the take view does."""
+    result = {'latencies': [], 'lock_errors': 0, 'other_errors': 0}
+    retries_before = _retries()
+    answer_key = get_answer_key(exam_id)
+    try:
+        for pk in answer_ids:
+            started = time.perf_counter()
+            try:
+                answer = Answer.objects.get(pk=pk)
+                choices = mark_choices(answer_key, data)
+                if no_retry:
+                    answer.submit(choices)
+                else:
+                    write_with_retry(answer.submit, choices)
+            except OperationalError as e:
+                result['lock_errors' if is_lock_error(e) else 'other_errors'] += 1
+                continue
+            result['latencies'].append(time.perf_counter() - started)
+    finally:
+        connection.close()
+    # Only meaningful in a worker process; threads share one registry.
+    result['retries'] = _retries() - retries_before
+    return result
+
+
+class Command(BaseCommand):
+    help = 'Measure how many exam submissions per second the database sustains under concurrency'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help='Concurrent submitting workers')
+        parser.add_argument(
+            '--processes', action='store_true',
+            help='Run the workers as processes, like separate server workers, instead of threads',
+        )
+        parser.add_argument('--submissions', type=int, default=400, help='Total submissions')
+        parser.add_argument('--questions', type=int, default=40, help='Questions on the benchmark exam')
+        parser.add_argument(
+            '--no-retry', action='store_true',
+            help='Save submissions directly instead of through the retrying write path',
+        )
+
+    def handle(self, *args, **options):
+        self.report_settings()
+        exam, answer_ids = self.seed(options['submissions'], options['questions'])
+        try:
+            data = {
+                str(question.pk): str(question.choice_set.all()[0].pk)
+                for question in exam.questions.prefetch_related('choice_set')
+            }
+            self.run(exam, data, answer_ids, options)
+        finally:
+            self.cleanup(exam)
+
+    def report_settings(self):
+        if connection.vendor != 'sqlite':
+            self.stdout.write(f'Database: {connection.vendor}')
+            return
+        with connection.cursor() as cursor:
+            pragmas = {}
+            for pragma in ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size', 'cache_size'):
+                cursor.execute(f'PRAGMA {pragma}')
+                pragmas[pragma] = cursor.fetchone()[0]
+        self.stdout.write(
+            'SQLite: ' + ', '.join(f'{name}={value}' for name, value in pragmas.items())
+            + f', transaction_mode={connection.transaction_mode or "DEFERRED"}'
+        )
+
+    def seed(self, submissions, questions):
+        student_class = StudentClass.objects.create(name=BENCH_NAME)
+        subject = Subject.objects.create(name=BENCH_NAME)
+        author = User.objects.create_user(username=BENCH_NAME, is_staff=True)
+        exam = Exam.objects.create(
+            title=BENCH_NAME, class_group=student_class, subject=subject, author=author,
+            session=AcademicSession.objects.create(name=BENCH_NAME),
+            term=AcademicTerm.objects.create(name=BENCH_NAME),
+            exam_type='exam', duration=60,
+        )
+        bank = Question.objects.bulk_create([
+            Question(subject=subject, class_group=student_class, question=f'Question {i}')
+            for i in range(questions)
+        ])
+        Choice.objects.bulk_create([
+            Choice(question=question, body=f'Choice {j}', is_correct=j == 0)
+            for question in bank for j in range(4)
+        ])
+        exam.questions.add(*bank)
+
+        students = User.objects.bulk_create([
+            User(username=f'{BENCH_NAME}{i}', password='!', student_class=student_class)
+            for i in range(submissions)
+        ])
+        Answer.objects.bulk_create([
+            Answer(exam=exam, user=student, status='in_progress', time_started=timezone.now())
+            for student in students
+        ])
+        return exam, list(Answer.objects.filter(exam=exam).values_list('pk', flat=True))
+
+    def run(self, exam, data, answer_ids, options):
+        workers = options['workers']
+        batches = [answer_ids[i::workers] for i in range(workers)]
+        args = ([exam.pk] * workers, [data] * workers, batches, [options['no_retry']] * workers)
+        if options['processes']:
+            # Children open their own connections; an inherited one must not be shared.
+            connection.close()
+            pool = ProcessPoolExecutor(max_workers=workers, initializer=django.setup)
+        else:
+            pool = ThreadPoolExecutor(max_workers=workers)
+
+        retries_before = _retries()
+        started = time.perf_counter()
+        with pool:
+            results = list(pool.map(submit_batch, *args))
+        elapsed = time.perf_counter() - started
+
+        latencies = [latency for result in results for latency in result['latencies']]
+        if options['processes']:
+            retries = sum(result['retries'] for result in results)
+        else:
+            retries = _retries() - retries_before
+        self.stdout.write(
+            f'{workers} {"processes" if options["processes"] else "threads"}, '
+            f'submissions: {len(answer_ids)}, '
+            f'write path: {"direct" if options["no_retry"] else "retrying"}'
+        )
+        if latencies:
+            self.stdout.write(
+                f'Latency: mean {statistics.mean(latencies) * 1000:.1f} ms, '
+                f'p50 {percentile(latencies, 50) * 1000:.1f} ms, '
+                f'p99 {percentile(latencies, 99) * 1000:.1f} ms'
+            )
+        self.stdout.write(
+            f'Lock errors: {sum(result["lock_errors"] for result in results)}, '
+            f'other errors: {sum(result["other_errors"] for result in results)}, '
+            f'retries: {retries}'
+        )
+        self.stdout.write(self.style.SUCCESS(f'{len(latencies) / elapsed:.1f} submissions/s'))
+
+    def cleanup(self, exam):
+        Question.objects.filter(subject__name=BENCH_NAME).delete()
+        exam.delete()
+        User.objects.filter(username__startswith=BENCH_NAME).delete()
+        StudentClass.objects.filter(name=BENCH_NAME).delete()
+        Subject.objects.filter(name=BENCH_NAME).delete()
+        AcademicSession.objects.filter(name=BENCH_NAME).delete()
+        AcademicTerm.objects.filter(name=BENCH_NAME).delete()
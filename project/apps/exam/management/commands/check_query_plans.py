@@ -0,0 +1,181 @@
+import random
+import re
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from apps.core.models import AcademicSession, AcademicTerm, StudentClass, Subject, User
+from apps.exam.caching import PAGE_SIZE, exam_list_queryset
+from apps.exam.models import Answer, Exam, Question
+
+SEED_PREFIX = '__plan__'
+
+
+class Rollback(Exception):
+    """Raised to roll back the synthetic dataset once the plans are checked."""
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the hot querysets against a synthetic dataset and fail on full table scans'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--students', type=int, default=5000, help='Number of synthetic students')
+        parser.add_argument('--exams', type=int, default=500, help='Number of synthetic exams')
+        parser.add_argument('--questions', type=int, default=20000, help='Number of synthetic questions')
+        parser.add_argument('--verbose-plans', action='store_true', help='Print every plan in full')
+
+    def handle(self, *args, **options):
+        failures = []
+        try:
+            with transaction.atomic():
+                self.seed(options)
+                self.analyze()
+                for name, queryset, tables in self.hot_querysets():
+                    plan = queryset.explain()
+                    scanned = self.full_scans(plan, tables)
+                    if options['verbose_plans'] or scanned:
+                        self.stdout.write(f'{name}:\n{plan}\n')
+                    if scanned:
+                        failures.append(f'{name} scans {", ".join(scanned)}')
+                        self.stdout.write(self.style.ERROR(f'✗ {name}'))
+                    else:
+                        self.stdout.write(self.style.SUCCESS(f'✓ {name}'))
+                raise Rollback
+        except Rollback:
+            pass
+
+        if failures:
+            raise CommandError('Full table scans found:\n  ' + '\n  '.join(failures))
+        self.stdout.write(self.style.SUCCESS('Every hot query uses an index.'))
+
+    def seed(self, options):
+        rng = random.Random(0)
+        now = timezone.now()
+        classes = StudentClass.objects.bulk_create(
+            [StudentClass(name=f'{SEED_PREFIX}class{i}') for i in range(20)]
+        )
+        subjects = Subject.objects.bulk_create([Subject(name=f'{SEED_PREFIX}subject{i}') for i in range(15)])
+        session = AcademicSession.objects.create(name=f'{SEED_PREFIX}session')
+        term = AcademicTerm.objects.create(name=f'{SEED_PREFIX}term')
+
+        staff = User.objects.bulk_create([
+            User(username=f'{SEED_PREFIX}staff{i}', password='!', is_staff=True, first_name=f'Staff{i}')
+            for i in range(50)
+        ])
+        students = User.objects.bulk_create([
+            User(
+                username=f'{SEED_PREFIX}student{i}', password='!', first_name=f'First{i % 300}',
+                last_name=f'Last{i % 700}', student_class=rng.choice(classes),
+            )
+            for i in range(options['students'])
+        ], batch_size=500)
+        Question.objects.bulk_create([
+            Question(
+                subject=rng.choice(subjects), class_group=rng.choice(classes),
+                author=rng.choice(staff), question=f'Question {i}',
+            )
+            for i in range(options['questions'])
+        ], batch_size=500)
+        exams = Exam.objects.bulk_create([
+            Exam(
+                title=f'Exam {i}', class_group=rng.choice(classes), session=session, term=term,
+                subject=rng.choice(subjects), exam_type='exam', duration=30,
+                author=rng.choice(staff), published=rng.random() < 0.8,
+                opens_at=now + timedelta(hours=rng.randint(-24 * 90, 24 * 30)),
+                closes_at=now + timedelta(hours=rng.randint(-24 * 90, 24 * 30)) if rng.random() < 0.5 else None,
+            )
+            for i in range(options['exams'])
+        ], batch_size=500)
+        Answer.objects.bulk_create([
+            Answer(exam=exam, user=student, status='completed', is_complete=True)
+            for exam in exams
+            for student in rng.sample(students, min(len(students), 40))
+        ], batch_size=500)
+
+        self.sample = {
+            'now': now,
+            'exam': exams[0],
+            'student': students[0],
+            'staff': staff[0],
+            'class_group': classes[0],
+            'subject': subjects[0],
+        }
+
+    def analyze(self):
+        # Fresh statistics, so the planner sees the synthetic data at its real size.
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def hot_querysets(self):
+        """(name, queryset, tables that must not be scanned) for each hot query."""
+        sample = self.sample
+        exam_table = Exam._meta.db_table
+        return [
+            (
+                'take: answer lookup',
+                Answer.objects.filter(exam=sample['exam'], user=sample['student']),
+                [Answer._meta.db_table],
+            ),
+            (
+                'scores: answers of an exam',
+                Answer.objects.filter(exam=sample['exam']).exclude(status='not_started').select_related('user'),
+                [Answer._meta.db_table],
+            ),
+            (
+                'student dashboard',
+                exam_list_queryset().open(sample['now']).filter(class_group=sample['class_group']),
+                [exam_table],
+            ),
+            (
+                'scheduler: exams opening',
+                Exam.objects.filter(
+                    opens_at__gt=sample['now'], opens_at__lte=sample['now'] + timedelta(minutes=10), published=True,
+                ).exclude(prewarmed_for=F('opens_at')),
+                [exam_table],
+            ),
+            (
+                'scheduler: exams closing',
+                Exam.objects.filter(
+                    closes_at__gt=sample['now'] - timedelta(hours=1), closes_at__lte=sample['now'],
+                ).exclude(closed_for=F('closes_at')),
+                [exam_table],
+            ),
+            (
+                'staff dashboard',
+                exam_list_queryset().filter(author=sample['staff']),
+                [exam_table],
+            ),
+            (
+                'question bank filter',
+                Question.objects.filter(
+                    subject=sample['subject'], class_group=sample['class_group'], author=sample['staff']
+                ),
+                [Question._meta.db_table],
+            ),
+            (
+                'student list',
+                User.objects.filter(is_staff=False, is_superuser=False)
+                .order_by('first_name', 'last_name', 'username')[:PAGE_SIZE],
+                [User._meta.db_table],
+            ),
+            (
+                'staff list',
+                User.objects.filter(is_staff=True, is_superuser=False)
+                .order_by('first_name', 'last_name', 'username')[:PAGE_SIZE],
+                [User._meta.db_table],
+            ),
+        ]
+
+    def full_scans(self, plan, tables):
+        """Tables of ``tables`` that ``plan`` reads with a full scan."""
+        scanned = []
+        for table in tables:
+            # SQLite: "SCAN <table>" without "USING ... INDEX"; PostgreSQL: "Seq Scan on <table>".
+            sqlite_scan = re.search(rf'\bSCAN {re.escape(table)}\b(?!.*\bUSING\b.*\bINDEX\b)', plan)
+            postgres_scan = re.search(rf'Seq Scan on {re.escape(table)}\b', plan)
+            if sqlite_scan or postgres_scan:
+                scanned.append(table)
+        return scanned
@@ -0,0 +1,33 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.core.db import write_with_retry
+from apps.exam.models import ProctorEvent
+
+
+class Command(BaseCommand):
+    help = 'Delete anti-cheating events older than the retention period, one day at a time'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=None,
+            help='Days of events to keep (default: PROCTOR_EVENT_RETENTION_DAYS)',
+        )
+
+    def handle(self, *args, **options):
+        days = options['days'] if options['days'] is not None else settings.PROCTOR_EVENT_RETENTION_DAYS
+        if days < 1:
+            raise CommandError('Keep at least one day of events.')
+        cutoff = timezone.now().date() - timedelta(days=days)
+
+        # Each day is its own short transaction on the day index, so pruning
+        # never holds the write lock for long while exams are running.
+        expired = ProctorEvent.objects.filter(day__lt=cutoff)
+        total = 0
+        for day in expired.values_list('day', flat=True).distinct().order_by('day'):
+            deleted, _ = write_with_retry(ProctorEvent.objects.filter(day=day).delete)
+            total += deleted
+        self.stdout.write(f'Deleted {total} event(s) from before {cutoff}; attempt summaries are kept.')
@@ -0,0 +1,34 @@
+import time
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.exam.journal import journal_dir, replay
+
+
+class Command(BaseCommand):
+    help = 'Apply journaled submissions and autosaves to the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', default=None, help='Journal directory (default: ANSWER_JOURNAL_DIR)')
+        parser.add_argument('--batch-size', type=int, default=None, help='Entries applied per transaction')
+        parser.add_argument('--follow', action='store_true', help='Keep replaying new entries')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds between passes with --follow')
+        parser.add_argument('--keep', action='store_true', help='Keep fully applied segments of stopped workers')
+
+    def handle(self, *args, **options):
+        directory = Path(options['dir']) if options['dir'] else journal_dir()
+        if directory is None:
+            raise CommandError('No journal directory: set ANSWER_JOURNAL_DIR or pass --dir.')
+
+        while True:
+            started = time.perf_counter()
+            entries, submitted = replay(directory, batch_size=options['batch_size'], prune=not options['keep'])
+            if entries or not options['follow']:
+                self.stdout.write(
+                    f'Applied {entries} entries ({submitted} submissions) '
+                    f'in {(time.perf_counter() - started) * 1000:.0f} ms'
+                )
+            if not options['follow']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,42 @@
+import time
+import traceback
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from apps.exam.scheduler import tick
+
+
+class Command(BaseCommand):
+    help = 'Prewarm, open and close exams at the edges of their windows'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Run one pass and exit')
+        parser.add_argument(
+            '--interval', type=float, default=None,
+            help='Seconds between passes (default: EXAM_SCHEDULER_INTERVAL_SECONDS)',
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval'] or settings.EXAM_SCHEDULER_INTERVAL_SECONDS
+        while True:
+            close_old_connections()
+            started = time.perf_counter()
+            try:
+                done = tick()
+            except Exception:
+                # A failing pass (e.g. the database is unreachable) must not stop the schedule.
+                if options['once']:
+                    raise
+                self.stderr.write(traceback.format_exc())
+                time.sleep(interval)
+                continue
+            if any(done.values()) or options['once']:
+                self.stdout.write(
+                    ', '.join(f'{step} {len(exam_ids)}' for step, exam_ids in done.items())
+                    + f' in {(time.perf_counter() - started) * 1000:.0f} ms'
+                )
+            if options['once']:
+                return
+            time.sleep(interval)
@@ -0,0 +1,109 @@
+import asyncio
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+
+from apps.exam.models import Answer, Exam
+from apps.exam.simulation import percentile, simulate
+
+User = get_user_model()
+
+SIM_USERNAME = 'sim-student-{}'
+SIM_PASSWORD = 'sim-student-password'
+
+
+class Command(BaseCommand):
+    help = (
+        'Rehearse exam day: simulated students log in, take and submit an exam against a running '
+        'server. Run the server with DEBUG on to tell database lock errors apart from other 5xx.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('exam_id', type=int, help='Exam the students take')
+        parser.add_argument('--students', type=int, default=50, help='Number of simulated students')
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the running server')
+        parser.add_argument('--think-time', type=float, default=2.0, help='Mean seconds spent per question')
+        parser.add_argument('--ramp-up', type=float, default=10.0, help='Seconds over which students arrive')
+        parser.add_argument(
+            '--autosave-every', type=int, default=0,
+            help='Autosave after every N answered questions (0 disables autosave)',
+        )
+        parser.add_argument(
+            '--terminate-rate', type=float, default=0.0,
+            help='Fraction of students terminated by the anti-cheating check instead of submitting',
+        )
+        parser.add_argument('--timeout', type=float, default=30.0, help='Seconds before a request times out')
+        parser.add_argument('--login-retries', type=int, default=5, help='Retries while the login queue is full')
+        parser.add_argument('--seed', type=int, default=None, help='Random seed for a repeatable run')
+        parser.add_argument('--cleanup', action='store_true', help='Delete the simulated students afterwards')
+
+    def handle(self, *args, **options):
+        try:
+            exam = Exam.objects.get(pk=options['exam_id'])
+        except Exam.DoesNotExist:
+            raise CommandError(f'Exam {options["exam_id"]} does not exist.')
+
+        users = self.prepare_students(exam, options['students'])
+        credentials = [(user.username, SIM_PASSWORD) for user in users]
+        self.stdout.write(
+            f'Simulating {len(users)} students on "{exam}" against {options["url"]} '
+            f'({exam.questions.count()} questions)'
+        )
+
+        started = time.perf_counter()
+        try:
+            stats = asyncio.run(simulate(options['url'], exam.pk, credentials, options, seed=options['seed']))
+        finally:
+            if options['cleanup']:
+                User.objects.filter(pk__in=[user.pk for user in users]).delete()
+        self.report(stats, time.perf_counter() - started)
+
+    def prepare_students(self, exam, count):
+        """Create the missing simulated students in the exam's class and clear their attempts."""
+        usernames = [SIM_USERNAME.format(i) for i in range(count)]
+        existing = set(User.objects.filter(username__in=usernames).values_list('username', flat=True))
+        # One hash shared by every simulated account keeps setup fast at any hasher cost.
+        password = make_password(SIM_PASSWORD)
+        User.objects.bulk_create([
+            User(username=username, password=password, first_name='Simulated')
+            for username in usernames if username not in existing
+        ])
+        users = list(User.objects.filter(username__in=usernames))
+        User.objects.filter(pk__in=[user.pk for user in users]).update(
+            student_class=exam.class_group, password=password,
+        )
+        Answer.objects.filter(exam=exam, user__in=users).delete()
+        return users
+
+    def report(self, stats, elapsed):
+        failed = sum(count for status, count in stats.statuses.items() if status >= 400)
+        self.stdout.write(
+            f'\nDuration: {elapsed:.1f}s\n'
+            f'Requests: {stats.requests} ({stats.requests / elapsed:.1f} req/s)\n'
+            f'Exams submitted: {stats.outcomes["submitted"]}, terminated: {stats.outcomes["terminated"]}, '
+            f'failed: {stats.outcomes["failed"]} '
+            f'({(stats.outcomes["submitted"] + stats.outcomes["terminated"]) / elapsed:.2f} exams/s)\n'
+        )
+
+        self.stdout.write(f'{"step":<12}{"count":>7}{"p50 ms":>10}{"p90 ms":>10}{"p99 ms":>10}{"max ms":>10}')
+        for step, values in stats.latencies.items():
+            self.stdout.write(
+                f'{step:<12}{len(values):>7}'
+                + ''.join(f'{percentile(values, pct) * 1000:>10.1f}' for pct in (50, 90, 99, 100))
+            )
+
+        statuses = ', '.join(f'{status}: {count}' for status, count in sorted(stats.statuses.items()))
+        self.stdout.write(f'\nStatus codes: {statuses or "none"}')
+        error_rate = failed / stats.requests * 100 if stats.requests else 0
+        self.stdout.write(f'HTTP error rate: {error_rate:.2f}%')
+        self.stdout.write(f'DB lock errors: {stats.errors["db_lock"]}')
+        for error, count in sorted(stats.errors.items()):
+            if error != 'db_lock':
+                self.stdout.write(f'  {error}: {count}')
+
+        if stats.outcomes['failed'] or stats.errors['db_lock']:
+            self.stdout.write(self.style.ERROR('Some students could not finish their exam.'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Every student finished the exam.'))
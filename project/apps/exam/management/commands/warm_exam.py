@@ -0,0 +1,63 @@
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from apps.exam import warmup
+from apps.exam.models import Exam
+
+
+class Command(BaseCommand):
+    help = 'Fill the template, paper, answer key and dashboard caches before an exam opens'
+
+    def add_arguments(self, parser):
+        parser.add_argument('exam_ids', nargs='*', type=int, help='Exams to warm')
+        parser.add_argument(
+            '--since', type=float, default=None, metavar='HOURS',
+            help='Also warm every published exam changed in the last HOURS hours',
+        )
+        parser.add_argument(
+            '--opening', type=float, default=None, metavar='MINUTES',
+            help='Also warm every published exam opening in the next MINUTES minutes',
+        )
+
+    def handle(self, *args, **options):
+        exams = Exam.objects.none()
+        if options['exam_ids']:
+            exams = Exam.objects.filter(pk__in=options['exam_ids'])
+        if options['since'] is not None:
+            changed = Exam.objects.filter(
+                published=True, updated__gte=timezone.now() - timedelta(hours=options['since'])
+            )
+            exams = exams | changed
+        if options['opening'] is not None:
+            now = timezone.now()
+            opening = Exam.objects.filter(
+                published=True, opens_at__gt=now, opens_at__lte=now + timedelta(minutes=options['opening'])
+            )
+            exams = exams | opening
+        if not options['exam_ids'] and options['since'] is None and options['opening'] is None:
+            raise CommandError('Name the exams to warm or pass --since or --opening.')
+
+        exams = list(exams.values_list('pk', 'class_group_id'))
+        missing = set(options['exam_ids']) - {pk for pk, _ in exams}
+        if missing:
+            raise CommandError(f'No exam with id {", ".join(map(str, sorted(missing)))}.')
+        exam_ids = [pk for pk, _ in exams]
+        class_ids = sorted({class_id for _, class_id in exams})
+
+        steps = [
+            ('templates', warmup.warm_templates),
+            ('papers', lambda: warmup.warm_papers(exam_ids)),
+            ('answer keys', lambda: warmup.warm_answer_keys(exam_ids)),
+            ('class dashboards', lambda: warmup.warm_dashboards(class_ids)),
+        ]
+        total = time.perf_counter()
+        for name, step in steps:
+            started = time.perf_counter()
+            count = step()
+            self.stdout.write(f'{name}: {count} in {(time.perf_counter() - started) * 1000:.1f} ms')
+        self.stdout.write(self.style.SUCCESS(
+            f'Warmed {len(exam_ids)} exam(s) in {(time.perf_counter() - total) * 1000:.1f} ms'
+        ))
@@ -0,0 +1,45 @@
+# Generated by Django 5.1.5 on 2026-10-19 10:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0003_alter_answer_choices'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Tag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='QuestionTag',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('question', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='exam.question')),
+                ('tag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='exam.tag')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='question',
+            name='tags',
+            field=models.ManyToManyField(blank=True, related_name='questions', through='exam.QuestionTag', to='exam.tag'),
+        ),
+        migrations.AddIndex(
+            model_name='questiontag',
+            index=models.Index(fields=['tag', 'question'], name='questiontag_tag_question_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='questiontag',
+            constraint=models.UniqueConstraint(fields=('question', 'tag'), name='unique_question_tag'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.1.5 on 2026-10-19 10:22
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def remove_duplicate_answers(apps, schema_editor):
+    """Keep one attempt per (exam, user) so the unique constraint can be added.
+
+    A finished attempt wins over an unfinished one, then the latest start.
+    """
+    Answer = apps.get_model("exam", "Answer")
+    duplicates = (
+        Answer.objects.values("exam_id", "user_id")
+        .annotate(attempts=Count("id"))
+        .filter(attempts__gt=1)
+    )
+    for row in duplicates:
+        attempts = Answer.objects.filter(exam_id=row["exam_id"], user_id=row["user_id"]).order_by(
+            "-is_complete", models.F("time_started").desc(nulls_last=True), "-id"
+        )
+        keep = attempts.first()
+        attempts.exclude(pk=keep.pk).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_hot_query_indexes'),
+        ('exam', '0004_question_tags'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_answers, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='answer',
+            index=models.Index(fields=['exam', 'status'], name='answer_exam_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exam',
+            index=models.Index(fields=['class_group', 'published', 'created'], name='exam_class_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exam',
+            index=models.Index(fields=['author', 'published', 'created'], name='exam_author_published_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='question',
+            index=models.Index(fields=['subject', 'class_group', 'author'], name='question_bank_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='answer',
+            constraint=models.UniqueConstraint(fields=('exam', 'user'), name='unique_answer_per_exam_user'),
+        ),
+    ]
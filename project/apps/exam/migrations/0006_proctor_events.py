@@ -0,0 +1,42 @@
+# Generated by Django 5.1.5 on 2026-10-19 11:06
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0005_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProctorSummary',
+            fields=[
+                ('answer', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='proctor_summary', serialize=False, to='exam.answer')),
+                ('tab_switches', models.PositiveIntegerField(default=0)),
+                ('blurs', models.PositiveIntegerField(default=0)),
+                ('copy_attempts', models.PositiveIntegerField(default=0)),
+                ('fullscreen_exits', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('first_event_at', models.DateTimeField()),
+                ('last_event_at', models.DateTimeField()),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProctorEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('tab_switch', 'Tab switch'), ('blur', 'Window blur'), ('copy', 'Copy attempt'), ('fullscreen_exit', 'Fullscreen exit')], max_length=20)),
+                ('occurred_at', models.DateTimeField()),
+                ('received_at', models.DateTimeField()),
+                ('day', models.DateField()),
+                ('detail', models.CharField(blank=True, max_length=200)),
+                ('answer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='proctor_events', to='exam.answer')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['day', 'answer'], name='proctorevent_day_idx'), models.Index(fields=['answer', 'occurred_at'], name='proctorevent_answer_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.5 on 2026-10-19 11:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0006_proctor_events'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='answer',
+            name='last_seen',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
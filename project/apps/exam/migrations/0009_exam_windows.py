@@ -0,0 +1,44 @@
+# Generated by Django 5.1.5 on 2026-10-19 11:27
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F
+
+
+def open_since_creation(apps, schema_editor):
+    """Existing exams have been open to their class since they were created."""
+    Exam = apps.get_model("exam", "Exam")
+    Exam.objects.update(opens_at=F("created"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0008_time_extensions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exam',
+            name='closes_at',
+            field=models.DateTimeField(blank=True, help_text='When attempts still in progress are submitted. Empty: never.', null=True),
+        ),
+        migrations.AddField(
+            model_name='exam',
+            name='opens_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='When students can start the exam.'),
+        ),
+        migrations.RunPython(open_since_creation, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='exam',
+            index=models.Index(fields=['class_group', 'published', 'opens_at'], name='exam_class_window_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exam',
+            index=models.Index(fields=['opens_at'], name='exam_opens_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='exam',
+            index=models.Index(fields=['closes_at'], name='exam_closes_at_idx'),
+        ),
+    ]
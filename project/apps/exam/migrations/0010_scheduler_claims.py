@@ -0,0 +1,28 @@
+# Generated by Django 5.1.5 on 2026-10-19 12:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('exam', '0009_exam_windows'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exam',
+            name='closed_for',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='exam',
+            name='opened_for',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='exam',
+            name='prewarmed_for',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+    ]
@@ -1,7 +1,11 @@
 from datetime import timedelta
 from django.conf import settings
 from django.db import models
+from django.db.models import Count
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.functional import cached_property
+from apps.core.metrics import ANSWER_TRANSITIONS
 from apps.core.models import (
     AcademicSession,
     AcademicTerm,
@@ -9,6 +13,38 @@ from apps.core.models import (
     Subject,
     User,
 )
+from . import feed
+
+
+class Tag(models.Model):
+    """Topic tag for bank questions, e.g. "algebra" or "fractions"."""
+    name = models.CharField(max_length=100, unique=True)
+
+    class Meta:
+        ordering = ["name"]
+
+    def __str__(self):
+        return self.name
+
+
+class QuestionQuerySet(models.QuerySet):
+    def tagged(self, tags, match_all=False):
+        """Questions carrying any (or, with ``match_all``, every) tag in ``tags``.
+
+        Both modes run as one statement: a subquery over the (tag, question)
+        index of ``QuestionTag``.
+        """
+        tag_ids = {getattr(tag, "pk", tag) for tag in tags}
+        if not tag_ids:
+            return self
+        matches = QuestionTag.objects.filter(tag_id__in=tag_ids)
+        if match_all:
+            matches = (
+                matches.values("question_id")
+                .annotate(matched=Count("tag_id"))
+                .filter(matched=len(tag_ids))
+            )
+        return self.filter(id__in=matches.values("question_id"))
 
 
 class Question(models.Model):
@@ -16,14 +52,37 @@ class Question(models.Model):
     class_group = models.ForeignKey(StudentClass, on_delete=models.CASCADE)
     question = models.TextField()
     author = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    tags = models.ManyToManyField(Tag, through="QuestionTag", blank=True, related_name="questions")
+
+    objects = QuestionQuerySet.as_manager()
 
     class Meta:
         ordering = ["id"]
+        indexes = [
+            models.Index(fields=["subject", "class_group", "author"], name="question_bank_idx"),
+        ]
 
     def __str__(self):
         return self.question[:50]
 
 
+class QuestionTag(models.Model):
+    question = models.ForeignKey(Question, on_delete=models.CASCADE)
+    tag = models.ForeignKey(Tag, on_delete=models.CASCADE)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["question", "tag"], name="unique_question_tag"),
+        ]
+        indexes = [
+            # Tag lookups read question ids straight from this index.
+            models.Index(fields=["tag", "question"], name="questiontag_tag_question_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.question_id}: {self.tag}"
+
+
 class Choice(models.Model):
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     body = models.TextField()
@@ -33,6 +92,15 @@ class Choice(models.Model):
         return self.body[:30]
 
 
+class ExamQuerySet(models.QuerySet):
+    def open(self, now=None):
+        """Published exams whose window contains ``now``, read through the window indexes."""
+        now = now or timezone.now()
+        return self.filter(published=True, opens_at__lte=now).filter(
+            models.Q(closes_at__isnull=True) | models.Q(closes_at__gt=now)
+        )
+
+
 class Exam(models.Model):
     EXAM_TYPE_CHOICES = [
         ("ca2", "CA 2"),
@@ -54,6 +122,14 @@ class Exam(models.Model):
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE,
     )
     published = models.BooleanField(default=True)
+    opens_at = models.DateTimeField(default=timezone.now, help_text="When students can start the exam.")
+    closes_at = models.DateTimeField(
+        null=True, blank=True, help_text="When attempts still in progress are submitted. Empty: never.",
+    )
+    # The window edge each scheduler step last ran for; see apps.exam.scheduler.
+    prewarmed_for = models.DateTimeField(null=True, editable=False)
+    opened_for = models.DateTimeField(null=True, editable=False)
+    closed_for = models.DateTimeField(null=True, editable=False)
     show_feedback = models.BooleanField(default=True)
     show_result = models.BooleanField(default=True)
     show_on_report = models.BooleanField(default=True)
@@ -62,8 +138,18 @@ class Exam(models.Model):
     updated = models.DateTimeField(auto_now=True)
     questions = models.ManyToManyField(Question, blank=True)
 
+    objects = ExamQuerySet.as_manager()
+
     class Meta:
         ordering = ["-published", "-created"]
+        indexes = [
+            models.Index(fields=["class_group", "published", "created"], name="exam_class_published_idx"),
+            models.Index(fields=["author", "published", "created"], name="exam_author_published_idx"),
+            models.Index(fields=["class_group", "published", "opens_at"], name="exam_class_window_idx"),
+            # The scheduler looks for window edges across all exams.
+            models.Index(fields=["opens_at"], name="exam_opens_at_idx"),
+            models.Index(fields=["closes_at"], name="exam_closes_at_idx"),
+        ]
 
     def __str__(self):
         return f"{self.title}"
@@ -71,6 +157,10 @@ class Exam(models.Model):
     def get_absolute_url(self):
         return reverse("exam-detail", args=(self.id,))
 
+    def is_open(self, now=None):
+        now = now or timezone.now()
+        return self.opens_at <= now and (self.closes_at is None or now < self.closes_at)
+
     @property
     def get_duration(self):
         a = timedelta(minutes=self.duration)
@@ -78,6 +168,9 @@ class Exam(models.Model):
 
     @property
     def question_count(self):
+        # List querysets annotate ``num_questions`` to avoid a COUNT per exam.
+        if hasattr(self, "num_questions"):
+            return self.num_questions
         return self.questions.count()
 
 
@@ -99,11 +192,51 @@ class Answer(models.Model):
     is_complete = models.BooleanField(default=False)
     status = models.CharField(max_length=20, choices=EXAM_STATUS_CHOICES, default='not_started')
     termination_reason = models.TextField(blank=True, null=True)  # Reason for termination if applicable
+    last_seen = models.DateTimeField(null=True, blank=True)  # Last heartbeat, stored in batches by presence
     choices = models.JSONField(default=dict, blank=True)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["exam", "user"], name="unique_answer_per_exam_user"),
+        ]
+        indexes = [
+            models.Index(fields=["exam", "status"], name="answer_exam_status_idx"),
+        ]
+
     def __str__(self):
         return f"Score for {self.user} in {self.exam}"
 
+    def publish(self, event, **data):
+        """Tell the exam's proctor screens about a change of this attempt."""
+        feed.publish(self.exam_id, event, **{"answer": self.pk, "user": self.user_id, "status": self.status, **data})
+
+    def _finish(self, status, transition, event):
+        self.time_completed = timezone.now()
+        self.is_complete = True
+        self.status = status
+        self.save()
+        ANSWER_TRANSITIONS.inc(transition=transition)
+        self.publish(event)
+
+    def start(self):
+        self.time_started = timezone.now()
+        self.status = 'in_progress'
+        self.save()
+        ANSWER_TRANSITIONS.inc(transition="start")
+        self.publish("started")
+
+    def submit(self, choices):
+        self.choices = choices
+        self._finish('completed', "submit", "submitted")
+
+    def terminate(self, reason):
+        self.termination_reason = reason
+        self._finish('terminated', "terminate", "terminated")
+
+    def expire(self):
+        """Close an attempt whose time ran out, keeping the answers saved so far."""
+        self._finish('completed', "expire", "expired")
+
     @property
     def score(self):
         total = 0
@@ -112,11 +245,99 @@ class Answer(models.Model):
                 total += 1
         return total
 
-    @property
+    @cached_property
     def total_questions(self):
-        return self.exam.questions.count()
+        return self.exam.question_count
 
     def percent(self):
         if self.total_questions > 0:
             return round((self.score / self.total_questions) * 100, 1)
         return 0
+
+
+class ProctorEvent(models.Model):
+    """A suspicious event reported by the exam page; rows are only ever inserted.
+
+    ``day`` partitions the table by the day an event arrived: review and
+    pruning select whole days through its index (see ``prune_proctor_events``).
+    """
+    KIND_CHOICES = [
+        ("tab_switch", "Tab switch"),
+        ("blur", "Window blur"),
+        ("copy", "Copy attempt"),
+        ("fullscreen_exit", "Fullscreen exit"),
+    ]
+
+    answer = models.ForeignKey(Answer, on_delete=models.CASCADE, related_name="proctor_events")
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    occurred_at = models.DateTimeField()  # Browser clock, never later than received_at
+    received_at = models.DateTimeField()
+    day = models.DateField()
+    detail = models.CharField(max_length=200, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["day", "answer"], name="proctorevent_day_idx"),
+            models.Index(fields=["answer", "occurred_at"], name="proctorevent_answer_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} on {self.answer_id} at {self.occurred_at}"
+
+
+class ProctorSummary(models.Model):
+    """Running event counts of an attempt, kept up to date as events are stored."""
+    answer = models.OneToOneField(Answer, on_delete=models.CASCADE, primary_key=True, related_name="proctor_summary")
+    tab_switches = models.PositiveIntegerField(default=0)
+    blurs = models.PositiveIntegerField(default=0)
+    copy_attempts = models.PositiveIntegerField(default=0)
+    fullscreen_exits = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    first_event_at = models.DateTimeField()
+    last_event_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.total} event(s) on {self.answer_id}"
+
+
+class TimeExtension(models.Model):
+    """Extra minutes for one attempt, or for every attempt of the exam when ``answer`` is empty."""
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name="time_extensions")
+    answer = models.ForeignKey(
+        Answer, on_delete=models.CASCADE, null=True, blank=True, related_name="time_extensions",
+    )
+    minutes = models.PositiveIntegerField()
+    reason = models.CharField(max_length=200, blank=True)
+    granted_by = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.SET_NULL, null=True, blank=True, related_name="+",
+    )
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["exam", "answer"], name="timeextension_exam_idx"),
+        ]
+
+    def __str__(self):
+        return f"+{self.minutes} min on {self.exam}"
+
+
+class SubmissionKey(models.Model):
+    """The outcome of the first submission made from one render of the exam page.
+
+    The unique constraint decides which of two concurrent submissions with
+    the same key grades; ``outcome`` stays empty until it has.
+    """
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name="+")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="+")
+    key = models.CharField(max_length=64)
+    outcome = models.JSONField(null=True, editable=False)
+    created = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["exam", "user", "key"], name="unique_submission_key"),
+        ]
+
+    def __str__(self):
+        return f"{self.key} on {self.exam_id} by {self.user_id}"
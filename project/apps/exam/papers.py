@@ -0,0 +1,75 @@
+"""
+Cached exam papers and answer keys.
+
+Every student in an exam loads the same paper: the exam with its subject,
+session and class, its questions and their choices. The paper is cached as
+one snapshot per version of the exam's cache scope, which changes whenever
+the exam, its questions or their choices change (see ``signals``), so a
+cached paper is never stale. The choices are shuffled for each request
+after it leaves the cache.
+
+The answer key maps every question to its choices' correctness, which is
+all that marking a submission needs.
+"""
+import random
+
+from django.conf import settings
+from django.db.models import Prefetch
+
+from apps.core.cache import get_or_compute, versioned_key
+from .caching import exam_scope
+from .models import Choice, Exam
+
+
+def _timeout():
+    return getattr(settings, "EXAM_PAPER_CACHE_TIMEOUT", 6 * 60 * 60)
+
+
+def load_paper(exam_id):
+    return Exam.objects.select_related("subject", "session", "term", "class_group").prefetch_related(
+        Prefetch("questions__choice_set", queryset=Choice.objects.order_by("pk"), to_attr="options"),
+    ).get(pk=exam_id)
+
+
+def get_paper(exam_id):
+    """Return the exam with its questions and their ``options`` (choices), from the cache."""
+    return get_or_compute(
+        versioned_key("paper", exam_scope(exam_id)), lambda: load_paper(exam_id),
+        _timeout(), cache_name="paper",
+    )
+
+
+def shuffle_options(paper):
+    for question in paper.questions.all():
+        random.shuffle(question.options)
+    return paper
+
+
+def build_answer_key(paper):
+    return {
+        question.pk: {str(option.pk): option.is_correct for option in question.options}
+        for question in paper.questions.all()
+    }
+
+
+def get_answer_key(exam_id):
+    """Return ``{question id: {choice id: is_correct}}`` for the exam, from the cache."""
+    return get_or_compute(
+        versioned_key("answer-key", exam_scope(exam_id)),
+        lambda: build_answer_key(get_paper(exam_id)),
+        _timeout(), cache_name="answer_key",
+    )
+
+
+def mark_choices(answer_key, data):
+    """Map each answered question to ``[choice id, is_correct]``.
+
+    ``data`` maps question ids to choice ids, as posted by the exam form.
+    Choices that do not belong to their question are ignored.
+    """
+    choices = {}
+    for question_id, options in answer_key.items():
+        choice = data.get(str(question_id), "")
+        if choice in options:
+            choices[question_id] = [choice, options[choice]]
+    return choices
@@ -0,0 +1,185 @@
+"""
+Presence of students taking an exam.
+
+The exam page sends a heartbeat every ``PRESENCE_HEARTBEAT_SECONDS`` with
+the seconds since the student last touched the page. A beat only touches
+the shared cache: each attempt has a record of the time bucket and state
+(online or idle) of its last beat, and each exam has one counter per bucket
+and state with the number of attempts whose last beat fell in it. A beat
+moves its attempt from one counter to another, so the counts of an exam
+are read from a fixed number of keys, however many students take it:
+
+- online: beat within ``PRESENCE_DISCONNECT_SECONDS``, touched the page
+  within ``PRESENCE_IDLE_SECONDS``;
+- idle: beat within ``PRESENCE_DISCONNECT_SECONDS``, untouched for longer;
+- disconnected: joined and not finished, but no recent beat.
+
+Joining and changes between online and idle are published to the exam's
+proctor feed (see ``feed``). ``Answer.last_seen`` is written in batches:
+each worker remembers the attempts it saw and stores them every
+``PRESENCE_COMPACT_SECONDS``.
+
+Counters are exact on caches with atomic ``incr`` (Redis, memcached,
+local memory); the development file cache may miscount concurrent beats.
+"""
+import atexit
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError
+from django.utils import timezone
+
+from apps.core.db import write_with_retry
+from . import feed
+from .models import Answer
+
+BUCKET_SECONDS = 5
+STATES = ("online", "idle")
+# Records and counters outlive any exam; finishing an attempt removes its record.
+RECORD_TIMEOUT = 24 * 60 * 60
+
+
+def _record_key(exam_id, user_id):
+    return f"presence:{exam_id}:user:{user_id}"
+
+
+def _members_key(exam_id):
+    return f"presence:{exam_id}:members"
+
+
+def _bucket_key(exam_id, bucket, state):
+    return f"presence:{exam_id}:bucket:{bucket}:{state}"
+
+
+def _disconnect_seconds():
+    return getattr(settings, "PRESENCE_DISCONNECT_SECONDS", 45)
+
+
+def _incr(key, delta=1, timeout=RECORD_TIMEOUT):
+    cache.add(key, 0, timeout)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # Expired in between; a lost count only lasts until the bucket ages out.
+        pass
+
+
+def _decr(key):
+    try:
+        cache.decr(key)
+    except ValueError:
+        # The bucket has aged out already.
+        pass
+
+
+def _place(idle_seconds):
+    state = "idle" if idle_seconds >= getattr(settings, "PRESENCE_IDLE_SECONDS", 120) else "online"
+    return int(time.time() // BUCKET_SECONDS), state
+
+
+def _move(exam_id, old, new):
+    if old == new:
+        return
+    if old is not None:
+        _decr(_bucket_key(exam_id, *old))
+    # Counters only need to live as long as they can be counted.
+    _incr(_bucket_key(exam_id, *new), timeout=_disconnect_seconds() + 2 * BUCKET_SECONDS)
+
+
+class LastSeen:
+    """When this process last heard from each attempt, stored in batches."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.seen = {}
+        self.compacted = time.monotonic()
+
+    def note(self, answer_id):
+        with self.lock:
+            self.seen[answer_id] = timezone.now()
+            due = time.monotonic() - self.compacted >= getattr(settings, "PRESENCE_COMPACT_SECONDS", 60)
+        if due:
+            self.compact()
+
+    def compact(self):
+        with self.lock:
+            seen, self.seen = self.seen, {}
+            self.compacted = time.monotonic()
+        if seen:
+            write_with_retry(
+                Answer.objects.bulk_update,
+                [Answer(pk=answer_id, last_seen=at) for answer_id, at in seen.items()],
+                ["last_seen"],
+            )
+        return len(seen)
+
+
+last_seen = LastSeen()
+
+
+@atexit.register
+def _compact_at_exit():
+    try:
+        last_seen.compact()
+    except DatabaseError:
+        # The database went away before this process did; nothing to keep.
+        pass
+
+
+def join(exam_id, user_id, answer_id, idle_seconds=0):
+    """Register an attempt in progress; joining again changes nothing."""
+    place = _place(idle_seconds)
+    if cache.add(_record_key(exam_id, user_id), {"answer": answer_id, "place": place}, RECORD_TIMEOUT):
+        _incr(_members_key(exam_id))
+        # Some backends' incr resets the key to the default timeout.
+        cache.touch(_members_key(exam_id), RECORD_TIMEOUT)
+        _move(exam_id, None, place)
+        feed.publish(exam_id, "seen", answer=answer_id, user=user_id, state=place[1])
+    last_seen.note(answer_id)
+
+
+def beat(exam_id, user_id, idle_seconds):
+    """Record a heartbeat; return the attempt's id, or None when it has not joined."""
+    record = cache.get(_record_key(exam_id, user_id))
+    if record is None:
+        return None
+    place = _place(idle_seconds)
+    old = tuple(record["place"])
+    if place != old:
+        _move(exam_id, old, place)
+        cache.set(_record_key(exam_id, user_id), {**record, "place": place}, RECORD_TIMEOUT)
+        if place[1] != old[1]:
+            feed.publish(exam_id, "seen", answer=record["answer"], user=user_id, state=place[1])
+    last_seen.note(record["answer"])
+    return record["answer"]
+
+
+def leave(exam_id, user_id):
+    """Remove a finished attempt from the counts."""
+    key = _record_key(exam_id, user_id)
+    record = cache.get(key)
+    if record is None:
+        return
+    cache.delete(key)
+    _decr(_bucket_key(exam_id, *record["place"]))
+    _decr(_members_key(exam_id))
+    cache.touch(_members_key(exam_id), RECORD_TIMEOUT)
+
+
+def counts(exam_id):
+    """Return the online, idle and disconnected attempts of an exam."""
+    current = int(time.time() // BUCKET_SECONDS)
+    oldest = int((time.time() - _disconnect_seconds()) // BUCKET_SECONDS)
+    keys = {
+        _bucket_key(exam_id, bucket, state): state
+        for bucket in range(oldest, current + 1) for state in STATES
+    }
+    values = cache.get_many([*keys, _members_key(exam_id)])
+    totals = dict.fromkeys(STATES, 0)
+    for key, state in keys.items():
+        totals[state] += max(values.get(key, 0), 0)
+    members = values.get(_members_key(exam_id), 0)
+    totals["disconnected"] = max(members - totals["online"] - totals["idle"], 0)
+    return totals
@@ -0,0 +1,173 @@
+"""
+Anti-cheating event ingestion.
+
+The exam page batches the events it sees (tab switches, blurs, copy
+attempts, fullscreen exits) and sends them as a beacon every few seconds.
+``record`` does not write them: each worker process buffers the events of
+all its requests and stores them with one ``bulk_create`` once
+``PROCTOR_EVENT_BATCH_SIZE`` events are waiting or the oldest has waited
+``PROCTOR_EVENT_FLUSH_SECONDS``. The same flush adds the new events to each
+attempt's ``ProctorSummary`` with one ``UPDATE`` per attempt, so summaries
+never need recounting.
+
+Events still buffered when a worker dies are lost; they are evidence for a
+proctor, not answers, and termination still goes through its own endpoint.
+"""
+import atexit
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import DatabaseError, connections
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from apps.core.db import write_with_retry
+from apps.core.metrics import registry
+from .models import ProctorEvent, ProctorSummary
+
+SUMMARY_FIELDS = {
+    "tab_switch": "tab_switches",
+    "blur": "blurs",
+    "copy": "copy_attempts",
+    "fullscreen_exit": "fullscreen_exits",
+}
+# A beacon carries a few seconds of events; anything longer is not the exam page.
+MAX_EVENTS_PER_BATCH = 100
+# Browser clocks are trusted this far into the past, no further.
+MAX_CLOCK_SKEW = timedelta(hours=6)
+
+PROCTOR_EVENTS = registry.counter(
+    "cbt_proctor_events_total", "Anti-cheating events received, by kind.", ["kind"]
+)
+
+
+def _clean(answer_id, raw, received_at):
+    if not isinstance(raw, dict) or raw.get("kind") not in SUMMARY_FIELDS:
+        return None
+    occurred_at = received_at
+    try:
+        occurred_at = datetime.fromtimestamp(float(raw["at"]) / 1000, tz=dt_timezone.utc)
+    except (KeyError, TypeError, ValueError, OverflowError, OSError):
+        pass
+    if not received_at - MAX_CLOCK_SKEW <= occurred_at <= received_at:
+        occurred_at = received_at
+    return ProctorEvent(
+        answer_id=answer_id,
+        kind=raw["kind"],
+        occurred_at=occurred_at,
+        received_at=received_at,
+        day=received_at.date(),
+        detail=str(raw.get("detail", ""))[:200],
+    )
+
+
+def store(events):
+    """Insert ``events`` and add them to their attempts' summaries, in the caller's transaction."""
+    if not events:
+        return
+    by_answer = defaultdict(list)
+    for event in events:
+        by_answer[event.answer_id].append(event)
+
+    ProctorEvent.objects.bulk_create(events)
+    ProctorSummary.objects.bulk_create(
+        [
+            ProctorSummary(
+                answer_id=answer_id,
+                first_event_at=min(event.occurred_at for event in batch),
+                last_event_at=max(event.occurred_at for event in batch),
+            )
+            for answer_id, batch in by_answer.items()
+        ],
+        ignore_conflicts=True,
+    )
+    for answer_id, batch in by_answer.items():
+        counts = Counter(SUMMARY_FIELDS[event.kind] for event in batch)
+        ProctorSummary.objects.filter(answer_id=answer_id).update(
+            total=F("total") + len(batch),
+            last_event_at=Greatest("last_event_at", max(event.occurred_at for event in batch)),
+            **{field: F(field) + count for field, count in counts.items()},
+        )
+
+
+class EventBuffer:
+    """Events waiting in this process to be stored in one batch."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+        self.events = []
+        self.oldest = None
+        self.timer = None
+
+    def add(self, events):
+        batch_size = getattr(settings, "PROCTOR_EVENT_BATCH_SIZE", 200)
+        wait = getattr(settings, "PROCTOR_EVENT_FLUSH_SECONDS", 2.0)
+        with self.lock:
+            if os.getpid() != self.pid:
+                # A forked worker must not store the parent's events again.
+                self.pid = os.getpid()
+                self.events = []
+                self.oldest = None
+                self.timer = None
+            self.events.extend(events)
+            if self.oldest is None:
+                self.oldest = time.monotonic()
+            due = len(self.events) >= batch_size or time.monotonic() - self.oldest >= wait
+            if not due and self.timer is None:
+                # Store a quiet period's events too, not only when more arrive.
+                self.timer = threading.Timer(wait, self._flush_later)
+                self.timer.daemon = True
+                self.timer.start()
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            events, self.events, self.oldest = self.events, [], None
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+        if events:
+            write_with_retry(store, events)
+        return len(events)
+
+    def _flush_later(self):
+        try:
+            self.flush()
+        finally:
+            # The timer's thread opened its own connection.
+            connections.close_all()
+
+
+buffer = EventBuffer()
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        buffer.flush()
+    except DatabaseError:
+        # The database went away before this process did; nothing to keep.
+        pass
+
+
+def record(answer_id, raw_events):
+    """Buffer the valid events of one beacon for ``answer_id``; return how many were accepted."""
+    if not isinstance(raw_events, list):
+        return 0
+    received_at = timezone.now()
+    events = [
+        event for event in (_clean(answer_id, raw, received_at) for raw in raw_events[:MAX_EVENTS_PER_BATCH])
+        if event is not None
+    ]
+    for event in events:
+        PROCTOR_EVENTS.inc(kind=event.kind)
+    if events:
+        buffer.add(events)
+    return len(events)
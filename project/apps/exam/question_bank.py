@@ -0,0 +1,61 @@
+"""
+Question bank pages.
+
+They are the only views that need django-filter, so they live apart from the
+other exam views.
+"""
+from django.contrib import messages
+from django.core.paginator import Paginator
+from django.shortcuts import get_object_or_404, redirect, render
+from django.views.generic import View
+from django_filters.views import FilterView
+
+from apps.core.views import StaffAndAdminMixin
+from .filters import QuestionFilter
+from .models import Exam, Question
+
+
+class QuestionBankListView(StaffAndAdminMixin, FilterView):
+    queryset = Question.objects.select_related("subject", "class_group", "author").prefetch_related(
+        "choice_set", "tags"
+    )
+    template_name = "exam/questionbank.html"
+    filterset_class = QuestionFilter
+    paginate_by = 50
+    context_object_name = "questions"
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if not self.request.user.is_superuser:
+            return queryset.filter(author=self.request.user)
+        return queryset
+
+
+class AddQuestionFromBankView(StaffAndAdminMixin, View):
+    """Page responsible for picking question from question bank to an exam."""
+    template_name = "exam/add_question_from_bank.html"
+    paginate_by = 50
+
+    def get(self, request, **kwargs):
+        exam = get_object_or_404(Exam, pk=kwargs["exam_id"])
+        existing_questions = exam.questions.values_list("id", flat=True)
+        questions = Question.objects.filter(subject=exam.subject).exclude(
+            id__in=existing_questions
+        ).select_related("subject", "class_group").prefetch_related('choice_set', 'tags')
+        question_filter = QuestionFilter(request.GET, queryset=questions)
+
+        paginator = Paginator(question_filter.qs, self.paginate_by)
+        page_obj = paginator.get_page(request.GET.get("page"))
+        context = {
+            "exam": exam,
+            "filter": question_filter,
+            "questions": page_obj
+        }
+        return render(request, self.template_name, context)
+
+    def post(self, request, **kwargs):
+        questions = request.POST.getlist("question[]")
+        exam = get_object_or_404(Exam, pk=kwargs["exam_id"])
+        exam.questions.add(*questions)
+        messages.success(request, "Questions successfully added.")
+        return redirect(exam)
@@ -0,0 +1,147 @@
+"""
+Scheduled opening and closing of exams.
+
+``run_exam_scheduler`` calls ``tick`` every few seconds. Each tick looks up
+the window edges it has reached through the ``opens_at`` and ``closes_at``
+indexes and handles every exam there once:
+
+- prewarm: an exam opening within ``EXAM_PREWARM_MINUTES`` gets its paper
+  and answer key cached before the class arrives;
+- open: at ``opens_at`` the class's cached lists are replaced so the exam
+  shows up, and warmed again, and one ``bulk_create`` adds an attempt for
+  every student of the class, so their first page loads only read;
+- close: at ``closes_at`` every attempt still in progress is finalized with
+  one ``UPDATE``, keeping the answers saved so far, and the exam leaves the
+  class's lists.
+
+A step claims its exam and edge before it runs, with a conditional
+``UPDATE`` that records the edge in the exam's ``prewarmed_for``,
+``opened_for`` or ``closed_for``. Only one scheduler's update matches the
+row, so a step runs once however many schedulers are running, and again
+when the window is moved. Closing runs with the answer journal applied and
+its replay held off (see ``journal.replayed``). A step that raises is
+logged, counted in ``cbt_scheduler_failures_total`` and released, so the
+other exams of the tick still run and the next tick tries it again. Edges
+passed more than ``EXAM_SCHEDULER_CATCH_UP_MINUTES`` ago, while no
+scheduler was running, are left alone: students then open their own
+attempts and time runs out on each page as before.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from apps.core.db import write_with_retry
+from apps.core.metrics import ANSWER_TRANSITIONS, registry
+from apps.core.models import User
+from . import feed, journal, presence, warmup
+from .caching import invalidate_class_lists
+from .models import Answer, Exam
+
+CLAIM_FIELDS = {"prewarm": "prewarmed_for", "open": "opened_for", "close": "closed_for"}
+
+SCHEDULER_FAILURES = registry.counter(
+    "cbt_scheduler_failures_total", "Scheduler steps that raised and are retried on the next tick.", ["step"]
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _claim(step, exam_id, edge):
+    field = CLAIM_FIELDS[step]
+    claimed = Exam.objects.filter(pk=exam_id).exclude(**{field: edge})
+    return write_with_retry(claimed.update, **{field: edge}) == 1
+
+
+def _release(step, exam_id, edge):
+    field = CLAIM_FIELDS[step]
+    write_with_retry(Exam.objects.filter(pk=exam_id, **{field: edge}).update, **{field: None})
+
+
+def _edges(step, field, after, until, **filters):
+    """``(exam id, class id, edge)`` of the exams whose ``field`` lies in ``(after, until]``.
+
+    Edges the step already ran for are left out, so an idle tick writes nothing.
+    """
+    return list(
+        Exam.objects.filter(**{f"{field}__gt": after, f"{field}__lte": until}, **filters)
+        .exclude(**{CLAIM_FIELDS[step]: F(field)})
+        .order_by(field).values_list("pk", "class_group_id", field)
+    )
+
+
+def _run(step, edges, action):
+    """Run ``action`` for every edge this scheduler claims; return the exam ids it ran for."""
+    done = []
+    for exam_id, class_id, edge in edges:
+        if not _claim(step, exam_id, edge):
+            continue
+        try:
+            action(exam_id, class_id, edge)
+        except Exception:
+            # One failing exam must not hold up the others; the next tick tries again.
+            logger.exception("Scheduler step %s failed for exam %s", step, exam_id)
+            SCHEDULER_FAILURES.inc(step=step)
+            _release(step, exam_id, edge)
+            continue
+        done.append(exam_id)
+    return done
+
+
+def open_attempts(exam_id, class_id):
+    """Add a not-started attempt for every active student of the class who has none."""
+    students = User.objects.filter(
+        student_class_id=class_id, is_active=True, is_staff=False,
+    ).exclude(pk__in=Answer.objects.filter(exam_id=exam_id).values("user_id")).values_list("pk", flat=True)
+    attempts = [Answer(exam_id=exam_id, user_id=user_id) for user_id in students]
+    # A student opening the exam right now may win the race for their row.
+    write_with_retry(Answer.objects.bulk_create, attempts, batch_size=500, ignore_conflicts=True)
+    return len(attempts)
+
+
+def finalize_attempts(exam_id, closed_at):
+    """Submit every attempt of the exam still in progress; return how many there were."""
+    in_progress = Answer.objects.filter(exam_id=exam_id, status="in_progress")
+    finishing = list(in_progress.values_list("pk", "user_id"))
+    # Attempts submitted in between are no longer in progress and keep their own submission.
+    count = write_with_retry(
+        in_progress.update, status="completed", is_complete=True, time_completed=closed_at,
+    )
+    if count:
+        ANSWER_TRANSITIONS.inc(count, transition="expire")
+    for answer_id, user_id in finishing:
+        presence.leave(exam_id, user_id)
+        feed.publish(exam_id, "expired", answer=answer_id, user=user_id, status="completed")
+    return count
+
+
+def tick(now=None, catch_up=None, lead=None):
+    """Handle the window edges reached by ``now``; return the exam ids of each step."""
+    now = now or timezone.now()
+    catch_up = catch_up or timedelta(minutes=getattr(settings, "EXAM_SCHEDULER_CATCH_UP_MINUTES", 60))
+    lead = lead or timedelta(minutes=getattr(settings, "EXAM_PREWARM_MINUTES", 10))
+
+    def prewarm(exam_id, class_id, opens_at):
+        warmup.warm_papers([exam_id])
+        warmup.warm_answer_keys([exam_id])
+
+    def open_exam(exam_id, class_id, opens_at):
+        # Already cached unless the exam opened within the prewarm lead of being scheduled.
+        prewarm(exam_id, class_id, opens_at)
+        open_attempts(exam_id, class_id)
+        invalidate_class_lists([class_id])
+        warmup.warm_dashboards([class_id])
+
+    def close_exam(exam_id, class_id, closes_at):
+        # Submissions and autosaves still in the journal were made before the close.
+        with journal.replayed():
+            finalize_attempts(exam_id, closes_at)
+        invalidate_class_lists([class_id])
+
+    return {
+        "prewarmed": _run("prewarm", _edges("prewarm", "opens_at", now, now + lead, published=True), prewarm),
+        "opened": _run("open", _edges("open", "opens_at", now - catch_up, now, published=True), open_exam),
+        "closed": _run("close", _edges("close", "closes_at", now - catch_up, now), close_exam),
+    }
@@ -0,0 +1,60 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+
+from .caching import invalidate_deadlines, invalidate_exams, invalidate_questions
+from .models import Choice, Exam, Question, TimeExtension
+
+
+@receiver(pre_save, sender=Exam)
+def remember_previous_scopes(sender, instance, **kwargs):
+    # An exam moved to another class or author must leave the old lists too.
+    instance._previous = None
+    if instance.pk:
+        instance._previous = Exam.objects.filter(pk=instance.pk).only("class_group", "author").first()
+
+
+@receiver(post_save, sender=Exam)
+def exam_saved(sender, instance, **kwargs):
+    previous = getattr(instance, "_previous", None)
+    invalidate_exams([instance, previous] if previous else [instance])
+
+
+@receiver(post_delete, sender=Exam)
+def exam_deleted(sender, instance, **kwargs):
+    invalidate_exams([instance])
+
+
+@receiver(m2m_changed, sender=Exam.questions.through)
+def exam_questions_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse and action == "pre_clear":
+        # Once cleared, the question no longer leads to its exams.
+        invalidate_exams(Exam.objects.filter(questions=instance).only("class_group", "author"))
+    elif action in ("post_add", "post_remove", "post_clear"):
+        if not reverse:
+            invalidate_exams([instance])
+        elif pk_set:
+            invalidate_exams(Exam.objects.filter(pk__in=pk_set).only("class_group", "author"))
+
+
+@receiver(pre_delete, sender=Question)
+def question_deleted(sender, instance, **kwargs):
+    invalidate_exams(Exam.objects.filter(questions=instance).only("class_group", "author"))
+    invalidate_questions([instance.pk])
+
+
+@receiver(post_save, sender=Question)
+def question_saved(sender, instance, created, **kwargs):
+    if not created:
+        invalidate_questions([instance.pk])
+
+
+@receiver(post_save, sender=Choice)
+@receiver(post_delete, sender=Choice)
+def choice_changed(sender, instance, **kwargs):
+    invalidate_questions([instance.question_id])
+
+
+@receiver(post_save, sender=TimeExtension)
+@receiver(post_delete, sender=TimeExtension)
+def time_extension_changed(sender, instance, **kwargs):
+    invalidate_deadlines([instance.exam_id])
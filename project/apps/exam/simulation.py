@@ -0,0 +1,222 @@
+"""
+Exam-day load simulation.
+
+Every simulated student walks the real exam flow over HTTP against a running
+server: log in, open the exam, start it, answer with a think time between
+questions (optionally autosaving), then submit or get terminated. Students
+run as asyncio tasks on a small stdlib HTTP/1.0 client, so one process can
+drive hundreds of them.
+"""
+import asyncio
+import random
+import re
+import time
+from collections import Counter, defaultdict
+from http.cookies import SimpleCookie
+from urllib.parse import urlencode, urlsplit
+
+from django.urls import reverse
+
+CHOICE_RE = re.compile(r'type="radio"\s+name="(\d+)"\s+value="(\d+)"')
+# Messages of SQLite, PostgreSQL and MySQL lock failures. They only reach the
+# response body when the server runs with DEBUG on; otherwise they count as 5xx.
+LOCK_MARKERS = (b"database is locked", b"deadlock detected", b"could not obtain lock", b"Lock wait timeout")
+
+
+class Response:
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+
+class SimulationError(Exception):
+    """Raised when a step of a simulated student does not get the expected response."""
+
+
+class HTTPClient:
+    """Minimal cookie-keeping HTTP client on asyncio streams, one connection per request."""
+
+    def __init__(self, base_url, timeout=30):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or (443 if parts.scheme == "https" else 80)
+        self.ssl = parts.scheme == "https"
+        self.timeout = timeout
+        self.cookies = {}
+
+    async def request(self, method, path, data=None, headers=None):
+        return await asyncio.wait_for(self._request(method, path, data, headers), self.timeout)
+
+    async def _request(self, method, path, data, headers):
+        body = urlencode(data or {}).encode()
+        lines = [f"{method} {path} HTTP/1.0", f"Host: {self.host}:{self.port}"]
+        if self.cookies:
+            lines.append("Cookie: " + "; ".join(f"{k}={v}" for k, v in self.cookies.items()))
+        if method == "POST":
+            lines.append("Content-Type: application/x-www-form-urlencoded")
+            lines.append(f"Content-Length: {len(body)}")
+        lines.extend(f"{k}: {v}" for k, v in (headers or {}).items())
+
+        reader, writer = await asyncio.open_connection(self.host, self.port, ssl=self.ssl or None)
+        try:
+            writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + body)
+            await writer.drain()
+            raw = await reader.read()
+        finally:
+            writer.close()
+
+        head, _, content = raw.partition(b"\r\n\r\n")
+        status_line, *header_lines = head.decode("latin-1").split("\r\n")
+        response_headers = defaultdict(list)
+        for line in header_lines:
+            name, _, value = line.partition(":")
+            response_headers[name.strip().lower()].append(value.strip())
+        for cookie in response_headers.get("set-cookie", []):
+            for morsel in SimpleCookie(cookie).values():
+                self.cookies[morsel.key] = morsel.value
+        return Response(int(status_line.split()[1]), response_headers, content)
+
+    def csrf_token(self):
+        return self.cookies.get("csrftoken", "")
+
+
+class SimulationStats:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = Counter()
+        self.errors = Counter()
+        self.outcomes = Counter()
+        self.requests = 0
+
+    def record(self, step, started, response):
+        self.requests += 1
+        self.latencies[step].append(time.perf_counter() - started)
+        self.statuses[response.status] += 1
+        if response.status >= 500 and any(marker in response.body for marker in LOCK_MARKERS):
+            self.errors["db_lock"] += 1
+
+    def error_count(self):
+        return sum(self.errors.values())
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of ``values``."""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class SimulatedStudent:
+    def __init__(self, client, stats, exam_id, username, password, options, rng):
+        self.client = client
+        self.stats = stats
+        self.exam_id = exam_id
+        self.username = username
+        self.password = password
+        self.options = options
+        self.rng = rng
+
+    async def step(self, name, method, path, data=None, expect=(200,)):
+        if data is not None:
+            data = {"csrfmiddlewaretoken": self.client.csrf_token(), **data}
+        started = time.perf_counter()
+        response = await self.client.request(method, path, data)
+        self.stats.record(name, started, response)
+        if response.status not in expect:
+            raise SimulationError(f"{name}: HTTP {response.status}")
+        return response
+
+    async def think(self):
+        mean = self.options["think_time"]
+        if mean > 0:
+            await asyncio.sleep(self.rng.uniform(0.5 * mean, 1.5 * mean))
+
+    async def login(self):
+        login_url = reverse("login")
+        await self.step("login_page", "GET", login_url)
+        for _ in range(self.options["login_retries"] + 1):
+            response = await self.step(
+                "login", "POST", login_url,
+                {"username": self.username, "password": self.password},
+                expect=(302, 503),
+            )
+            if response.status == 302:
+                return
+            # The login queue is full: wait as told, like a browser retry would.
+            self.stats.errors["login_queue_full"] += 1
+            await asyncio.sleep(float((response.headers.get("retry-after") or ["1"])[0]))
+        raise SimulationError("login: queue stayed full")
+
+    async def start(self, take_url):
+        while True:
+            response = await self.step("start", "POST", take_url, {"start_exam": "true"}, expect=(302, 503))
+            if response.status == 302:
+                return
+            # The waiting room keeps a slot; come back when it is due, like the page does.
+            self.stats.errors["start_waiting_room"] += 1
+            await asyncio.sleep(float((response.headers.get("retry-after") or ["1"])[0]))
+
+    async def run(self):
+        take_url = reverse("take", args=(self.exam_id,))
+        await self.login()
+        await self.step("open", "GET", take_url)
+        await self.start(take_url)
+        page = await self.step("take", "GET", take_url)
+
+        questions = defaultdict(list)
+        for question_id, choice_id in CHOICE_RE.findall(page.body.decode()):
+            questions[question_id].append(choice_id)
+
+        answers = {}
+        autosave_every = self.options["autosave_every"]
+        for number, (question_id, choice_ids) in enumerate(questions.items(), start=1):
+            await self.think()
+            answers[question_id] = self.rng.choice(choice_ids)
+            if autosave_every and number % autosave_every == 0:
+                await self.step("autosave", "POST", reverse("autosave", args=(self.exam_id,)), answers)
+
+        if self.rng.random() < self.options["terminate_rate"]:
+            await self.step(
+                "terminate", "POST", reverse("terminate-exam", args=(self.exam_id,)),
+                {"reason": "Simulated violation"},
+            )
+            return "terminated"
+        await self.step("submit", "POST", take_url, {"submit_exam": "true", **answers}, expect=(302,))
+        return "submitted"
+
+
+async def _run_student(student, stats, delay):
+    await asyncio.sleep(delay)
+    try:
+        outcome = await student.run()
+    except SimulationError as e:
+        stats.errors[str(e).split(":")[0] + "_failed"] += 1
+        outcome = "failed"
+    except asyncio.TimeoutError:
+        stats.errors["timeout"] += 1
+        outcome = "failed"
+    except OSError:
+        stats.errors["connection"] += 1
+        outcome = "failed"
+    stats.outcomes[outcome] += 1
+
+
+async def simulate(base_url, exam_id, credentials, options, seed=None):
+    """Run one simulated student per ``(username, password)`` and return the stats.
+
+    Students start spread evenly over ``options["ramp_up"]`` seconds.
+    """
+    stats = SimulationStats()
+    rng = random.Random(seed)
+    count = len(credentials)
+    tasks = []
+    for i, (username, password) in enumerate(credentials):
+        student = SimulatedStudent(
+            HTTPClient(base_url, timeout=options["timeout"]), stats, exam_id,
+            username, password, options, random.Random(rng.random()),
+        )
+        delay = options["ramp_up"] * i / count if count else 0
+        tasks.append(_run_student(student, stats, delay))
+    await asyncio.gather(*tasks)
+    return stats
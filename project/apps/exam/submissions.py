@@ -0,0 +1,63 @@
+"""
+Idempotent exam submissions.
+
+Every render of the exam page puts a fresh submission key in its form. The
+first submit carrying a key inserts it as a ``SubmissionKey`` row, then
+grades and records the submission and stores where it sent the student on
+that row. The unique constraint on the row makes the insert the claim: a
+double click or a browser retry with the same key fails it and gets the
+stored outcome back from one read, without loading the exam or grading
+again. A duplicate that arrives while the first request is still grading
+does not wait; it is told the submission is being recorded and sent to the
+score page. If the first request fails its row is deleted, so a retry goes
+ahead, and the attempt's status stops it from being graded twice.
+"""
+import secrets
+
+from django.contrib import messages
+from django.db import IntegrityError
+from django.urls import reverse
+
+from apps.core.db import write_with_retry
+
+from .models import SubmissionKey
+
+
+def new_key():
+    return secrets.token_urlsafe(16)
+
+
+def pending(exam_id, user_id):
+    """The outcome of a duplicate whose first submission is still being graded."""
+    url = reverse("score-detail", args=(exam_id, user_id))
+    return {"level": messages.INFO, "message": "Your submission is being recorded.", "url": url}
+
+
+def claim(exam_id, user_id, key):
+    """Claim ``key`` for this request; return None to go ahead, or the first submission's outcome."""
+    if not key:
+        return None
+    try:
+        write_with_retry(SubmissionKey.objects.create, exam_id=exam_id, user_id=user_id, key=key[:64])
+        return None
+    except IntegrityError:
+        pass
+    outcome = (
+        SubmissionKey.objects.filter(exam_id=exam_id, user_id=user_id, key=key[:64])
+        .values_list("outcome", flat=True).first()
+    )
+    return outcome or pending(exam_id, user_id)
+
+
+def record(exam_id, user_id, key, outcome):
+    """Keep the outcome of the submission made with ``key`` for its duplicates."""
+    if key:
+        write_with_retry(
+            SubmissionKey.objects.filter(exam_id=exam_id, user_id=user_id, key=key[:64]).update, outcome=outcome
+        )
+
+
+def release(exam_id, user_id, key):
+    """Give up a claim whose submission failed, so a retry can submit."""
+    if key:
+        write_with_retry(SubmissionKey.objects.filter(exam_id=exam_id, user_id=user_id, key=key[:64]).delete)
@@ -1,3 +1,1206 @@
-from django.test import TestCase
+"""
+Tests for exam assembly and the question bank
+"""
 
-# Create your tests here.
+import asyncio
+import json
+import random
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.test import Client, LiveServerTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.core.cache import get_version, versioned_key
+from apps.core.models import AcademicSession, AcademicTerm, StudentClass, Subject
+from . import admission, deadlines, feed, journal, papers, presence, proctoring, scheduler
+from .caching import class_scope, exam_scope, invalidate_deadlines
+from .blueprint import BlueprintError, BlueprintSection, assemble_exam, even_sections, split_evenly
+from .models import Answer, Choice, Exam, ProctorEvent, ProctorSummary, Question, SubmissionKey, Tag, TimeExtension
+
+User = get_user_model()
+
+
+class BlueprintTestCase(TestCase):
+    def setUp(self):
+        """Set up a bank of questions and an empty exam"""
+        self.teacher = User.objects.create_user(
+            username='teacher', password='teacherpass123', is_staff=True
+        )
+        self.subject = Subject.objects.create(name='Mathematics')
+        self.student_class = StudentClass.objects.create(name='Grade 10')
+        self.other_class = StudentClass.objects.create(name='Grade 11')
+        self.session = AcademicSession.objects.create(name='2024/2025')
+        self.first_term = AcademicTerm.objects.create(name='First Term')
+        self.second_term = AcademicTerm.objects.create(name='Second Term')
+
+        Question.objects.bulk_create([
+            Question(subject=self.subject, class_group=self.student_class, question=f'Q{i}')
+            for i in range(30)
+        ] + [
+            Question(subject=self.subject, class_group=self.other_class, question=f'Other Q{i}')
+            for i in range(10)
+        ])
+        self.exam = self.create_exam('Second Term Exam', self.second_term)
+
+    def create_exam(self, title, term):
+        return Exam.objects.create(
+            title=title,
+            class_group=self.student_class,
+            session=self.session,
+            term=term,
+            subject=self.subject,
+            exam_type='exam',
+            duration=30,
+            author=self.teacher,
+            description='Blueprint test exam',
+        )
+
+    def section(self, count):
+        return BlueprintSection(count, subject=self.subject, class_group=self.student_class)
+
+    def test_split_evenly(self):
+        """Test that totals are spread across strata as evenly as possible"""
+        self.assertEqual(split_evenly(40, 4), [10, 10, 10, 10])
+        self.assertEqual(split_evenly(10, 3), [4, 3, 3])
+        self.assertEqual(split_evenly(5, 0), [])
+
+    def test_even_sections(self):
+        """Test that a blueprint without topics is one section and topics share the total evenly"""
+        [whole] = even_sections(10, subject=self.subject, class_group=self.student_class)
+        self.assertEqual((whole.count, whole.tags), (10, []))
+
+        topics = [Tag.objects.create(name=name) for name in ('Algebra', 'Geometry', 'Statistics', 'Calculus')]
+        sections = even_sections(3, subject=self.subject, topics=topics)
+        self.assertEqual([(section.label, section.count) for section in sections],
+                         [('Algebra', 1), ('Geometry', 1), ('Statistics', 1)])
+
+    def test_assemble_fills_exam_from_matching_questions(self):
+        """Test that the requested number of distinct, matching questions is added"""
+        added = assemble_exam(self.exam, [self.section(12)], rng=random.Random(1))
+
+        self.assertEqual(len(added), 12)
+        self.assertEqual(len(set(added)), 12)
+        self.assertEqual(self.exam.questions.count(), 12)
+        self.assertFalse(self.exam.questions.exclude(class_group=self.student_class).exists())
+
+    def test_assemble_skips_existing_and_replaces_on_request(self):
+        """Test that existing questions are kept out of the sample unless replaced"""
+        first = assemble_exam(self.exam, [self.section(20)])
+        second = assemble_exam(self.exam, [self.section(10)])
+        self.assertFalse(set(first) & set(second))
+        self.assertEqual(self.exam.questions.count(), 30)
+
+        assemble_exam(self.exam, [self.section(5)], replace=True)
+        self.assertEqual(self.exam.questions.count(), 5)
+
+    def test_assemble_excludes_recent_terms(self):
+        """Test that questions used in recent terms are not drawn again"""
+        previous = self.create_exam('First Term Exam', self.first_term)
+        used = assemble_exam(previous, [self.section(25)])
+
+        added = assemble_exam(self.exam, [self.section(5)], recent_terms=1)
+        self.assertFalse(set(used) & set(added))
+
+        with self.assertRaises(BlueprintError):
+            assemble_exam(self.exam, [self.section(1)], recent_terms=1)
+
+    def test_assemble_reports_shortfall(self):
+        """Test that an unsatisfiable blueprint adds nothing"""
+        with self.assertRaises(BlueprintError):
+            assemble_exam(self.exam, [self.section(31)])
+        self.assertEqual(self.exam.questions.count(), 0)
+
+    def test_blueprint_view(self):
+        """Test assembling an exam through the blueprint page"""
+        client = Client()
+        client.login(username='teacher', password='teacherpass123')
+        url = reverse('exam-assemble', args=[self.exam.id])
+
+        self.assertEqual(client.get(url).status_code, 200)
+        response = client.post(url, {
+            'subject': self.subject.id,
+            'class_group': self.student_class.id,
+            'number_of_questions': 10,
+            'recent_terms': 0,
+        })
+        self.assertRedirects(response, self.exam.get_absolute_url())
+        self.assertEqual(self.exam.questions.count(), 10)
+
+
+class QuestionTagTestCase(TestCase):
+    def setUp(self):
+        """Set up tagged questions"""
+        self.teacher = User.objects.create_user(
+            username='teacher', password='teacherpass123', is_staff=True
+        )
+        self.subject = Subject.objects.create(name='Mathematics')
+        self.student_class = StudentClass.objects.create(name='Grade 10')
+        self.algebra = Tag.objects.create(name='algebra')
+        self.fractions = Tag.objects.create(name='fractions')
+
+        def question(text, *tags):
+            q = Question.objects.create(
+                subject=self.subject, class_group=self.student_class, question=text, author=self.teacher
+            )
+            q.tags.set(tags)
+            return q
+
+        self.both = question('Both', self.algebra, self.fractions)
+        self.only_algebra = question('Algebra only', self.algebra)
+        self.only_fractions = question('Fractions only', self.fractions)
+        self.untagged = question('Untagged')
+
+        self.client = Client()
+        self.client.login(username='teacher', password='teacherpass123')
+
+    def test_tagged_any_and_all(self):
+        """Test OR and AND tag queries"""
+        tags = [self.algebra, self.fractions]
+        self.assertEqual(
+            set(Question.objects.tagged(tags)),
+            {self.both, self.only_algebra, self.only_fractions},
+        )
+        self.assertEqual(set(Question.objects.tagged(tags, match_all=True)), {self.both})
+        self.assertEqual(Question.objects.tagged([]).count(), 4)
+
+    def test_tagged_is_a_single_query(self):
+        """Test that tag-set filtering runs as one statement"""
+        with self.assertNumQueries(1):
+            list(Question.objects.tagged([self.algebra, self.fractions], match_all=True))
+
+    def test_question_bank_tag_filter(self):
+        """Test filtering the question bank by tags"""
+        response = self.client.get(reverse('questionbank'), {
+            'tags': [self.algebra.id, self.fractions.id],
+            'tag_mode': 'all',
+        })
+        self.assertEqual(list(response.context['questions']), [self.both])
+
+    def test_bank_picker_tag_filter(self):
+        """Test filtering the bank picker by tags"""
+        exam = Exam.objects.create(
+            title='Tagged Exam',
+            class_group=self.student_class,
+            session=AcademicSession.objects.create(name='2024/2025'),
+            term=AcademicTerm.objects.create(name='First Term'),
+            subject=self.subject,
+            exam_type='exam',
+            duration=30,
+            author=self.teacher,
+            description='Tag test exam',
+        )
+        exam.questions.add(self.only_algebra)
+        response = self.client.get(
+            reverse('add-question-from-bank', args=[exam.id]), {'tags': [self.algebra.id]}
+        )
+        self.assertEqual(list(response.context['questions']), [self.both])
+
+    def test_blueprint_per_topic(self):
+        """Test that topic sections each get their share of the questions"""
+        sections = [
+            BlueprintSection(1, subject=self.subject, tags=[self.algebra], label='algebra'),
+            BlueprintSection(1, subject=self.subject, tags=[self.fractions], label='fractions'),
+        ]
+        exam = Exam.objects.create(
+            title='Topic Exam',
+            class_group=self.student_class,
+            session=AcademicSession.objects.create(name='2024/2025'),
+            term=AcademicTerm.objects.create(name='First Term'),
+            subject=self.subject,
+            exam_type='exam',
+            duration=30,
+            author=self.teacher,
+            description='Topic test exam',
+        )
+        assemble_exam(exam, sections)
+        self.assertEqual(exam.questions.count(), 2)
+        self.assertGreaterEqual(exam.questions.tagged([self.algebra]).count(), 1)
+        self.assertGreaterEqual(exam.questions.tagged([self.fractions]).count(), 1)
+        self.assertFalse(exam.questions.filter(pk=self.untagged.pk).exists())
+
+    def test_question_create_with_new_tags(self):
+        """Test that new tags typed on the question form are created and attached"""
+        response = self.client.post(reverse('question-create'), {
+            'subject': self.subject.id,
+            'class_group': self.student_class.id,
+            'question': 'What is 1/2 + 1/4?',
+            'tags': [self.fractions.id],
+            'new_tags': 'addition, Fractions basics',
+            'form-TOTAL_FORMS': '0',
+            'form-INITIAL_FORMS': '0',
+            'form-MIN_NUM_FORMS': '0',
+            'form-MAX_NUM_FORMS': '5',
+        })
+        self.assertRedirects(response, reverse('questionbank'))
+        question = Question.objects.get(question='What is 1/2 + 1/4?')
+        self.assertEqual(
+            set(question.tags.values_list('name', flat=True)),
+            {'fractions', 'addition', 'Fractions basics'},
+        )
+
+
+class ExamListCacheTestCase(TestCase):
+    def setUp(self):
+        """Set up a class with a published exam and a student"""
+        cache.clear()
+        self.teacher = User.objects.create_user(
+            username='teacher', password='teacherpass123', is_staff=True
+        )
+        self.subject = Subject.objects.create(name='Mathematics')
+        self.student_class = StudentClass.objects.create(name='Grade 10')
+        self.session = AcademicSession.objects.create(name='2024/2025')
+        self.term = AcademicTerm.objects.create(name='First Term')
+        self.student = User.objects.create_user(
+            username='student', password='studentpass123', student_class=self.student_class
+        )
+        self.exam = self.create_exam('Cached Exam')
+        self.question = Question.objects.create(
+            subject=self.subject, class_group=self.student_class, question='Q1'
+        )
+
+        self.client = Client()
+        self.client.login(username='student', password='studentpass123')
+
+    def create_exam(self, title):
+        return Exam.objects.create(
+            title=title,
+            class_group=self.student_class,
+            session=self.session,
+            term=self.term,
+            subject=self.subject,
+            exam_type='exam',
+            duration=30,
+            author=self.teacher,
+            description='Cache test exam',
+        )
+
+    def test_student_dashboard_is_cached(self):
+        """Test that a warm dashboard only runs the session and user queries"""
+        self.client.get(reverse('dashboard'))
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('dashboard'))
+        self.assertEqual(list(response.context['exams']), [self.exam])
+
+        self.client.get(reverse('myexams'))
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('myexams'))
+        self.assertEqual(response.context['exams'], [self.exam])
+
+    def test_exam_changes_invalidate_class_lists(self):
+        """Test that saving, deleting and adding questions refresh the cached lists"""
+        self.client.get(reverse('dashboard'))
+        self.client.get(reverse('myexams'))
+
+        new_exam = self.create_exam('New Exam')
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(set(response.context['exams']), {self.exam, new_exam})
+
+        new_exam.questions.add(self.question)
+        response = self.client.get(reverse('myexams'))
+        counts = {exam.pk: exam.question_count for exam in response.context['exams']}
+        self.assertEqual(counts[new_exam.pk], 1)
+
+        self.question.delete()
+        response = self.client.get(reverse('myexams'))
+        counts = {exam.pk: exam.question_count for exam in response.context['exams']}
+        self.assertEqual(counts[new_exam.pk], 0)
+
+        new_exam.delete()
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(list(response.context['exams']), [self.exam])
+
+    def test_staff_dashboard_per_author(self):
+        """Test that staff pages are cached per author and invalidated by their exams"""
+        client = Client()
+        client.login(username='teacher', password='teacherpass123')
+        response = client.get(reverse('dashboard'))
+        self.assertEqual(response.context['exams'].paginator.count, 1)
+
+        self.exam.published = False
+        self.exam.save()
+        response = client.get(reverse('dashboard'))
+        self.assertFalse(response.context['exams'][0].published)
+
+    def test_page_numbers_share_cached_pages(self):
+        """Test that any page query string maps onto the pages that exist"""
+        self.client.get(reverse('dashboard'))
+        for page in ('1', 'abc', '-3', '999999'):
+            with self.assertNumQueries(2):
+                response = self.client.get(reverse('dashboard'), {'page': page})
+            self.assertEqual(response.context['exams'].number, 1)
+
+    def test_choice_changes_bump_the_exam_scope(self):
+        """Test that editing a choice replaces the version of the exams using its question, and attempts do not"""
+        self.exam.questions.add(self.question)
+        exam_version = get_version(exam_scope(self.exam.pk))
+        Choice.objects.create(question=self.question, body='4', is_correct=True)
+        self.assertNotEqual(get_version(exam_scope(self.exam.pk)), exam_version)
+
+        with mock.patch('apps.exam.caching.bump_versions') as bump:
+            Answer.objects.create(exam=self.exam, user=self.student)
+        bump.assert_not_called()
+
+class HotQueryIndexTestCase(TestCase):
+    def setUp(self):
+        """Set up one exam and one student"""
+        self.teacher = User.objects.create_user(username='teacher', password='pass', is_staff=True)
+        self.student = User.objects.create_user(username='student', password='pass')
+        self.exam = Exam.objects.create(
+            title='Algebra', class_group=StudentClass.objects.create(name='Grade 10'),
+            session=AcademicSession.objects.create(name='2024/2025'),
+            term=AcademicTerm.objects.create(name='First Term'),
+            subject=Subject.objects.create(name='Mathematics'),
+            exam_type='exam', duration=30, author=self.teacher,
+        )
+
+    def test_one_answer_per_exam_and_user(self):
+        """Test that a second attempt row for the same exam and user is rejected"""
+        Answer.objects.create(exam=self.exam, user=self.student)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Answer.objects.create(exam=self.exam, user=self.student)
+
+    def test_query_plans_use_indexes(self):
+        """Test that the hot querysets avoid full scans and the seed data is rolled back"""
+        out = StringIO()
+        call_command('check_query_plans', students=300, exams=30, questions=500, stdout=out)
+        self.assertIn('Every hot query uses an index.', out.getvalue())
+        self.assertEqual(Exam.objects.count(), 1)
+        self.assertEqual(User.objects.count(), 2)
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class ExamDaySimulationTestCase(LiveServerTestCase):
+    def setUp(self):
+        """Set up an exam with a few questions"""
+        teacher = User.objects.create_user(username='teacher', password='pass', is_staff=True)
+        subject = Subject.objects.create(name='Mathematics')
+        student_class = StudentClass.objects.create(name='Grade 10')
+        self.exam = Exam.objects.create(
+            title='Algebra', class_group=student_class,
+            session=AcademicSession.objects.create(name='2024/2025'),
+            term=AcademicTerm.objects.create(name='First Term'),
+            subject=subject, exam_type='exam', duration=30, author=teacher,
+        )
+        for i in range(3):
+            question = Question.objects.create(subject=subject, class_group=student_class, question=f'Q{i}')
+            Choice.objects.create(question=question, body='Right', is_correct=True)
+            Choice.objects.create(question=question, body='Wrong')
+            self.exam.questions.add(question)
+
+    def test_students_take_and_submit_the_exam(self):
+        """Test that every simulated student logs in, autosaves and submits over HTTP"""
+        out = StringIO()
+        call_command(
+            'simulate_exam_day', self.exam.pk, students=2, url=self.live_server_url,
+            think_time=0, ramp_up=0.5, autosave_every=1, seed=1, stdout=out,
+        )
+        self.assertIn('Every student finished the exam.', out.getvalue())
+        answers = Answer.objects.filter(exam=self.exam)
+        self.assertEqual([answer.status for answer in answers], ['completed', 'completed'])
+        self.assertTrue(all(len(answer.choices) == 3 for answer in answers))
+
+
+class AnswerJournalTestCase(TestCase):
+    def setUp(self):
+        """Set up an exam in progress and a journal directory"""
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.journal_dir = Path(directory.name)
+        settings_override = override_settings(ANSWER_JOURNAL_DIR=directory.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        teacher = User.objects.create_user(username='teacher', password='pass', is_staff=True)
+        self.student = User.objects.create_user(username='student', password='pass')
+        subject = Subject.objects.create(name='Mathematics')
+        student_class = StudentClass.objects.create(name='Grade 10')
+        self.exam = Exam.objects.create(
+            title='Algebra', class_group=student_class,
+            session=AcademicSession.objects.create(name='2024/2025'),
+            term=AcademicTerm.objects.create(name='First Term'),
+            subject=subject, exam_type='exam', duration=30, author=teacher,
+        )
+        self.questions = []
+        for i in range(2):
+            question = Question.objects.create(subject=subject, class_group=student_class, question=f'Q{i}')
+            self.right = Choice.objects.create(question=question, body='Right', is_correct=True)
+            Choice.objects.create(question=question, body='Wrong')
+            self.exam.questions.add(question)
+            self.questions.append(question)
+        self.answer = Answer.objects.create(exam=self.exam, user=self.student)
+        self.answer.start()
+        self.client.force_login(self.student)
+        self.take_url = reverse('take', args=(self.exam.pk,))
+
+    def submit(self):
+        question = self.questions[-1]
+        return self.client.post(self.take_url, {'submit_exam': 'true', str(question.pk): str(self.right.pk)})
+
+    def test_submission_waits_in_journal_until_replayed(self):
+        """Test that a submission is journaled, not written, until the replay applies it"""
+        self.submit()
+        self.answer.refresh_from_db()
+        self.assertEqual(self.answer.status, 'in_progress')
+        self.assertTrue(journal.submission_pending(self.answer))
+        response = self.client.get(self.take_url)
+        self.assertRedirects(
+            response, reverse('score-detail', args=(self.exam.pk, self.student.pk)),
+            fetch_redirect_response=False,
+        )
+
+        self.assertEqual(journal.replay(self.journal_dir, prune=False), (1, 1))
+        self.answer.refresh_from_db()
+        self.assertEqual(self.answer.status, 'completed')
+        self.assertEqual(self.answer.score, 1)
+        self.assertIsNotNone(self.answer.time_completed)
+
+    def test_replay_is_idempotent(self):
+        """Test that replaying entries again after a lost checkpoint changes nothing"""
+        self.client.post(reverse('autosave', args=(self.exam.pk,)), {str(self.questions[0].pk): str(self.questions[0].choice_set.first().pk)})
+        self.submit()
+        journal.replay(self.journal_dir, prune=False)
+        self.answer.refresh_from_db()
+        applied = (self.answer.choices, self.answer.time_completed)
+
+        for segment in self.journal_dir.glob('*.jsonl'):
+            journal.write_checkpoint(segment, 0)
+        self.assertEqual(journal.replay(self.journal_dir, prune=False), (2, 0))
+        self.answer.refresh_from_db()
+        self.assertEqual((self.answer.choices, self.answer.time_completed), applied)
+
+    def test_torn_line_is_left_for_later(self):
+        """Test that a partly written entry is skipped until its line is complete"""
+        self.submit()
+        segment = next(self.journal_dir.glob('*.jsonl'))
+        with open(segment, 'ab') as f:
+            f.write(b'{"answer": 1, "kind": "sub')
+
+        self.assertEqual(journal.replay(self.journal_dir, prune=False), (1, 1))
+        self.assertLess(journal.read_checkpoint(segment), segment.stat().st_size)
+
+    def test_autosave_merges_in_order(self):
+        """Test that later autosaves of the same question win on replay"""
+        question = self.questions[0]
+        first, second = question.choice_set.all()
+        autosave_url = reverse('autosave', args=(self.exam.pk,))
+        self.client.post(autosave_url, {str(question.pk): str(first.pk)})
+        self.client.post(autosave_url, {str(question.pk): str(second.pk)})
+
+        journal.replay(self.journal_dir, prune=False)
+        self.answer.refresh_from_db()
+        self.assertEqual(self.answer.choices[str(question.pk)][0], str(second.pk))
+        self.assertEqual(self.answer.status, 'in_progress')
+
+    def test_expiry_keeps_journaled_autosaves(self):
+        """Test that expiring an attempt applies its autosaves still in the journal first"""
+        question = self.questions[0]
+        right = question.choice_set.get(is_correct=True)
+        self.client.post(reverse('autosave', args=(self.exam.pk,)), {str(question.pk): str(right.pk)})
+        Answer.objects.filter(pk=self.answer.pk).update(time_started=timezone.now() - timedelta(minutes=31))
+        invalidate_deadlines([self.exam.pk])
+
+        self.client.get(self.take_url)
+        self.answer.refresh_from_db()
+        self.assertEqual(self.answer.status, 'completed')
+        self.assertEqual(self.answer.choices[str(question.pk)][0], str(right.pk))
+        # The replay still reads the entry and leaves the finished attempt as it is.
+        self.assertEqual(journal.replay(self.journal_dir), (1, 0))
+        self.answer.refresh_from_db()
+        self.assertEqual(self.answer.status, 'completed')
+
+    def test_termination_keeps_journaled_autosaves(self):
+        """Test that terminating an attempt keeps the autosaves still in the journal"""
+        question = self.questions[0]
+        self.client.post(
+            reverse('autosave', args=(self.exam.pk,)), {str(question.pk): str(question.choice_set.first().pk)}
+        )
+        self.client.post(self.take_url, {'terminate_exam': 'true', 'termination_reason': 'Tab switch'})
+        self.answer.refresh_from_db()
+        self.assertEqual(self.answer.status, 'terminated')
+        self.assertIn(str(question.pk), self.answer.choices)
+
+    def test_termination_after_a_journaled_submission_is_refused(self):
+        """Test that terminating an attempt whose submission is still in the journal keeps the submission"""
+        self.submit()
+        response = self.client.post(self.take_url, {'terminate_exam': 'true', 'termination_reason': 'Tab switch'})
+        self.assertRedirects(
+            response, reverse('score-detail', args=(self.exam.pk, self.student.pk)),
+            fetch_redirect_response=False,
+        )
+        self.assertEqual(
+            [str(message) for message in response.wsgi_request._messages][-1], 'Exam already completed or terminated.'
+        )
+        self.answer.refresh_from_db()
+        self.assertEqual(self.answer.status, 'completed')
+
+    def test_termination_applies_only_its_own_entries(self):
+        """Test that finalizing an attempt applies its entries alone, without the replay lock or checkpoints"""
+        other = User.objects.create_user(username='other', password='pass')
+        other_answer = Answer.objects.create(exam=self.exam, user=other)
+        other_answer.start()
+        question = self.questions[0]
+        choice = str(question.choice_set.first().pk)
+        autosave_url = reverse('autosave', args=(self.exam.pk,))
+        self.client.post(autosave_url, {str(question.pk): choice})
+        self.client.force_login(other)
+        self.client.post(autosave_url, {str(question.pk): choice})
+        self.client.force_login(self.student)
+
+        with mock.patch.object(journal, 'file_lock') as lock:
+            self.client.post(self.take_url, {'terminate_exam': 'true', 'termination_reason': 'Tab switch'})
+        lock.assert_not_called()
+        self.answer.refresh_from_db()
+        other_answer.refresh_from_db()
+        self.assertIn(str(question.pk), self.answer.choices)
+        self.assertEqual(other_answer.choices, {})
+        self.assertTrue(all(journal.read_checkpoint(segment) == 0 for segment in self.journal_dir.glob('*.jsonl')))
+
+    def test_replay_leaves_finalized_attempts_alone(self):
+        """Test that entries read before an attempt was finalized do not reopen it"""
+        self.submit()
+        entries = [entry for *_, entry in journal._read_new_entries(next(self.journal_dir.glob('*.jsonl')), 1024)[0]]
+        self.answer.terminate('Tab switch')
+
+        with mock.patch.object(Answer.objects, 'select_for_update') as select:
+            stale = Answer.objects.get(pk=self.answer.pk)
+            stale.status = 'in_progress'
+            select.return_value.in_bulk.return_value = {stale.pk: stale}
+            self.assertEqual(journal.apply_entries(entries), 0)
+        self.answer.refresh_from_db()
+        self.assertEqual(self.answer.status, 'terminated')
+
+    def test_autosave_after_deadline_is_refused(self):
+        """Test that an autosave arriving after the attempt's deadline is not journaled"""
+        Answer.objects.filter(pk=self.answer.pk).update(time_started=timezone.now() - timedelta(minutes=31))
+        question = self.questions[0]
+        response = self.client.post(
+            reverse('autosave', args=(self.exam.pk,)), {str(question.pk): str(self.right.pk)}
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(list(self.journal_dir.glob('*.jsonl')), [])
+
+
+class ExamWarmUpTestCase(TestCase):
+    def setUp(self):
+        """Set up an exam with two questions for a class"""
+        cache.clear()
+        teacher = User.objects.create_user(username='teacher', password='pass', is_staff=True)
+        subject = Subject.objects.create(name='Mathematics')
+        self.student_class = StudentClass.objects.create(name='Grade 10')
+        self.exam = Exam.objects.create(
+            title='Algebra', class_group=self.student_class,
+            session=AcademicSession.objects.create(name='2024/2025'),
+            term=AcademicTerm.objects.create(name='First Term'),
+            subject=subject, exam_type='exam', duration=30, author=teacher,
+        )
+        for i in range(2):
+            question = Question.objects.create(subject=subject, class_group=self.student_class, question=f'Q{i}')
+            Choice.objects.create(question=question, body='Right', is_correct=True)
+            Choice.objects.create(question=question, body='Wrong')
+            self.exam.questions.add(question)
+
+    def test_warm_exam_fills_shared_caches(self):
+        """Test that warm_exam caches the paper, answer key and class dashboard"""
+        out = StringIO()
+        call_command('warm_exam', self.exam.pk, stdout=out)
+        self.assertIn('papers: 1 in', out.getvalue())
+        self.assertIn('class dashboards: 1 in', out.getvalue())
+
+        for namespace in ('paper', 'answer-key'):
+            self.assertIsNotNone(cache.get(versioned_key(namespace, exam_scope(self.exam.pk))))
+        self.assertIsNotNone(cache.get(versioned_key('exam-list', class_scope(self.student_class.pk), 'all')))
+        with self.assertNumQueries(0):
+            paper = papers.get_paper(self.exam.pk)
+            self.assertEqual([len(question.options) for question in paper.questions.all()], [2, 2])
+
+    def test_warm_exam_needs_a_target(self):
+        """Test that warm_exam refuses to run without exams and reports unknown ids"""
+        with self.assertRaises(CommandError):
+            call_command('warm_exam')
+        with self.assertRaisesMessage(CommandError, 'No exam with id 999'):
+            call_command('warm_exam', 999, stdout=StringIO())
+        out = StringIO()
+        call_command('warm_exam', since=1, stdout=out)
+        self.assertIn('Warmed 1 exam(s)', out.getvalue())
+
+    def test_edited_choices_replace_the_cached_key(self):
+        """Test that marking uses the current answer key after a choice changes"""
+        question = self.exam.questions.first()
+        right, wrong = question.choice_set.order_by('pk')
+        key = papers.get_answer_key(self.exam.pk)
+        self.assertEqual(papers.mark_choices(key, {str(question.pk): str(wrong.pk)}), {question.pk: [str(wrong.pk), False]})
+
+        wrong.is_correct = True
+        wrong.save()
+        key = papers.get_answer_key(self.exam.pk)
+        self.assertEqual(papers.mark_choices(key, {str(question.pk): str(wrong.pk)}), {question.pk: [str(wrong.pk), True]})
+        self.assertEqual(papers.mark_choices(key, {str(question.pk): '0'}), {})
+
+
+class ProctorEventTestCase(TestCase):
+    def setUp(self):
+        """Set up an exam in progress for one student"""
+        teacher = User.objects.create_user(username='teacher', password='pass', is_staff=True)
+        self.student = User.objects.create_user(username='student', password='pass')
+        self.exam = Exam.objects.create(
+            title='Algebra', class_group=StudentClass.objects.create(name='Grade 10'),
+            session=AcademicSession.objects.create(name='2024/2025'),
+            term=AcademicTerm.objects.create(name='First Term'),
+            subject=Subject.objects.create(name='Mathematics'), exam_type='exam', duration=30, author=teacher,
+        )
+        self.answer = Answer.objects.create(exam=self.exam, user=self.student)
+        self.answer.start()
+        self.client.force_login(self.student)
+        self.url = reverse('proctor-events', args=(self.exam.pk,))
+        self.addCleanup(proctoring.buffer.flush)
+
+    def send(self, *events):
+        return self.client.post(self.url, {'events': json.dumps(list(events))})
+
+    def test_events_are_buffered_and_stored_in_one_batch(self):
+        """Test that beacons are buffered until the batch is full and then stored together"""
+        now = time.time() * 1000
+        with self.settings(PROCTOR_EVENT_BATCH_SIZE=3, PROCTOR_EVENT_FLUSH_SECONDS=60):
+            response = self.send({'kind': 'tab_switch', 'at': now - 2000}, {'kind': 'blur', 'at': now - 1000})
+            self.assertEqual(response.json()['accepted'], 2)
+            self.assertFalse(ProctorEvent.objects.exists())
+
+            with CaptureQueriesContext(connection) as queries:
+                self.send({'kind': 'tab_switch', 'at': now, 'detail': 'x' * 500})
+        inserts = [query['sql'] for query in queries if query['sql'].startswith('INSERT INTO "exam_proctorevent"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(ProctorEvent.objects.filter(answer=self.answer).count(), 3)
+        self.assertEqual(len(ProctorEvent.objects.latest('occurred_at').detail), 200)
+
+        summary = ProctorSummary.objects.get(answer=self.answer)
+        self.assertEqual((summary.total, summary.tab_switches, summary.blurs), (3, 2, 1))
+        self.assertLess(summary.first_event_at, summary.last_event_at)
+
+    def test_summary_is_updated_incrementally(self):
+        """Test that each flush adds its events to the attempt's existing summary"""
+        with self.settings(PROCTOR_EVENT_BATCH_SIZE=1):
+            self.send({'kind': 'copy', 'at': time.time() * 1000, 'detail': 'paste'})
+            self.send({'kind': 'fullscreen_exit', 'at': time.time() * 1000}, {'kind': 'copy'})
+
+        summary = ProctorSummary.objects.get(answer=self.answer)
+        self.assertEqual((summary.total, summary.copy_attempts, summary.fullscreen_exits), (3, 2, 1))
+
+    def test_invalid_events_and_attempts_are_rejected(self):
+        """Test that unknown kinds, future times and finished attempts are not recorded"""
+        with self.settings(PROCTOR_EVENT_BATCH_SIZE=1):
+            response = self.send({'kind': 'screenshot'}, 'blur', {'kind': 'blur', 'at': time.time() * 1000 + 3600000})
+            self.assertEqual(response.json()['accepted'], 1)
+            event = ProctorEvent.objects.get()
+            self.assertEqual(event.occurred_at, event.received_at)
+
+            self.assertEqual(self.client.post(self.url, {'events': '{'}).status_code, 400)
+            self.answer.submit({})
+            self.assertEqual(self.send({'kind': 'blur'}).status_code, 409)
+
+    def test_prune_drops_old_days_and_keeps_summaries(self):
+        """Test that prune_proctor_events deletes whole expired days only"""
+        with self.settings(PROCTOR_EVENT_BATCH_SIZE=1):
+            self.send({'kind': 'blur'}, {'kind': 'blur'})
+        old = ProctorEvent.objects.first()
+        ProctorEvent.objects.filter(pk=old.pk).update(day=old.day.replace(year=old.day.year - 1))
+
+        out = StringIO()
+        call_command('prune_proctor_events', days=30, stdout=out)
+        self.assertIn('Deleted 1 event(s)', out.getvalue())
+        self.assertEqual(ProctorEvent.objects.count(), 1)
+        self.assertEqual(ProctorSummary.objects.get(answer=self.answer).total, 2)
+
+
+class PresenceTestCase(TestCase):
+    def setUp(self):
+        """Set up an exam with two students in progress"""
+        cache.clear()
+        self.teacher = User.objects.create_user(username='teacher', password='pass', is_staff=True)
+        self.exam = Exam.objects.create(
+            title='Algebra', class_group=StudentClass.objects.create(name='Grade 10'),
+            session=AcademicSession.objects.create(name='2024/2025'),
+            term=AcademicTerm.objects.create(name='First Term'),
+            subject=Subject.objects.create(name='Mathematics'), exam_type='exam', duration=30, author=self.teacher,
+        )
+        self.students = []
+        for name in ('ada', 'ben'):
+            student = User.objects.create_user(username=name, password='pass')
+            Answer.objects.create(exam=self.exam, user=student).start()
+            self.students.append(student)
+        self.url = reverse('heartbeat', args=(self.exam.pk,))
+        self.addCleanup(presence.last_seen.compact)
+
+    def beat(self, student, idle=0):
+        self.client.force_login(student)
+        return self.client.post(self.url, {'idle': idle})
+
+    def counts(self):
+        self.client.force_login(self.teacher)
+        return self.client.get(reverse('exam-presence', args=(self.exam.pk,))).json()
+
+    def test_heartbeats_count_online_and_idle(self):
+        """Test that heartbeats place attempts as online or idle without writing to the database"""
+        self.client.force_login(self.students[0])
+        self.client.get(reverse('take', args=(self.exam.pk,)))
+        self.beat(self.students[1], idle=600)
+        self.assertEqual(self.counts(), {'exam': self.exam.pk, 'online': 1, 'idle': 1, 'disconnected': 0})
+
+        self.client.force_login(self.students[1])
+        with self.assertNumQueries(2):  # the session and the user
+            self.assertEqual(self.client.post(self.url, {'idle': 0}).status_code, 200)
+        self.assertEqual(self.counts()['online'], 2)
+
+    def test_silent_attempts_disconnect_and_finished_ones_leave(self):
+        """Test that attempts without recent beats count as disconnected until they finish"""
+        for student in self.students:
+            self.beat(student)
+        later = time.time() + 60
+        with mock.patch('apps.exam.presence.time.time', return_value=later):
+            self.assertEqual(presence.counts(self.exam.pk), {'online': 0, 'idle': 0, 'disconnected': 2})
+            presence.beat(self.exam.pk, self.students[0].pk, 0)
+            self.assertEqual(presence.counts(self.exam.pk), {'online': 1, 'idle': 0, 'disconnected': 1})
+
+            self.client.force_login(self.students[1])
+            self.client.post(reverse('take', args=(self.exam.pk,)), {'submit_exam': 'true'})
+            self.assertEqual(presence.counts(self.exam.pk), {'online': 1, 'idle': 0, 'disconnected': 0})
+        self.assertEqual(self.beat(self.students[1]).status_code, 409)
+
+    def test_last_seen_is_compacted_to_the_database(self):
+        """Test that heartbeats reach Answer.last_seen in one batched write"""
+        self.beat(self.students[0])
+        self.beat(self.students[1])
+        self.assertFalse(Answer.objects.filter(last_seen__isnull=False).exists())
+        self.assertEqual(presence.last_seen.compact(), 2)
+        self.assertEqual(Answer.objects.filter(last_seen__isnull=False).count(), 2)
+
+    def test_presence_is_for_staff(self):
+        """Test that students cannot read the presence counts"""
+        self.client.force_login(self.students[0])
+        response = self.client.get(reverse('exam-presence', args=(self.exam.pk,)))
+        self.assertEqual(response.status_code, 403)
+
+
+class ProctorFeedTestCase(TestCase):
+    def setUp(self):
+        """Set up an exam for a class of two, one of whom has started"""
+        cache.clear()
+        self.teacher = User.objects.create_user(username='teacher', password='pass', is_staff=True)
+        student_class = StudentClass.objects.create(name='Grade 10')
+        self.exam = Exam.objects.create(
+            title='Algebra', class_group=student_class,
+            session=AcademicSession.objects.create(name='2024/2025'),
+            term=AcademicTerm.objects.create(name='First Term'),
+            subject=Subject.objects.create(name='Mathematics'), exam_type='exam', duration=30, author=self.teacher,
+        )
+        self.student = User.objects.create_user(username='ada', password='pass', student_class=student_class)
+        User.objects.create_user(username='ben', password='pass', student_class=student_class)
+        self.answer = Answer.objects.create(exam=self.exam, user=self.student)
+        self.answer.start()
+        self.stream_url = reverse('exam-proctor-stream', args=(self.exam.pk,))
+
+    def test_status_changes_are_published(self):
+        """Test that starting, joining and finishing an attempt reach the exam's change log"""
+        presence.join(self.exam.pk, self.student.pk, self.answer.pk)
+        self.answer.terminate('Tab switch')
+        seq, entries = feed.read_since(self.exam.pk, 0)
+        self.assertEqual(seq, 3)
+        self.assertEqual(
+            [(entry['event'], entry.get('status', entry.get('state'))) for entry in entries],
+            [('started', 'in_progress'), ('seen', 'online'), ('terminated', 'terminated')],
+        )
+        self.assertEqual(feed.read_since(self.exam.pk, 3), (3, []))
+
+    async def test_reconnecting_screen_gets_missed_changes(self):
+        """Test that a stream opened with Last-Event-ID replays the changes after it"""
+        await sync_to_async(self.answer.submit)({})
+        await self.async_client.aforce_login(self.teacher)
+        with self.settings(PROCTOR_STREAM_MAX_SECONDS=0):
+            response = await self.async_client.get(self.stream_url, headers={'Last-Event-ID': '1'})
+            body = ''.join([chunk.decode() async for chunk in response.streaming_content])
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertIn('event: presence', body)
+        self.assertIn('id: 2\nevent: submitted', body)
+        self.assertNotIn('event: started', body)
+
+    def test_missing_log_entries_wait_then_ask_for_a_resync(self):
+        """Test that a gap in the log is waited for briefly, then reported as lost"""
+        cache.delete(f'proctor-feed:{self.exam.pk}:1')
+        self.assertEqual(feed.read_since(self.exam.pk, 0), (0, []))
+
+        self.answer.expire()
+        with mock.patch('apps.exam.feed.time.time', return_value=time.time() + feed.WRITE_GRACE_SECONDS):
+            seq, entries = feed.read_since(self.exam.pk, 0)
+        self.assertEqual(seq, 2)
+        self.assertEqual([entry and entry['event'] for entry in entries], [None, 'expired'])
+
+    async def test_screens_share_one_poller_per_exam(self):
+        """Test that live changes reach every screen of an exam through one poller"""
+        with self.settings(PROCTOR_STREAM_POLL_SECONDS=0.01, PROCTOR_STREAM_MAX_SECONDS=5):
+            screens = [feed.stream(self.exam.pk), feed.stream(self.exam.pk)]
+            for screen in screens:
+                self.assertEqual(await anext(screen), 'retry: 3000\n\n')
+                self.assertIn('event: presence', await anext(screen))
+            self.assertEqual(len(feed.hub.pollers), 1)
+
+            await sync_to_async(self.answer.expire)()
+            for screen in screens:
+                chunk = ''
+                while 'event: expired' not in chunk:
+                    chunk = await asyncio.wait_for(anext(screen), 2)
+                self.assertIn('"status":"completed"', chunk)
+                await screen.aclose()
+        self.assertEqual(feed.hub.pollers, {})
+
+    def test_proctor_pages_are_for_staff(self):
+        """Test that staff see the class snapshot and students are refused the page and stream"""
+        self.client.force_login(self.teacher)
+        response = self.client.get(reverse('exam-proctor', args=(self.exam.pk,)))
+        self.assertContains(response, 'In Progress')
+        self.assertContains(response, 'Not Started')
+        self.assertContains(response, self.stream_url)
+
+        self.client.force_login(self.student)
+        self.assertEqual(self.client.get(reverse('exam-proctor', args=(self.exam.pk,))).status_code, 403)
+        self.assertEqual(self.client.get(self.stream_url).status_code, 403)
+
+
+class TimeExtensionTestCase(TestCase):
+    def setUp(self):
+        """Set up a 30 minute exam with two attempts in progress"""
+        cache.clear()
+        self.teacher = User.objects.create_user(username='teacher', password='pass', is_staff=True)
+        self.exam = Exam.objects.create(
+            title='Algebra', class_group=StudentClass.objects.create(name='Grade 10'),
+            session=AcademicSession.objects.create(name='2024/2025'),
+            term=AcademicTerm.objects.create(name='First Term'),
+            subject=Subject.objects.create(name='Mathematics'), exam_type='exam', duration=30, author=self.teacher,
+        )
+        self.answers = []
+        for name in ('ada', 'ben'):
+            answer = Answer.objects.create(exam=self.exam, user=User.objects.create_user(username=name, password='pass'))
+            answer.start()
+            self.answers.append(answer)
+
+    def minutes_left(self, answer):
+        deadline = deadlines.get_deadline(self.exam.pk, answer.pk)
+        return round((deadline - answer.time_started).total_seconds() / 60)
+
+    def test_deadline_is_cached_until_an_extension(self):
+        """Test that deadlines come from the cache and include exam-wide and own extensions"""
+        ada, ben = self.answers
+        self.assertEqual(self.minutes_left(ada), 30)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.minutes_left(ada), 30)
+
+        deadlines.grant_extension(self.exam, 10, reason='Fire drill')
+        deadlines.grant_extension(self.exam, 5, [ben])
+        self.assertEqual((self.minutes_left(ada), self.minutes_left(ben)), (40, 45))
+
+        TimeExtension.objects.filter(answer=ben).delete()
+        self.assertEqual(self.minutes_left(ben), 40)
+        _, entries = feed.read_since(self.exam.pk, 0)
+        self.assertIn(('extended', 5, [ben.pk]), [
+            (entry['event'], entry.get('minutes'), entry.get('answers')) for entry in entries
+        ])
+
+    def test_heartbeat_carries_server_time_and_deadline(self):
+        """Test that heartbeats return the server clock and the deadline after an extension"""
+        ada = self.answers[0]
+        self.client.force_login(ada.user)
+        url = reverse('heartbeat', args=(self.exam.pk,))
+        before = self.client.post(url).json()
+        self.assertAlmostEqual(before['now'], time.time() * 1000, delta=5000)
+
+        deadlines.grant_extension(self.exam, 10, [ada])
+        after = self.client.post(url).json()
+        self.assertEqual(after['deadline'] - before['deadline'], 10 * 60 * 1000)
+
+    def test_take_page_expires_on_the_extended_deadline(self):
+        """Test that the exam page keeps an attempt open past the duration while extended"""
+        ada = self.answers[0]
+        Answer.objects.filter(pk=ada.pk).update(time_started=timezone.now() - timedelta(minutes=35))
+        deadlines.grant_extension(self.exam, 10, [ada])
+        self.client.force_login(ada.user)
+        self.assertEqual(self.client.get(reverse('take', args=(self.exam.pk,))).status_code, 200)
+
+        TimeExtension.objects.all().delete()
+        response = self.client.get(reverse('take', args=(self.exam.pk,)))
+        self.assertRedirects(response, reverse('score-detail', args=(self.exam.pk, ada.user.pk)), fetch_redirect_response=False)
+
+    def test_staff_extend_from_the_proctor_page(self):
+        """Test that staff grant extensions for selected students and students cannot"""
+        url = reverse('exam-extend', args=(self.exam.pk,))
+        self.client.force_login(self.teacher)
+        response = self.client.post(url, {'minutes': 10, 'answers': [self.answers[1].pk], 'reason': 'Late start'})
+        self.assertRedirects(response, reverse('exam-proctor', args=(self.exam.pk,)), fetch_redirect_response=False)
+        extension = TimeExtension.objects.get()
+        self.assertEqual((extension.answer, extension.granted_by), (self.answers[1], self.teacher))
+
+        self.client.force_login(self.answers[0].user)
+        self.assertEqual(self.client.post(url, {'minutes': 10}).status_code, 403)
+        self.assertEqual(TimeExtension.objects.count(), 1)
+
+    def test_time_sync_is_cheap(self):
+        """Test that the time sync endpoint answers without touching the database"""
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('time-sync'))
+        self.assertAlmostEqual(response.json()['now'], time.time() * 1000, delta=5000)
+        self.assertIn('no-cache', response['Cache-Control'])
+
+
+class ExamWindowTestCase(TestCase):
+    def setUp(self):
+        """Set up an exam opening in five minutes and closing an hour later for a class of two"""
+        cache.clear()
+        self.now = timezone.now()
+        self.teacher = User.objects.create_user(username='teacher', password='pass', is_staff=True)
+        self.student_class = StudentClass.objects.create(name='Grade 10')
+        subject = Subject.objects.create(name='Mathematics')
+        self.exam = Exam.objects.create(
+            title='Algebra', class_group=self.student_class,
+            session=AcademicSession.objects.create(name='2024/2025'),
+            term=AcademicTerm.objects.create(name='First Term'),
+            subject=subject, exam_type='exam', duration=30, author=self.teacher,
+            opens_at=self.now + timedelta(minutes=5), closes_at=self.now + timedelta(minutes=65),
+        )
+        question = Question.objects.create(subject=subject, class_group=self.student_class, question='Q1')
+        Choice.objects.create(question=question, body='Right', is_correct=True)
+        self.exam.questions.add(question)
+        self.students = [
+            User.objects.create_user(username=name, password='pass', student_class=self.student_class)
+            for name in ('ada', 'ben')
+        ]
+
+    def test_lists_show_only_open_exams(self):
+        """Test that dashboards and my exams list an exam only inside its window"""
+        self.client.force_login(self.students[0])
+        self.assertEqual(self.client.get(reverse('myexams')).context['exams'], [])
+        self.assertEqual(list(self.client.get(reverse('dashboard')).context['exams']), [])
+
+        self.assertEqual(list(Exam.objects.open(self.now + timedelta(minutes=10))), [self.exam])
+        self.assertEqual(list(Exam.objects.open(self.now + timedelta(minutes=65))), [])
+
+    def test_exam_cannot_start_outside_its_window(self):
+        """Test that the exam page refuses to start an attempt before the exam opens"""
+        self.client.force_login(self.students[0])
+        response = self.client.post(reverse('take', args=(self.exam.pk,)), {'start_exam': '1'})
+        self.assertRedirects(response, reverse('myexams'), fetch_redirect_response=False)
+        self.assertEqual(Answer.objects.get(user=self.students[0]).status, 'not_started')
+
+    def test_scheduler_prewarms_opens_and_closes(self):
+        """Test that scheduler ticks warm the paper, open the class's attempts once and finalize them"""
+        done = scheduler.tick(self.now)
+        self.assertEqual(done['prewarmed'], [self.exam.pk])
+        self.assertIsNotNone(cache.get(versioned_key('paper', exam_scope(self.exam.pk))))
+
+        opening = self.now + timedelta(minutes=5, seconds=3)
+        self.assertEqual(scheduler.tick(opening)['opened'], [self.exam.pk])
+        self.assertEqual(scheduler.tick(opening)['opened'], [])
+        self.assertEqual(Answer.objects.filter(exam=self.exam, status='not_started').count(), 2)
+
+        ada = Answer.objects.get(user=self.students[0])
+        ada.start()
+        journal.autosave(ada, {'1': ['9', True]})
+        self.assertEqual(deadlines.get_deadline(self.exam.pk, ada.pk), ada.time_started + timedelta(minutes=30))
+        deadlines.grant_extension(self.exam, 60)
+        self.assertEqual(deadlines.get_deadline(self.exam.pk, ada.pk), self.exam.closes_at)
+
+        self.assertEqual(scheduler.tick(self.exam.closes_at)['closed'], [self.exam.pk])
+        ada.refresh_from_db()
+        self.assertEqual((ada.status, ada.is_complete, ada.choices), ('completed', True, {'1': ['9', True]}))
+        self.assertEqual(Answer.objects.get(user=self.students[1]).status, 'not_started')
+        _, entries = feed.read_since(self.exam.pk, 0)
+        self.assertEqual(entries[-1]['event'], 'expired')
+
+    def test_scheduler_steps_are_claimed_in_the_database(self):
+        """Test that a step runs once per edge across schedulers, and again when the edge moves"""
+        opening = self.now + timedelta(minutes=5, seconds=3)
+        self.assertEqual(scheduler.tick(opening)['opened'], [self.exam.pk])
+        cache.clear()
+        self.assertEqual(scheduler.tick(opening)['opened'], [])
+        self.exam.refresh_from_db()
+        self.assertEqual(self.exam.opened_for, self.exam.opens_at)
+
+        self.assertFalse(scheduler._claim('open', self.exam.pk, self.exam.opens_at))
+        Exam.objects.filter(pk=self.exam.pk).update(opens_at=self.now + timedelta(minutes=4))
+        self.assertEqual(scheduler.tick(opening)['opened'], [self.exam.pk])
+
+    def test_failing_step_is_retried_on_the_next_tick(self):
+        """Test that a step that raises is released while the tick goes on, and runs on the next tick"""
+        opening = self.now + timedelta(minutes=5, seconds=3)
+        with mock.patch.object(scheduler.warmup, 'warm_dashboards', side_effect=OperationalError('disk I/O error')):
+            with self.assertLogs('apps.exam.scheduler', 'ERROR'):
+                done = scheduler.tick(opening)
+        self.assertEqual(done['opened'], [])
+        self.exam.refresh_from_db()
+        self.assertIsNone(self.exam.opened_for)
+        self.assertEqual(scheduler.tick(opening)['opened'], [self.exam.pk])
+
+    def test_scheduler_command_survives_a_failing_pass(self):
+        """Test that run_exam_scheduler reports a pass that raises and keeps running"""
+        command = 'apps.exam.management.commands.run_exam_scheduler'
+        err = StringIO()
+        passes = [OperationalError('database is locked'), {'prewarmed': [], 'opened': [], 'closed': []}]
+        with mock.patch(f'{command}.tick', side_effect=passes) as tick, \
+                mock.patch(f'{command}.time.sleep', side_effect=[None, KeyboardInterrupt]):
+            with self.assertRaises(KeyboardInterrupt):
+                call_command('run_exam_scheduler', interval=1, stdout=StringIO(), stderr=err)
+        self.assertEqual(tick.call_count, 2)
+        self.assertIn('database is locked', err.getvalue())
+
+    def test_warm_exam_opening(self):
+        """Test that warm_exam --opening warms the exams about to open"""
+        out = StringIO()
+        call_command('warm_exam', opening=1, stdout=out)
+        self.assertIn('Warmed 0 exam(s)', out.getvalue())
+        call_command('warm_exam', opening=10, stdout=out)
+        self.assertIn('Warmed 1 exam(s)', out.getvalue())
+
+
+@override_settings(EXAM_START_RATE=1, EXAM_START_BURST=1)
+class ExamAdmissionTestCase(TestCase):
+    def setUp(self):
+        """Set up an open exam and three students"""
+        cache.clear()
+        teacher = User.objects.create_user(username='teacher', password='pass', is_staff=True)
+        self.exam = Exam.objects.create(
+            title='Algebra', class_group=StudentClass.objects.create(name='Grade 10'),
+            session=AcademicSession.objects.create(name='2024/2025'),
+            term=AcademicTerm.objects.create(name='First Term'),
+            subject=Subject.objects.create(name='Mathematics'), exam_type='exam', duration=30, author=teacher,
+        )
+        self.students = [User.objects.create_user(username=name, password='pass') for name in ('ada', 'ben', 'cy')]
+
+    def start(self, student):
+        self.client.force_login(student)
+        return self.client.post(reverse('take', args=(self.exam.pk,)), {'start_exam': 'true'})
+
+    def test_slots_fill_windows_in_arrival_order(self):
+        """Test that starts fill the shared windows one after the other, skipping the full ones"""
+        times = [admission.reserve(self.exam.pk, rate=10, burst=2, now=100.05) for _ in range(5)]
+        for actual, expected in zip(times, [100.0, 100.0, 100.2, 100.2, 100.4]):
+            self.assertAlmostEqual(actual, expected)
+        self.assertEqual(cache.get(admission._frontier_key(self.exam.pk)), 502)
+
+        # Another worker shares the windows: the next start queues behind the five.
+        with mock.patch.object(admission.cache, 'incr', wraps=cache.incr) as incr:
+            self.assertAlmostEqual(admission.reserve(self.exam.pk, rate=10, burst=2, now=100.05), 100.4)
+        self.assertEqual(incr.call_count, 1)
+
+    def test_waiting_room_keeps_the_timer_stopped(self):
+        """Test that queued students wait for their own slot and start their timer when admitted"""
+        ada, ben, cy = self.students
+        self.assertEqual(self.start(ada).status_code, 302)
+
+        response = self.start(ben)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertTemplateUsed(response, 'exam/waiting_room.html')
+        answer = Answer.objects.get(user=ben)
+        self.assertEqual((answer.status, answer.time_started), ('not_started', None))
+
+        # Retrying early keeps ben's slot instead of queueing behind cy.
+        self.assertEqual(self.start(ben).status_code, 503)
+        self.assertEqual(self.start(cy)['Retry-After'], '2')
+
+        cache.set(admission._ticket_key(self.exam.pk, ben.pk), time.time() - 1)
+        before = timezone.now()
+        self.assertRedirects(self.start(ben), reverse('take', args=(self.exam.pk,)), fetch_redirect_response=False)
+        answer.refresh_from_db()
+        self.assertEqual(answer.status, 'in_progress')
+        self.assertGreaterEqual(answer.time_started, before)
+
+
+class SubmissionKeyTestCase(TestCase):
+    def setUp(self):
+        """Set up a one-question exam in progress for a student"""
+        cache.clear()
+        teacher = User.objects.create_user(username='teacher', password='pass', is_staff=True)
+        self.student = User.objects.create_user(username='student', password='pass')
+        subject = Subject.objects.create(name='Mathematics')
+        student_class = StudentClass.objects.create(name='Grade 10')
+        self.exam = Exam.objects.create(
+            title='Algebra', class_group=student_class,
+            session=AcademicSession.objects.create(name='2024/2025'),
+            term=AcademicTerm.objects.create(name='First Term'),
+            subject=subject, exam_type='exam', duration=30, author=teacher,
+        )
+        self.question = Question.objects.create(subject=subject, class_group=student_class, question='Q1')
+        self.right = Choice.objects.create(question=self.question, body='Right', is_correct=True)
+        self.wrong = Choice.objects.create(question=self.question, body='Wrong')
+        self.exam.questions.add(self.question)
+        self.answer = Answer.objects.create(exam=self.exam, user=self.student)
+        self.answer.start()
+        self.client.force_login(self.student)
+        self.take_url = reverse('take', args=(self.exam.pk,))
+        self.score_url = reverse('score-detail', args=(self.exam.pk, self.student.pk))
+
+    def submit(self, choice, key):
+        data = {'submit_exam': 'true', str(self.question.pk): str(choice.pk)}
+        if key:
+            data['submission_key'] = key
+        return self.client.post(self.take_url, data)
+
+    def messages(self, response):
+        return [str(message) for message in response.wsgi_request._messages]
+
+    def test_take_page_issues_a_key_per_render(self):
+        """Test that every render of the exam page carries a new submission key"""
+        first = self.client.get(self.take_url).context['submission_key']
+        second = self.client.get(self.take_url).context['submission_key']
+        self.assertTrue(first)
+        self.assertNotEqual(first, second)
+
+    def test_duplicate_gets_the_stored_outcome(self):
+        """Test that a repeated key is answered from its stored outcome without loading or grading the exam"""
+        self.assertRedirects(self.submit(self.right, 'key-1'), self.score_url, fetch_redirect_response=False)
+
+        with CaptureQueriesContext(connection) as queries, mock.patch.object(papers, 'mark_choices') as grade:
+            response = self.submit(self.wrong, 'key-1')
+        self.assertRedirects(response, self.score_url, fetch_redirect_response=False)
+        self.assertEqual(self.messages(response)[-1], 'Exam submitted successfully!')
+        grade.assert_not_called()
+        tables = (Exam._meta.db_table, Answer._meta.db_table)
+        self.assertFalse([query for query in queries if any(table in query['sql'] for table in tables)])
+        self.answer.refresh_from_db()
+        self.assertEqual(self.answer.choices, {str(self.question.pk): [str(self.right.pk), True]})
+
+    def test_duplicate_of_an_ungraded_submission_does_not_wait(self):
+        """Test that a repeated key whose first submission is still grading is answered as pending"""
+        SubmissionKey.objects.create(exam=self.exam, user=self.student, key='key-1')
+        with mock.patch.object(papers, 'mark_choices') as grade:
+            response = self.submit(self.right, 'key-1')
+        self.assertRedirects(response, self.score_url, fetch_redirect_response=False)
+        self.assertEqual(self.messages(response)[-1], 'Your submission is being recorded.')
+        grade.assert_not_called()
+        self.answer.refresh_from_db()
+        self.assertEqual(self.answer.status, 'in_progress')
+
+    def test_keyless_retry_never_regrades(self):
+        """Test that a submission without a key leaves a completed attempt untouched"""
+        self.submit(self.right, 'key-1')
+        response = self.submit(self.wrong, '')
+        self.assertEqual(self.messages(response)[-1], 'You have already submitted this exam.')
+        self.answer.refresh_from_db()
+        self.assertEqual(self.answer.choices, {str(self.question.pk): [str(self.right.pk), True]})
+
+    def test_failed_submission_releases_its_key(self):
+        """Test that a retry of a submission that failed goes through"""
+        with mock.patch.object(papers, 'mark_choices', side_effect=RuntimeError), self.assertRaises(RuntimeError):
+            self.submit(self.right, 'key-1')
+        self.submit(self.right, 'key-1')
+        self.answer.refresh_from_db()
+        self.assertEqual(self.answer.status, 'completed')
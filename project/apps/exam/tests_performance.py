@@ -0,0 +1,278 @@
+"""
+Query-count and latency budgets for every page of the core and exam apps
+
+Each URL is requested as admin, staff and student, first against a small
+dataset and then again after the data has grown. The write endpoints are
+also posted to with a valid payload by the role that uses them, each
+against an attempt in progress. The number of queries a request runs must
+not grow with the data, and both the query count and the response time are
+compared against performance_baseline.json.
+
+Run with PERF_BASELINE_UPDATE=1 to rewrite the baseline after an intended
+change.
+"""
+
+import json
+import os
+import time
+from pathlib import Path
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from apps.core import urls as core_urls
+from apps.core.models import AcademicSession, AcademicTerm, StudentClass, Subject
+from . import submissions, urls as exam_urls
+from .models import Answer, Choice, Exam, Question
+
+User = get_user_model()
+
+BASELINE_PATH = Path(__file__).with_name("performance_baseline.json")
+UPDATE_BASELINE = os.environ.get("PERF_BASELINE_UPDATE") == "1"
+
+SMALL = 2
+LARGE = 8
+# Response times are noisy; only a clear regression should fail the suite.
+LATENCY_TOLERANCE = 3.0
+LATENCY_FLOOR_MS = 100
+
+
+class PerformanceBudgetTestCase(TestCase):
+    def setUp(self):
+        """Set up one user per role, an exam in progress and the objects each URL needs"""
+        cache.clear()
+        self.student_class = StudentClass.objects.create(name="Grade 10")
+        self.subject = Subject.objects.create(name="Mathematics")
+        self.session = AcademicSession.objects.create(name="2024/2025")
+        self.term = AcademicTerm.objects.create(name="First Term")
+
+        self.admin = User.objects.create_superuser(username="admin", password="pass")
+        self.staff = User.objects.create_user(username="staff", password="pass", is_staff=True)
+        self.student = User.objects.create_user(
+            username="student", password="pass", student_class=self.student_class
+        )
+
+        self.exam = self.create_exam(0)
+        self.question = self.create_question(0)
+        self.exam.questions.add(self.question)
+        self.answer = Answer.objects.create(
+            exam=self.exam, user=self.student, status="in_progress", time_started=timezone.now()
+        )
+        self.other_answer = Answer.objects.create(
+            exam=self.exam, user=User.objects.create_user(username="other", password="pass"),
+            status="completed", is_complete=True,
+        )
+        self.seeded = 0
+
+    def create_exam(self, i):
+        return Exam.objects.create(
+            title=f"Exam {i}", class_group=self.student_class, session=self.session, term=self.term,
+            subject=self.subject, exam_type="exam", duration=60, author=self.staff,
+        )
+
+    def create_question(self, i):
+        question = Question.objects.create(
+            subject=self.subject, class_group=self.student_class, author=self.staff,
+            question=f"Question {i}",
+        )
+        Choice.objects.bulk_create([
+            Choice(question=question, body=f"Choice {j}", is_correct=j == 0) for j in range(4)
+        ])
+        return question
+
+    def grow(self, size):
+        """Add exams, questions, students and finished attempts until there are ``size`` of each."""
+        for i in range(self.seeded + 1, size + 1):
+            question = self.create_question(i)
+            self.exam.questions.add(question)
+            self.create_exam(i).questions.add(question)
+            student = User.objects.create_user(
+                username=f"student{i}", password="pass", first_name=f"Student{i}",
+                student_class=self.student_class,
+            )
+            User.objects.create_user(username=f"staff{i}", password="pass", is_staff=True)
+            choice = question.choice_set.first()
+            Answer.objects.create(
+                exam=self.exam, user=student, status="completed", is_complete=True,
+                choices={str(question.pk): [str(choice.pk), choice.is_correct]},
+            )
+        self.seeded = size
+
+    def url_kwargs(self):
+        """Arguments for every named URL; a new URL must be added here to be measured."""
+        exam = {"exam_id": self.exam.pk}
+        return {
+            "dashboard": {},
+            "logout": {},
+            "user_status": {},
+            "student_list": {},
+            "student_create": {},
+            "student_import": {},
+            "student-update": {"pk": self.student.pk},
+            "staff_list": {},
+            "staff_create": {},
+            "staff-update": {"pk": self.staff.pk},
+            "user-delete": {"pk": self.other_answer.user_id},
+            "metrics": {},
+            "profiling_report": {},
+            "term_session": {},
+            "term_create": {},
+            "term_delete": {"pk": self.term.pk},
+            "term_update": {"pk": self.term.pk},
+            "session_create": {},
+            "session_delete": {"pk": self.session.pk},
+            "session_update": {"pk": self.session.pk},
+            "subject_create": {},
+            "subject_delete": {"pk": self.subject.pk},
+            "subject_update": {"pk": self.subject.pk},
+            "class_create": {},
+            "class_delete": {"pk": self.student_class.pk},
+            "class_update": {"pk": self.student_class.pk},
+            "questionbank": {},
+            "question-create": {},
+            "question-update": {"pk": self.question.pk},
+            "question-delete": {"pk": self.question.pk},
+            "exam-create": {},
+            "exam-update": {"pk": self.exam.pk},
+            "exam-delete": {"pk": self.exam.pk},
+            "exam-detail": {"pk": self.exam.pk},
+            "add-question": exam,
+            "add-question-from-bank": exam,
+            "exam-proctor": exam,
+            "exam-proctor-stream": exam,
+            "exam-extend": exam,
+            "exam-presence": exam,
+            "exam-assemble": exam,
+            "examquestion-update": {"pk": self.question.pk, **exam},
+            "remove-question": {"pk": self.question.pk, **exam},
+            "take": exam,
+            "autosave": exam,
+            "time-sync": {},
+            "heartbeat": exam,
+            "proctor-events": exam,
+            "terminate-exam": exam,
+            "myexams": {},
+            "scores": exam,
+            "score-detail": {"uid": self.student.pk, **exam},
+            "score-delete": {"pk": self.other_answer.pk},
+            "test-anti-cheating": {},
+        }
+
+    def post_cases(self):
+        """``(role, url name, url kwargs, payload)`` of every write endpoint, by measurement key."""
+        exam = {"exam_id": self.exam.pk}
+        answers = {str(self.question.pk): str(self.question.choice_set.first().pk)}
+        events = [{"kind": "blur", "at": time.time() * 1000, "detail": ""}]
+        return {
+            "student POST take submit": (
+                "student", "take", exam,
+                lambda: {"submit_exam": "true", "submission_key": submissions.new_key(), **answers},
+            ),
+            "student POST autosave": ("student", "autosave", exam, lambda: answers),
+            "student POST heartbeat": ("student", "heartbeat", exam, lambda: {"idle": "0"}),
+            "student POST proctor-events": ("student", "proctor-events", exam, lambda: {"events": json.dumps(events)}),
+            "student POST terminate-exam": ("student", "terminate-exam", exam, lambda: {"reason": "Tab switch"}),
+            "staff POST exam-extend": ("staff", "exam-extend", exam, lambda: {"minutes": "5", "reason": "Fire drill"}),
+        }
+
+    def reset_attempt(self):
+        """Put the student's attempt back in progress, as every write endpoint expects."""
+        Answer.objects.filter(pk=self.answer.pk).update(
+            status="in_progress", is_complete=False, time_started=timezone.now(), time_completed=None,
+            termination_reason=None, choices={},
+        )
+
+    @override_settings(PROCTOR_EVENT_BATCH_SIZE=1)
+    def measure_posts(self):
+        """Return {"<role> POST <url name>": (queries, milliseconds)} for every write endpoint."""
+        results = {}
+        clients = {}
+        for role, user in (("staff", self.staff), ("student", self.student)):
+            clients[role] = Client()
+            clients[role].force_login(user)
+        for key, (role, name, url_kwargs, payload) in self.post_cases().items():
+            url = reverse(name, kwargs=url_kwargs)
+            self.reset_attempt()
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                response = clients[role].post(url, payload())
+                elapsed = (time.perf_counter() - started) * 1000
+            self.assertLess(response.status_code, 400, key)
+            results[key] = (len(queries), elapsed)
+        return results
+
+    def measure(self):
+        """Return {"<role> <url name>": (queries, milliseconds)} for every URL and role, writes included."""
+        results = self.measure_posts()
+        kwargs = self.url_kwargs()
+        for role, user in (("admin", self.admin), ("staff", self.staff), ("student", self.student)):
+            client = Client()
+            client.force_login(user)
+            for name, url_kwargs in kwargs.items():
+                url = reverse(name, kwargs=url_kwargs)
+                # The first request creates per-user rows (e.g. the attempt on
+                # the take page); the measured one sees settled state.
+                client.get(url)
+                # Measure the uncached path of the cached pages.
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    started = time.perf_counter()
+                    client.get(url)
+                    elapsed = (time.perf_counter() - started) * 1000
+                results[f"{role} {name}"] = (len(queries), elapsed)
+        return results
+
+    def test_every_url_is_measured(self):
+        """Test that every named URL of the core and exam apps has arguments in the suite"""
+        names = {
+            pattern.name
+            for pattern in core_urls.urlpatterns + exam_urls.urlpatterns
+            if pattern.name
+        }
+        self.assertEqual(names - set(self.url_kwargs()), set())
+
+    def test_query_counts_and_latency_within_budget(self):
+        """Test that query counts do not grow with the data and stay within the stored baseline"""
+        self.grow(SMALL)
+        small = self.measure()
+        self.grow(LARGE)
+        large = self.measure()
+
+        growing = {
+            key: (small[key][0], large[key][0])
+            for key in small
+            if large[key][0] != small[key][0]
+        }
+        self.assertEqual(growing, {}, "Query counts that grow with the data (small, large)")
+
+        if UPDATE_BASELINE:
+            baseline = {
+                key: {"queries": queries, "ms": round(elapsed, 1)}
+                for key, (queries, elapsed) in sorted(large.items())
+            }
+            BASELINE_PATH.write_text(json.dumps(baseline, indent=2) + "\n")
+            return
+
+        baseline = json.loads(BASELINE_PATH.read_text())
+        over_queries = {
+            key: (baseline[key]["queries"], queries)
+            for key, (queries, _) in large.items()
+            if key in baseline and queries > baseline[key]["queries"]
+        }
+        self.assertEqual(over_queries, {}, "Query counts above the baseline (baseline, now)")
+
+        too_slow = {
+            key: (baseline[key]["ms"], round(elapsed, 1))
+            for key, (_, elapsed) in large.items()
+            if key in baseline
+            and elapsed > max(baseline[key]["ms"] * LATENCY_TOLERANCE, LATENCY_FLOOR_MS)
+        }
+        self.assertEqual(too_slow, {}, "Response times above the budget (baseline ms, now ms)")
+
+        self.assertEqual(set(large) - set(baseline), set(), "URLs missing from the baseline")
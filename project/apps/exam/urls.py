@@ -1,9 +1,10 @@
 from django.urls import path
-from . import views
+
+from . import question_bank, views
 
 urlpatterns = [
     # Question bank management
-    path("questionbank/", views.QuestionBankListView.as_view(), name="questionbank"),
+    path("questionbank/", question_bank.QuestionBankListView.as_view(), name="questionbank"),
     path("question/create/", views.QuestionCreateView.as_view(), name="question-create"),
     path("question/<int:pk>/update/", views.QuestionUpdateView.as_view(), name="question-update"),
     path("question/<int:pk>/delete/", views.QuestionDeleteView.as_view(), name="question-delete"),
@@ -16,12 +17,21 @@ urlpatterns = [
     
     # Question management for exams
     path("add-question/<int:exam_id>/", views.AddQuestionView.as_view(), name="add-question"),
-    path("add-question-from-bank/<int:exam_id>/", views.AddQuestionFromBankView.as_view(), name="add-question-from-bank"),
+    path("add-question-from-bank/<int:exam_id>/", question_bank.AddQuestionFromBankView.as_view(), name="add-question-from-bank"),
+    path("exams/<int:exam_id>/proctor/", views.ProctorView.as_view(), name="exam-proctor"),
+    path("exams/<int:exam_id>/proctor/stream/", views.proctor_stream, name="exam-proctor-stream"),
+    path("exams/<int:exam_id>/extend/", views.ExtendTimeView.as_view(), name="exam-extend"),
+    path("exams/<int:exam_id>/presence/", views.ExamPresenceView.as_view(), name="exam-presence"),
+    path("exams/<int:exam_id>/assemble/", views.ExamBlueprintView.as_view(), name="exam-assemble"),
     path("question/<int:pk>/update/<int:exam_id>/", views.QuestionUpdateView.as_view(), name="examquestion-update"),
     path("question/<int:pk>/delete/<int:exam_id>/", views.RemoveQuestionFromExamView.as_view(), name="remove-question"),
     
     # Exam taking
     path("take/<int:exam_id>/", views.TakeExamView.as_view(), name="take"),
+    path("take/<int:exam_id>/autosave/", views.autosave_answers, name="autosave"),
+    path("time/", views.time_sync, name="time-sync"),
+    path("take/<int:exam_id>/heartbeat/", views.heartbeat, name="heartbeat"),
+    path("take/<int:exam_id>/events/", views.proctor_events, name="proctor-events"),
     path("terminate/<int:exam_id>/", views.terminate_exam_ajax, name="terminate-exam"),
     path("myexams/", views.MyExamsView.as_view(), name="myexams"),
     
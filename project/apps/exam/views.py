@@ -1,35 +1,33 @@
-from django_filters.views import FilterView
+import json
+import math
+import time
+
+from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.contrib.messages.views import SuccessMessageMixin
-from django.db.models import Case, IntegerField, Prefetch, Value, When
-from django.http import HttpResponse, HttpResponseRedirect, JsonResponse
+from django.db.models import Case, Count, IntegerField, Prefetch, Value, When
+from django.http import HttpResponse, HttpResponseRedirect, JsonResponse, StreamingHttpResponse
 from django.shortcuts import get_object_or_404, redirect, render
-from django.urls import reverse_lazy
+from django.urls import reverse, reverse_lazy
 from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views.decorators.cache import never_cache
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_POST
 from django.views.generic import DetailView, ListView, View
 from django.views.generic.edit import CreateView, DeleteView, UpdateView
 
+from apps.core.db import write_with_retry
+from apps.core.metrics import GRADING_TIME
+from apps.core.ratelimit import rate_limit
+from apps.core.models import User
+from apps.core.routers import ReplicaReadMixin
 from apps.core.views import StaffAndAdminMixin
-from . import forms
-from .filters import QuestionFilter
-from .models import Answer, Choice, Exam, Question
-
-
-class QuestionBankListView(StaffAndAdminMixin, FilterView):
-    queryset = Question.objects.select_related("subject", "class_group")
-    template_name = "exam/questionbank.html"
-    filterset_class = QuestionFilter
-    paginate_by = 50
-    context_object_name = "questions"
-
-    def get_queryset(self):
-        queryset = super().get_queryset()
-        if not self.request.user.is_superuser:
-            return queryset.filter(author=self.request.user)
-        return queryset
+from . import admission, deadlines, feed, forms, journal, papers, presence, proctoring, submissions
+from .blueprint import BlueprintError, assemble_exam
+from .caching import class_scope, exam_list_queryset, get_exam_list
+from .models import Answer, Choice, Exam, ProctorSummary, Question
 
 
 class QuestionCreateView(StaffAndAdminMixin, View):
@@ -56,6 +54,7 @@ class QuestionCreateView(StaffAndAdminMixin, View):
             question = question_form.save(commit=False)
             question.author = request.user
             question.save()
+            question_form.save_tags(question)
 
             choices = choice_formset.save(commit=False)
             for choice in choices:
@@ -130,13 +129,14 @@ class ExamDeleteView(StaffAndAdminMixin, DeleteView):
 
 
 class ExamDetailView(LoginRequiredMixin, DetailView):
-    model = Exam
+    queryset = Exam.objects.select_related("subject", "class_group", "session", "term").annotate(
+        num_questions=Count("questions")
+    )
     template_name = "exam/exam_detail.html"
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        exam = self.get_object()
-        context["questions"] = exam.questions.all().prefetch_related('choice_set')
+        context["questions"] = self.object.questions.all().prefetch_related('choice_set')
         return context
 
 
@@ -171,6 +171,7 @@ class AddQuestionView(StaffAndAdminMixin, View):
             question = question_form.save(commit=False)
             question.author = request.user
             question.save()
+            question_form.save_tags(question)
 
             choices = choice_formset.save(commit=False)
             for choice in choices:
@@ -194,29 +195,44 @@ class AddQuestionView(StaffAndAdminMixin, View):
         return get_object_or_404(Exam, pk=self.kwargs["exam_id"])
 
 
-class AddQuestionFromBankView(StaffAndAdminMixin, View):
-    """Page responsible for picking question from question bank to an exam."""
-    template_name = "exam/add_question_from_bank.html"
+class ExamBlueprintView(StaffAndAdminMixin, View):
+    """Fill an exam with a random, stratified selection of bank questions."""
+    template_name = "exam/blueprint.html"
+    form_class = forms.ExamBlueprintForm
 
-    def get(self, request, **kwargs):
-        exam = get_object_or_404(Exam, pk=kwargs["exam_id"])
-        existing_questions = exam.questions.values_list("id", flat=True)
-        questions = Question.objects.filter(subject=exam.subject).exclude(
-            id__in=existing_questions
-        ).prefetch_related('choice_set')
+    def get_exam(self):
+        return get_object_or_404(
+            Exam.objects.select_related("subject", "class_group"), pk=self.kwargs["exam_id"]
+        )
 
-        context = {
-            "exam": exam,
-            "questions": questions
-        }
-        return render(request, self.template_name, context)
+    def get(self, request, *args, **kwargs):
+        exam = self.get_exam()
+        form = self.form_class(initial={
+            "subject": exam.subject_id,
+            "class_group": exam.class_group_id,
+            "number_of_questions": exam.number_of_questions,
+        })
+        return render(request, self.template_name, {"exam": exam, "form": form})
 
-    def post(self, request, **kwargs):
-        questions = request.POST.getlist("question[]")
-        exam = get_object_or_404(Exam, pk=kwargs["exam_id"])
-        exam.questions.add(*questions)
-        messages.success(request, "Questions successfully added.")
-        return redirect(exam)
+    def post(self, request, *args, **kwargs):
+        exam = self.get_exam()
+        form = self.form_class(request.POST)
+
+        if form.is_valid():
+            try:
+                added = assemble_exam(
+                    exam,
+                    form.get_sections(),
+                    recent_terms=form.cleaned_data["recent_terms"],
+                    replace=form.cleaned_data["replace_existing"],
+                )
+            except BlueprintError as e:
+                form.add_error(None, str(e))
+            else:
+                messages.success(request, f"{len(added)} questions added to the exam.")
+                return redirect(exam)
+
+        return render(request, self.template_name, {"exam": exam, "form": form})
 
 
 class QuestionUpdateView(StaffAndAdminMixin, View):
@@ -250,6 +266,7 @@ class QuestionUpdateView(StaffAndAdminMixin, View):
 
         if form.is_valid() and formset.is_valid():
             form.save()
+            form.save_tags(question)
             formset.save()
             messages.success(request, "Question successfully updated.")
 
@@ -283,29 +300,32 @@ class RemoveQuestionFromExamView(StaffAndAdminMixin, DeleteView):
         return HttpResponseRedirect(exam.get_absolute_url())
 
 
+@method_decorator(rate_limit("exam-take"), name="dispatch")
 class TakeExamView(LoginRequiredMixin, View):
     template_name = "exam/take.html"
     pre_exam_template_name = "exam/pre_exam_warning.html"
+    waiting_template_name = "exam/waiting_room.html"
 
     @property
     def get_exam(self):
-        return Exam.objects.prefetch_related(
-            Prefetch("questions__choice_set", queryset=Choice.objects.order_by("?"))
-        ).get(pk=self.kwargs["exam_id"])
+        return papers.get_paper(self.kwargs["exam_id"])
 
     @property
     def get_score(self):
-        score, created = Answer.objects.get_or_create(
-            exam=self.get_exam, user=self.request.user,
-        )
-        return score
+        lookup = {"exam_id": self.kwargs["exam_id"], "user": self.request.user}
+        # Only the first visit writes; later ones stay off the write lock.
+        try:
+            return Answer.objects.get(**lookup)
+        except Answer.DoesNotExist:
+            score, created = write_with_retry(Answer.objects.get_or_create, **lookup)
+            return score
 
     def get(self, request, *args, **kwargs):
         exam = self.get_exam
         score = self.get_score
 
         # Check if user has already completed the exam
-        if score.is_complete:
+        if score.is_complete or journal.submission_pending(score):
             messages.warning(request, "You have already submitted this exam.")
             return redirect("score-detail", exam.id, request.user.id)
 
@@ -316,6 +336,8 @@ class TakeExamView(LoginRequiredMixin, View):
 
         # If exam hasn't been started yet, show pre-exam warning
         if score.status == 'not_started':
+            if not exam.is_open():
+                return self.closed(exam)
             context = {
                 "exam": exam,
                 "score": score,
@@ -324,22 +346,23 @@ class TakeExamView(LoginRequiredMixin, View):
 
         # If exam is in progress, check if time has expired
         if score.time_started:
-            alloted = timezone.timedelta(minutes=exam.duration)
-            expiry_time = score.time_started + alloted
+            expiry_time = deadlines.get_deadline(exam.id, score.pk)
 
             # Check if exam time has expired
             if timezone.now() > expiry_time:
-                score.is_complete = True
-                score.status = 'completed'
-                score.time_completed = timezone.now()
-                score.save()
+                journal.finalize(score, score.expire)
+                presence.leave(exam.id, request.user.id)
                 messages.warning(request, "Exam time has expired. Your answers have been auto-submitted.")
                 return redirect("score-detail", exam.id, request.user.id)
 
+            presence.join(exam.id, request.user.id, score.pk)
             context = {
-                "exam": exam,
+                "exam": papers.shuffle_options(exam),
                 "score": score,
                 "expiry_time": expiry_time,
+                "submission_key": submissions.new_key(),
+                "heartbeat_seconds": settings.PRESENCE_HEARTBEAT_SECONDS,
+                "autosave_seconds": settings.AUTOSAVE_SECONDS,
             }
             return render(request, self.template_name, context)
 
@@ -348,6 +371,12 @@ class TakeExamView(LoginRequiredMixin, View):
 
     def post(self, request, *args, **kwargs):
         data = request.POST
+        submission_key = data.get('submission_key', '') if 'submit_exam' in data else ''
+        # A repeated submission gets the first one's outcome before the exam is loaded.
+        outcome = submissions.claim(kwargs["exam_id"], request.user.id, submission_key)
+        if outcome is not None:
+            return self.submitted(outcome)
+
         exam = self.get_exam
         score = self.get_score
 
@@ -357,11 +386,14 @@ class TakeExamView(LoginRequiredMixin, View):
             if score.status in ['in_progress', 'completed', 'terminated']:
                 messages.warning(request, "Exam has already been started or completed.")
                 return redirect("take", exam.id)
+            if not exam.is_open():
+                return self.closed(exam)
+            wait = admission.admit(exam.id, request.user.id)
+            if wait:
+                return self.waiting_room(exam, wait)
 
             # Start the exam
-            score.time_started = timezone.now()
-            score.status = 'in_progress'
-            score.save()
+            write_with_retry(score.start)
 
             messages.success(request, "Exam started successfully! Timer is now running.")
             return redirect("take", exam.id)
@@ -370,45 +402,70 @@ class TakeExamView(LoginRequiredMixin, View):
         elif 'terminate_exam' in data:
             termination_reason = data.get('termination_reason', 'Suspicious cheating activity detected')
 
-            score.time_completed = timezone.now()
-            score.is_complete = True
-            score.status = 'terminated'
-            score.termination_reason = termination_reason
-            score.save()
+            if not journal.finalize(score, score.terminate, termination_reason):
+                messages.warning(request, "Exam already completed or terminated.")
+                return redirect("score-detail", kwargs["exam_id"], request.user.id)
+            presence.leave(exam.id, request.user.id)
 
             messages.error(request, "The exam is terminated due to suspicious cheating activity.")
             return redirect("score-detail", kwargs["exam_id"], request.user.id)
 
         # Handle exam submission (from actual exam page)
         elif 'submit_exam' in data:
-            questions = exam.questions.all()
-            choices = {}
-
-            for question in questions:
-                choice = data.get(str(question.id), "")
-                if choice:
-                    is_correct = Choice.objects.get(pk=int(choice)).is_correct
-                    choices[question.id] = [choice, is_correct]
-
-            score.time_completed = timezone.now()
-            score.is_complete = True
-            score.status = 'completed'
-            score.choices = choices
-            score.save()
-
-            messages.success(request, "Exam submitted successfully!")
-            return redirect("score-detail", kwargs["exam_id"], request.user.id)
+            try:
+                outcome = self.submit(exam, score, data)
+            except Exception:
+                submissions.release(exam.id, request.user.id, submission_key)
+                raise
+            submissions.record(exam.id, request.user.id, submission_key, outcome)
+            return self.submitted(outcome)
 
         # Default fallback
         return redirect("take", exam.id)
 
-
-class ExamScoreView(LoginRequiredMixin, View):
+    def submit(self, exam, score, data):
+        """Grade and record a submission; return the outcome that its duplicates get too."""
+        url = reverse("score-detail", args=(exam.id, self.request.user.id))
+        if score.status != 'in_progress' or journal.submission_pending(score):
+            # A retry without its key: the attempt is never graded twice.
+            return {"level": messages.WARNING, "message": "You have already submitted this exam.", "url": url}
+
+        with GRADING_TIME.time():
+            choices = papers.mark_choices(papers.get_answer_key(exam.id), data)
+        journal.submit(score, choices)
+        presence.leave(exam.id, self.request.user.id)
+        return {"level": messages.SUCCESS, "message": "Exam submitted successfully!", "url": url}
+
+    def submitted(self, outcome):
+        messages.add_message(self.request, outcome["level"], outcome["message"])
+        return redirect(outcome["url"])
+
+    def waiting_room(self, exam, wait):
+        """Ask the browser to send the start again once its slot comes up; the timer has not started."""
+        response = render(self.request, self.waiting_template_name, {"exam": exam, "wait": math.ceil(wait)}, status=503)
+        response["Retry-After"] = str(math.ceil(wait))
+        return response
+
+    def closed(self, exam):
+        if timezone.now() < exam.opens_at:
+            messages.warning(self.request, f"This exam opens at {timezone.localtime(exam.opens_at):%H:%M on %d %b %Y}.")
+        else:
+            messages.warning(self.request, "This exam has closed.")
+        return redirect("myexams")
+
+
+class ExamScoreView(ReplicaReadMixin, LoginRequiredMixin, View):
     template_name = "exam/scores.html"
 
     def get(self, request, *args, **kwargs):
-        exam = get_object_or_404(Exam, pk=kwargs["exam_id"])
-        scores = Answer.objects.filter(exam=exam).select_related('user')
+        exam = get_object_or_404(
+            Exam.objects.annotate(num_questions=Count("questions")), pk=kwargs["exam_id"]
+        )
+        # The scheduler opens an attempt for every student; unopened ones are not results.
+        scores = list(Answer.objects.filter(exam=exam).exclude(status="not_started").select_related('user'))
+        # Every row shares the annotated exam, so percentages need no COUNT per row.
+        for score in scores:
+            score.exam = exam
 
         context = {
             "exam": exam,
@@ -417,12 +474,84 @@ class ExamScoreView(LoginRequiredMixin, View):
         return render(request, self.template_name, context)
 
 
-class ExamScoreDetailView(LoginRequiredMixin, View):
+class ProctorView(StaffAndAdminMixin, View):
+    """Live view of an exam in progress; the page follows ``proctor_stream``."""
+    template_name = "exam/proctor.html"
+
+    def get(self, request, *args, **kwargs):
+        exam = get_object_or_404(Exam.objects.select_related("class_group"), pk=kwargs["exam_id"])
+        attempts = {
+            answer.user_id: answer
+            for answer in Answer.objects.filter(exam=exam).select_related("user", "proctor_summary")
+        }
+        students = User.objects.filter(student_class=exam.class_group).exclude(pk__in=attempts)
+        # The snapshot: every attempt, then the class's students who have not opened the exam.
+        rows = [
+            {"user": answer.user, "answer": answer, "events": _event_total(answer)}
+            for answer in attempts.values()
+        ] + [{"user": student, "answer": None, "events": 0} for student in students]
+        rows.sort(key=lambda row: (row["user"].get_full_name() or row["user"].username).lower())
+
+        context = {
+            "exam": exam,
+            "rows": rows,
+            "presence": presence.counts(exam.pk),
+            "extension_form": forms.TimeExtensionForm(exam=exam),
+        }
+        return render(request, self.template_name, context)
+
+
+class ExtendTimeView(StaffAndAdminMixin, View):
+    """Give selected attempts, or every attempt of the exam, more time."""
+
+    def post(self, request, *args, **kwargs):
+        exam = get_object_or_404(Exam, pk=kwargs["exam_id"])
+        form = forms.TimeExtensionForm(request.POST, exam=exam)
+        if form.is_valid():
+            answers = list(form.cleaned_data["answers"])
+            deadlines.grant_extension(
+                exam, form.cleaned_data["minutes"], answers,
+                reason=form.cleaned_data["reason"], granted_by=request.user,
+            )
+            who = f"{len(answers)} student(s)" if answers else "everyone"
+            messages.success(request, f"Gave {who} {form.cleaned_data['minutes']} more minute(s).")
+        else:
+            messages.error(request, "The time extension was not valid: " + form.errors.as_text())
+        return redirect("exam-proctor", exam.id)
+
+
+def _event_total(answer):
+    try:
+        return answer.proctor_summary.total
+    except ProctorSummary.DoesNotExist:
+        return 0
+
+
+async def proctor_stream(request, exam_id):
+    """
+    Server-Sent Events stream of the live changes of an exam, for proctors
+    """
+    user = await request.auser()
+    if not (user.is_staff or user.is_superuser):
+        return JsonResponse({'error': 'Staff only'}, status=403)
+
+    response = StreamingHttpResponse(
+        feed.stream(exam_id, request.headers.get('Last-Event-ID')), content_type='text/event-stream',
+    )
+    response['Cache-Control'] = 'no-cache'
+    # Proxies must pass events on as they come.
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+class ExamScoreDetailView(ReplicaReadMixin, LoginRequiredMixin, View):
     template_name = "exam/score_detail.html"
 
     def get(self, request, *args, **kwargs):
         exam = get_object_or_404(Exam, pk=kwargs["exam_id"])
-        answer = get_object_or_404(Answer, exam=exam, user_id=kwargs["uid"])
+        answer = get_object_or_404(Answer.objects.select_related("user"), exam=exam, user_id=kwargs["uid"])
+        if journal.submission_pending(answer):
+            messages.info(request, "The submission was received and is being recorded. Refresh shortly for the result.")
 
         # Get submission data
         submission = answer.choices
@@ -442,6 +571,8 @@ class ExamScoreDetailView(LoginRequiredMixin, View):
             "questions__choice_set",
         ).get(pk=kwargs["exam_id"])
 
+        # The prefetched questions also answer the question count.
+        answer.exam = exam_with_questions
         context = {
             "exam": exam_with_questions,
             "answer": answer,
@@ -467,14 +598,17 @@ class ScoreDeleteView(StaffAndAdminMixin, DeleteView):
         return reverse_lazy("scores", kwargs={"exam_id": self.object.exam.id})
 
 
-class MyExamsView(LoginRequiredMixin, View):
+class MyExamsView(ReplicaReadMixin, LoginRequiredMixin, View):
     template_name = "exam/myexams.html"
 
     def get(self, request, *args, **kwargs):
-        exams = Exam.objects.filter(
-            published=True,
-            class_group=request.user.student_class
-        ).select_related('subject', 'class_group')
+        class_id = request.user.student_class_id
+        exams = []
+        if class_id is not None:
+            exams = get_exam_list(
+                class_scope(class_id),
+                exam_list_queryset().open().filter(class_group_id=class_id),
+            )
 
         context = {"exams": exams}
         return render(request, self.template_name, context)
@@ -482,6 +616,7 @@ class MyExamsView(LoginRequiredMixin, View):
 
 @csrf_exempt
 @require_POST
+@rate_limit("exam-terminate")
 def terminate_exam_ajax(request, exam_id):
     """
     AJAX endpoint for terminating exam due to anti-cheating violations
@@ -501,11 +636,9 @@ def terminate_exam_ajax(request, exam_id):
         termination_reason = request.POST.get('reason', 'Suspicious cheating activity detected')
 
         # Terminate the exam
-        answer.time_completed = timezone.now()
-        answer.is_complete = True
-        answer.status = 'terminated'
-        answer.termination_reason = termination_reason
-        answer.save()
+        if not journal.finalize(answer, answer.terminate, termination_reason):
+            return JsonResponse({'error': 'Exam already completed or terminated'}, status=400)
+        presence.leave(exam.id, request.user.id)
 
         return JsonResponse({
             'success': True,
@@ -517,6 +650,94 @@ def terminate_exam_ajax(request, exam_id):
         return JsonResponse({'error': str(e)}, status=500)
 
 
+@require_POST
+@rate_limit("exam-autosave")
+def autosave_answers(request, exam_id):
+    """
+    AJAX endpoint saving the answers picked so far on an exam in progress
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+
+    answer = get_object_or_404(Answer, exam_id=exam_id, user=request.user)
+    if answer.status != 'in_progress':
+        return JsonResponse({'error': 'Exam is not in progress'}, status=409)
+    if timezone.now() > deadlines.get_deadline(exam_id, answer.pk):
+        return JsonResponse({'error': 'Exam time has expired'}, status=409)
+
+    choices = papers.mark_choices(papers.get_answer_key(exam_id), request.POST)
+    journal.autosave(answer, choices)
+    return JsonResponse({'success': True, 'saved': len(choices)})
+
+
+@require_POST
+@rate_limit("exam-heartbeat")
+def heartbeat(request, exam_id):
+    """
+    AJAX endpoint telling proctors that the exam page of an attempt in progress is open
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+
+    try:
+        idle_seconds = max(int(request.POST.get('idle', 0)), 0)
+    except ValueError:
+        idle_seconds = 0
+    # Beats of a registered attempt stay in the cache; only the first one reads the database.
+    answer_id = presence.beat(exam_id, request.user.id, idle_seconds)
+    if answer_id is None:
+        answer_id = Answer.objects.filter(
+            exam_id=exam_id, user=request.user, status='in_progress',
+        ).values_list('pk', flat=True).first()
+        if answer_id is None:
+            return JsonResponse({'error': 'Exam is not in progress'}, status=409)
+        presence.join(exam_id, request.user.id, answer_id, idle_seconds)
+    # The deadline rides along, so time extensions reach the page with the next beat.
+    return JsonResponse({
+        'success': True,
+        'now': time.time() * 1000,
+        'deadline': deadlines.get_deadline(exam_id, answer_id).timestamp() * 1000,
+    })
+
+
+@never_cache
+def time_sync(request):
+    """
+    The server's clock in milliseconds, for exam pages to measure their clock offset
+    """
+    return JsonResponse({'now': time.time() * 1000})
+
+
+class ExamPresenceView(StaffAndAdminMixin, View):
+    """Online, idle and disconnected attempt counts of an exam, for proctors."""
+
+    def get(self, request, *args, **kwargs):
+        return JsonResponse({'exam': kwargs['exam_id'], **presence.counts(kwargs['exam_id'])})
+
+
+@require_POST
+@rate_limit("proctor-events")
+def proctor_events(request, exam_id):
+    """
+    Beacon endpoint recording a batch of anti-cheating events of an exam in progress
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': 'Authentication required'}, status=401)
+
+    # The last beacon of a terminated attempt may arrive after the termination.
+    answer_id = Answer.objects.filter(
+        exam_id=exam_id, user=request.user, status__in=['in_progress', 'terminated'],
+    ).values_list('pk', flat=True).first()
+    if answer_id is None:
+        return JsonResponse({'error': 'Exam is not in progress'}, status=409)
+
+    try:
+        events = json.loads(request.POST.get('events', '[]'))
+    except ValueError:
+        return JsonResponse({'error': 'Events must be a JSON list'}, status=400)
+    return JsonResponse({'success': True, 'accepted': proctoring.record(answer_id, events)})
+
+
 def test_anti_cheating(request):
     """
     Test page for anti-cheating functionality
@@ -0,0 +1,50 @@
+"""
+Warm-up for the start of an exam.
+
+The first requests after a deploy or restart would otherwise compile the
+exam templates and fill the paper, answer key and dashboard caches while
+the whole class is waiting. The caches are shared, so ``warm_exam`` fills
+them once for every worker; compiled templates live in each process, so the
+WSGI module compiles them as every worker starts.
+"""
+from django.template.loader import get_template
+
+from .caching import class_scope, exam_list_queryset, get_exam_list, get_exam_page
+from .papers import get_answer_key, get_paper
+
+TEMPLATES = [
+    "registration/login.html",
+    "exam/pre_exam_warning.html",
+    "exam/waiting_room.html",
+    "exam/take.html",
+    "exam/score_detail.html",
+    "dashboard.html",
+    "exam/myexams.html",
+]
+
+
+def warm_templates():
+    for name in TEMPLATES:
+        get_template(name)
+    return len(TEMPLATES)
+
+
+def warm_papers(exam_ids):
+    for exam_id in exam_ids:
+        get_paper(exam_id)
+    return len(exam_ids)
+
+
+def warm_answer_keys(exam_ids):
+    for exam_id in exam_ids:
+        get_answer_key(exam_id)
+    return len(exam_ids)
+
+
+def warm_dashboards(class_ids):
+    """Fill the first dashboard page and the exam list students of each class see."""
+    for class_id in class_ids:
+        queryset = exam_list_queryset().open().filter(class_group_id=class_id)
+        get_exam_page(class_scope(class_id), queryset, None)
+        get_exam_list(class_scope(class_id), queryset)
+    return len(class_ids)
@@ -19,8 +19,11 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 
+from apps.core.views import QueuedLoginView
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path("accounts/login/", QueuedLoginView.as_view(), name="login"),
     path("accounts/", include("django.contrib.auth.urls")),
     path("", include("apps.core.urls")),
     path("exam/", include("apps.exam.urls")),